@@ -0,0 +1,187 @@
+###############################################################
+# INTEL CORPORATION CONFIDENTIAL AND PROPRIETARY
+#
+# Copyright © 2018-2021 Intel Corporation.
+
+# This software and the related documents are Intel copyrighted
+# materials, and your use of them is governed by the express
+# license under which they were provided to you (License). Unless
+# the License provides otherwise, you may not use, modify, copy,
+# publish, distribute, disclose or transmit  this software or the
+# related documents without Intel's prior written permission.
+
+# This software and the related documents are provided as is, with
+# no express or implied warranties, other than those that are
+# expressly stated in the License.
+###############################################################
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy import sparse
+
+
+class CpuSnnSimulator:
+    """Approximate CPU model of the stochastic network configured by SnnBuilder.
+
+    The principal compartments are simulated with the integer arithmetic of a Loihi compartment: box synapses of
+    length box_duration, voltage decay, bias, 8-bit LFSR-like noise scaled by the noise exponent, saturation at the
+    minimum voltage and spike-and-reset at threshold. All values are in the same units as on the chip, i.e. weights and
+    thresholds already include their 2**6 scaling and exponents.
+
+    The remaining compartments of each MultiCompartment and the summation neuron are modelled by the logic they
+    implement rather than by their voltages: a neuron validates its variable at a timestep if it spiked during the last
+    box_duration timesteps and receives no inhibition, and the summation neuron fires once sigma_threshold neurons
+    validate at the same timestep. The model is therefore not bit-exact with the chip: it ignores the dynamics of
+    those compartments, e.g. their delays and the voltage of the summation neuron, and its noise is drawn from numpy
+    rather than from the Loihi LFSRs.
+
+    Replicas are independent runs of the same network, each with its own noise stream, so results only depend on the
+    seed and not on how replicas are distributed over threads.
+
+    :param weights: (num_neurons, num_neurons) weight matrix, dense or scipy.sparse, indexed as (destination, source).
+    :param bias: bias current of each principal compartment.
+    :param v_th: voltage threshold of each principal compartment.
+    :param num_variables: number of variables, neurons are grouped by variable in consecutive blocks.
+    :param sigma_threshold: number of validating neurons at which the network reports a solution.
+    :param box_duration: duration of the box post-synaptic responses.
+    :param noise_exp: exponent of the voltage noise, ignored if enable_noise is False.
+    :param enable_noise: whether to add noise to the voltage of the principal compartments.
+    :param v_min_exp: the voltage saturates at -2**v_min_exp + 1.
+    :param v_decay: voltage decay of the principal compartments, in units of 2**-12.
+    """
+
+    def __init__(self, weights, bias, v_th, num_variables, sigma_threshold=None, box_duration=6, noise_exp=6,
+                 enable_noise=True, v_min_exp=5, v_decay=0):
+        self.weights = sparse.csr_matrix(weights, dtype=np.int64)
+        self.size = self.weights.shape[0]
+        self.bias = np.broadcast_to(np.asarray(bias, dtype=np.int64), (self.size,))
+        self.v_th = np.broadcast_to(np.asarray(v_th, dtype=np.int64), (self.size,))
+        assert self.size % num_variables == 0, "Number of neurons should be a multiple of the number of variables."
+        self.num_variables = num_variables
+        self.domain_size = self.size // num_variables
+        self.sigma_threshold = sigma_threshold if sigma_threshold is not None else num_variables
+        self.box_duration = box_duration
+        self.noise_exp = noise_exp
+        self.enable_noise = enable_noise
+        self.v_min = -2 ** v_min_exp + 1
+        self.v_decay = v_decay
+
+    @classmethod
+    def from_snn(cls, snn, target_cost=None):
+        """Read the parameters of the principal network from an SnnBuilder.
+
+        :param snn: SnnBuilder whose principal network is to be simulated.
+        :param target_cost: number of satisfied variables that counts as a solution, defaults to the threshold of the
+        summation neuron.
+        """
+        mc = snn._multicompartment_pop[0]
+        mapping = snn.principal_adjacency_mtx
+        if snn.constraints is not None:
+            mapping = sparse.csr_matrix(mapping.adjacency_mtx)
+            scale = 2 ** (6 + snn.w_ij_exp)
+            weights = (mapping == 1).astype(np.int64) * snn.w_wta_inh * scale + \
+                (mapping == 3).astype(np.int64) * snn.w_constraints_inh * scale
+        elif snn.q_mtx is not None:
+            weights = sparse.csr_matrix(mapping) * 2 ** 6
+        else:
+            weights = sparse.csr_matrix((snn.size, snn.size))
+        bias = [c.biasMant * 2 ** c.biasExp for c in snn.principal_population]
+        v_th = [c.vThMant * 2 ** 6 for c in snn.principal_population]
+        return cls(weights, bias, v_th, snn.num_vars,
+                   sigma_threshold=target_cost if target_cost is not None else snn.integrator.sigma_threshold,
+                   box_duration=snn.box_duration,
+                   noise_exp=mc.noise_exp_at_multicompartment,
+                   enable_noise=mc.enable_noise,
+                   v_min_exp=mc.v_min_exp,
+                   v_decay=mc.v_decay)
+
+    def random_v(self, vr_low, vr_high, b_1_tot=0):
+        """Draw distinct initial voltages the same way as SnnBuilder.randomize_v, using python's RNG.
+
+        :param vr_low: low limit of the interval, in units of the threshold mantissa times 2**6.
+        :param vr_high: top limit of the interval, in units of the threshold mantissa times 2**6.
+        :param b_1_tot: bias current subtracted from both limits.
+        :return: initial voltage of each principal compartment.
+        """
+        v_th_mant = int(self.v_th[0]) // 2 ** 6
+        return np.asarray(random.sample(range(int(v_th_mant * vr_low * 2 ** 6) - b_1_tot,
+                                              int(v_th_mant * vr_high * 2 ** 6) - b_1_tot),
+                                        self.size), dtype=np.int64)
+
+    def run(self, runtime, num_replicas=1, seed=None, v_init=None, num_threads=1):
+        """Simulate independent replicas of the network until they report a solution or runtime is exhausted.
+
+        :param runtime: maximum number of timesteps.
+        :param num_replicas: number of independent replicas.
+        :param seed: seed for the noise of all replicas.
+        :param v_init: initial voltages, of shape (num_neurons,) or (num_replicas, num_neurons), zero if None.
+        :param num_threads: number of threads among which replicas are distributed.
+        :return: tuple (solving_times, states) with the timestep at which each replica reported a solution, -1 if it
+        did not, and the state of its variables at that timestep, or at the last timestep if it did not.
+        """
+        v_init = np.zeros(self.size, dtype=np.int64) if v_init is None else np.asarray(v_init, dtype=np.int64)
+        v_init = np.broadcast_to(v_init, (num_replicas, self.size))
+        seeds = np.random.SeedSequence(seed).spawn(num_replicas)
+        chunks = [c for c in np.array_split(np.arange(num_replicas), num_threads) if len(c) > 0]
+
+        def run_chunk(replicas):
+            return self._run_replicas(runtime, [seeds[r] for r in replicas], v_init[replicas])
+
+        if len(chunks) > 1:
+            with ThreadPoolExecutor(len(chunks)) as executor:
+                results = list(executor.map(run_chunk, chunks))
+        else:
+            results = [run_chunk(chunk) for chunk in chunks]
+        solving_times = np.concatenate([times for times, _ in results])
+        states = np.concatenate([states for _, states in results])
+        return solving_times, states
+
+    def _noise(self, rngs):
+        """Draw one timestep of voltage noise for each replica."""
+        r = np.stack([rng.integers(0, 256, self.size) for rng in rngs])
+        return (r - 2 ** 7) * 2 ** self.noise_exp // 2 ** 7
+
+    def _decode_state(self, validated):
+        """Encode the validating neurons as one value per variable, -1 where none validates."""
+        validated = validated.reshape(len(validated), self.num_variables, self.domain_size)
+        state = validated.argmax(-1)
+        state[~validated.any(-1)] = -1
+        return state
+
+    def _run_replicas(self, runtime, seeds, v_init):
+        """Simulate a batch of replicas in lockstep, with one noise generator per replica."""
+        rngs = [np.random.default_rng(s) for s in seeds]
+        num_replicas = len(seeds)
+        v = v_init.copy()
+        # Spikes of the last box_duration timesteps and their count per neuron, which scales the box responses
+        history = np.zeros((self.box_duration, num_replicas, self.size), dtype=bool)
+        counts = np.zeros((num_replicas, self.size), dtype=np.int64)
+        solving_times = np.full(num_replicas, -1)
+        states = np.full((num_replicas, self.num_variables), -1)
+        validated = np.zeros((num_replicas, self.size), dtype=bool)
+        for t in range(1, runtime + 1):
+            u = self.weights.dot(counts.T).T
+            if self.v_decay:
+                v = np.sign(v) * (np.abs(v) * (2 ** 12 - self.v_decay) // 2 ** 12)
+            v = v + u + self.bias
+            if self.enable_noise:
+                v += self._noise(rngs)
+            np.maximum(v, self.v_min, out=v)
+            spikes = v > self.v_th
+            v[spikes] = 0
+            # A neuron validates its variable while its box response is active and it is not inhibited
+            validated = (counts > 0) & (u >= 0)
+            solved = (validated.sum(1) >= self.sigma_threshold) & (solving_times == -1)
+            if solved.any():
+                solving_times[solved] = t
+                states[solved] = self._decode_state(validated[solved])
+                if np.all(solving_times != -1):
+                    return solving_times, states
+            slot = t % self.box_duration
+            counts += spikes
+            counts -= history[slot]
+            history[slot] = spikes
+        unsolved = solving_times == -1
+        states[unsolved] = self._decode_state(validated[unsolved])
+        return solving_times, states
@@ -18,14 +18,19 @@ from collections.abc import Sequence
 
 import matplotlib.pyplot as plt
 import matplotlib.ticker as ticker
+import multiprocessing
 import numpy as np
 import os
 import random
+import time
 import warnings
 
+from scipy import sparse
+
 import nxsdk.api.enums.api_enums as enums
 import nxsdk.api.n2a as nx
 from nxsdk.graph.processes.phase_enums import Phase
+from nxsdk_modules_ncl.csp.src.cpu_simulator import CpuSnnSimulator
 
 
 class Probable(Sequence):
@@ -203,6 +208,81 @@ class OptimizationSolver:
         pass
 
 
+class PortfolioResult:
+    """Outcome of the independent runs of a restart portfolio, see CspSolver.solve_portfolio.
+
+    Runs cancelled by stop_on_first are not included, so statistics are only unbiased if all runs completed.
+
+    :param runtime: maximum number of timesteps of each run.
+    """
+
+    def __init__(self, runtime):
+        self.runtime = runtime
+        self.seeds = []
+        self.solving_times = []
+        self.wall_times = []
+        self.solutions = []
+        self.valid = []
+
+    def append(self, seed, solving_time, wall_time, solution, valid):
+        """Record the outcome of a run, solving_time is -1 if it did not report a solution."""
+        self.seeds.append(seed)
+        self.solving_times.append(solving_time)
+        self.wall_times.append(wall_time)
+        self.solutions.append(solution)
+        self.valid.append(valid)
+
+    @property
+    def num_runs(self):
+        return len(self.seeds)
+
+    @property
+    def success_probability(self):
+        """Fraction of the runs that found a valid solution."""
+        return np.mean(self.valid) if self.num_runs else 0.
+
+    @property
+    def best_solution(self):
+        """Valid solution found in the fewest timesteps, None if no run found one."""
+        times = [t for t, v in zip(self.solving_times, self.valid) if v]
+        if not times:
+            return None
+        solutions = [s for s, v in zip(self.solutions, self.valid) if v]
+        return solutions[int(np.argmin(times))]
+
+    def _times(self, wall_time):
+        return np.asarray(self.wall_times if wall_time else self.solving_times, dtype=float)
+
+    def median_tts(self, wall_time=False):
+        """Median time to solution of the successful runs, in timesteps or in seconds if wall_time.
+
+        :return: median time to solution, nan if no run was successful.
+        """
+        times = self._times(wall_time)[np.asarray(self.valid, dtype=bool)]
+        return np.median(times) if len(times) else np.nan
+
+    def tts(self, target_probability=0.99, wall_time=False):
+        """Expected time to find a valid solution with target_probability by restarting runs.
+
+        Computed as t_run * log(1 - target_probability) / log(1 - p), with p the success probability and t_run the
+        runtime of a run, or its mean wall time if wall_time. It is at least one run.
+
+        :return: time to solution, inf if no run was successful.
+        """
+        p = self.success_probability
+        if p == 0:
+            return np.inf
+        t_run = np.mean(self._times(True)) if wall_time else self.runtime
+        if p == 1:
+            return t_run
+        return t_run * max(1., np.log(1 - target_probability) / np.log(1 - p))
+
+    @property
+    def tts99(self):
+        """Time to solution with 99% probability, in timesteps."""
+        return self.tts(0.99)
+
+
 class Qubo:
     def __init__(self, q_mtx):
         """A Quadratic Unconstrained Binary Optimization (QUBO) problem.
@@ -281,6 +361,18 @@ class CspSolver(OptimizationSolver):
         self.is_compiled = False
         self.lfsr_offset = 0
         self.snn = None
+        self._constraint_index = None
+        self.simulator = None
+
+    @property
+    def constraint_index(self):
+        """Precompiled index of the problem constraints, used to check and rank candidate solutions."""
+        if self._constraint_index is None:
+            if isinstance(self.csp, Qubo):
+                self._constraint_index = ConstraintIndex(q_mtx=self.csp.q_mtx)
+            else:
+                self._constraint_index = ConstraintIndex(constraints=self.csp.constraints)
+        return self._constraint_index
 
     @property
     def node_constraints(self):
@@ -309,35 +401,52 @@ class CspSolver(OptimizationSolver):
                               **self._snnkwargs)
 
     def _check_solution(self, solution):
-        violations = []
-        var_pairs = None
+        violations, energy = self.constraint_index.evaluate(solution)
         if isinstance(self.csp, Qubo):
+            return self.target_energy is None or energy <= self.target_energy
+        if violations == 0:
+            print("Solution is valid")
             return True
         else:
-            tt = type(self.csp.constraints)
-            if tt is tuple:
-                var_pairs = self.csp.constraints[0]
-                relation = self.csp.constraints[1]
-                for x, y in var_pairs:
-                    if relation[solution[x], solution[y]] == 0:
-                        violations.append((x, y))
-            elif tt is list:
-                for x, y, r in self.csp.constraints:
-                    if r[solution[x], solution[y]] == 0:
-                        violations.append((x, y))
-            if len(violations) == 0:
-                print("Solution is valid")
-                return True
-            else:
-                return False
+            return False
+
+    def rank_solutions(self, solutions=None):
+        """Sort candidate solutions by number of violated constraints and then by QUBO energy.
+
+        :param solutions: array of candidate states, one per row, defaults to the collected solutions.
+        :return: tuple (solutions, violations, energies) sorted from best to worst, energies is None for a CSP.
+        """
+        solutions = self.collected_solutions if solutions is None else solutions
+        solutions = np.asarray(solutions, dtype=int).reshape(-1, self.csp.num_variables)
+        violations, energies = self.constraint_index.evaluate(solutions)
+        if energies is None:
+            order = np.argsort(violations, kind='stable')
+            return solutions[order], violations[order], None
+        order = np.lexsort((energies, violations))
+        return solutions[order], violations[order], energies[order]
 
     def solve(self, seed=1, runtime=100, target_cost=None, vr_low=-20, vr_high=1, randomize_lfsr_seeds=False,
               randomize_vinit=True, partition=None, _do_snips_setup=True, set_random_initial_state=False,
-              keep_going=False):
+              keep_going=False, backend='loihi', cpukwargs=None):
+        """Build the SNN and run it until it reports a solution or runtime is exhausted.
+
+        The cpu backend is approximate: it simulates the principal compartments exactly but models the remaining
+        compartments and the summation neuron by their logic, so its solving times and solutions are statistically
+        similar to, but not the same as, those of the board for a given seed.
+
+        :param backend: 'loihi' to compile and run the SNN on the board, 'cpu' to run an approximation of it on
+        CpuSnnSimulator.
+        :param cpukwargs: parameters for the cpu backend, num_replicas and num_threads.
+        :return: state of the variables when the SNN reported a solution, last state otherwise.
+        """
+        assert backend in ['loihi', 'cpu'], "Backend should be 'loihi' or 'cpu'."
         self.is_compiled = False
         self._build()
         self.solving_times = []
         random.seed(seed)
+        if backend == 'cpu':
+            return self._solve_on_cpu(seed, runtime, target_cost, vr_low, vr_high, randomize_vinit,
+                                      **(cpukwargs if cpukwargs else {}))
         if _do_snips_setup:
             self._summation_lmt_axon = self.snn.integrator.connect_sumation_neuron_to_lmt(runtime)
         if target_cost is not None:
@@ -355,17 +464,119 @@ class CspSolver(OptimizationSolver):
         if _do_snips_setup:
             self._setup_snips(self._board)
             self._create_notification_channels(self._board)
-        compartments3_ids = []
         # Get hardware mapping of top compartments
-        for compartment in self.snn.principal_population_c3:
-            (boardId, chipId, coreId, cxId, cxProfileCfgId,
-             vthProfileCfgId) = self.snn.main_net.resourceMap.compartment(compartment.nodeId)
-            compartments3_ids.append((chipId, coreId, cxId))
+        compartments3_ids = self._compartment_ids(self.snn.principal_population_c3)
         solving_times, extracted_state = self.run(runtime=runtime, partition=partition,
                                                   compartments3_ids=compartments3_ids, keep_going=keep_going,
                                                   _do_snips_setup=_do_snips_setup, hack_lfsr=randomize_lfsr_seeds)
         return extracted_state
 
+    def compile(self, runtime, partition=None):
+        """Build and compile the SNN once, to be re-seeded for many runs.
+
+        :param runtime: maximum number of timesteps of each run.
+        :param partition: partition of the Loihi system to run on.
+        :return: handle to the compiled solver, to be closed after the last run.
+        :rtype: CompiledCspSolver
+        """
+        return CompiledCspSolver(self, runtime, partition=partition)
+
+    def _compartment_ids(self, population):
+        """Look up the (chipId, coreId, cxId) of the compartments of a population on the board."""
+        compartment_ids = []
+        for compartment in population:
+            (boardId, chipId, coreId, cxId, cxProfileCfgId,
+             vthProfileCfgId) = self.snn.main_net.resourceMap.compartment(compartment.nodeId)
+            compartment_ids.append((chipId, coreId, cxId))
+        return compartment_ids
+
+    def solve_portfolio(self, num_runs, runtime=100, seed=None, num_workers=1, stop_on_first=True, **solve_kwargs):
+        """Restart the solver with independent seeds and collect time-to-solution statistics.
+
+        The seed of each run seeds python's RNG, from which randomize_v draws the initial voltages and
+        randomize_lfsr_seeds the LFSR words. Runs are distributed over forked worker processes, each of which builds
+        its own SNN, so any backend of solve can be used.
+
+        :param num_runs: number of independent runs.
+        :param runtime: maximum number of timesteps of each run.
+        :param seed: seed from which the seeds of the runs are drawn.
+        :param num_workers: number of worker processes, runs are executed in this process if 1.
+        :param stop_on_first: whether to cancel the remaining runs once one of them finds a valid solution. Runs that
+        are in progress in other workers finish, so that they release the board, but are not included in the result.
+        :param solve_kwargs: parameters passed to solve for every run, e.g. target_cost or backend.
+        :return: outcome of the completed runs.
+        :rtype: PortfolioResult
+        """
+        rng = random.Random(seed)
+        tasks = [(rng.getrandbits(32), runtime, solve_kwargs) for _ in range(num_runs)]
+        result = PortfolioResult(runtime)
+        if num_workers == 1:
+            # solve collects the solutions of runs executed in this process
+            runs = (self._portfolio_run(*task) for task in tasks)
+            self._collect_portfolio_runs(runs, result, stop_on_first, collect=False)
+        else:
+            context = multiprocessing.get_context('fork')
+            stop_event = context.Event()
+            with context.Pool(num_workers, _init_portfolio_worker, (self, stop_event)) as pool:
+                runs = pool.imap_unordered(_solve_in_portfolio_worker, tasks)
+                self._collect_portfolio_runs(runs, result, stop_on_first, collect=True)
+                # Skip the runs that have not started and wait for the ones in progress to finish and disconnect,
+                # terminating the workers would leave their boards running.
+                stop_event.set()
+                pool.close()
+                pool.join()
+        return result
+
+    def _collect_portfolio_runs(self, runs, result, stop_on_first, collect):
+        """Add the outcome of runs to result as they complete, until one is valid if stop_on_first.
+
+        :param collect: whether to add valid solutions to the collected solutions, which solve already does for runs
+        executed in this process.
+        """
+        for run in runs:
+            result.append(*run)
+            solution, valid = run[3:]
+            if valid:
+                if collect:
+                    self._collected_solutions.append(solution)
+                if stop_on_first:
+                    break
+
+    def _portfolio_run(self, seed, runtime, solve_kwargs):
+        """Solve with one seed of a portfolio.
+
+        :return: tuple (seed, solving_time, wall_time, solution, valid) with solving_time -1 if no solution was
+        reported.
+        """
+        t0 = time.perf_counter()
+        solution = self.solve(seed=seed, runtime=runtime, **solve_kwargs)
+        wall_time = time.perf_counter() - t0
+        solving_time = self.solving_times[0] if self.solving_times else -1
+        valid = solving_time != -1 and bool(self._check_solution(solution))
+        return seed, solving_time, wall_time, solution, valid
+
+    def _solve_on_cpu(self, seed, runtime, target_cost, vr_low, vr_high, randomize_vinit, num_replicas=1,
+                      num_threads=1):
+        """Run independent replicas of an approximation of the SNN on the CPU simulator.
+
+        Solutions of all replicas are collected, the one reported first is returned.
+        """
+        self.simulator = CpuSnnSimulator.from_snn(self.snn, target_cost=target_cost)
+        v_init = None
+        if randomize_vinit:
+            b_1_tot = self.snn._multicompartment_pop[0].b_1_tot
+            v_init = np.stack([self.simulator.random_v(vr_low, vr_high, b_1_tot) for _ in range(num_replicas)])
+        solving_times, states = self.simulator.run(runtime, num_replicas=num_replicas, seed=seed, v_init=v_init,
+                                                   num_threads=num_threads)
+        solved = np.flatnonzero(solving_times != -1)
+        for replica in solved[np.argsort(solving_times[solved], kind='stable')]:
+            self.solving_times.append(solving_times[replica])
+            self._collected_solutions.append(states[replica])
+        if len(solved) == 0:
+            print('\nNo solution was found during runtime \n')
+            return states[0]
+        return self._collected_solutions[-len(solved)]
+
     def randomize_lfsr_seeds(self, board, _hack_lfsr=False, partition=None):
         # Randomise LFSR seed across all cores in board
         self.seeds_sequence = []
@@ -718,9 +929,16 @@ class QuboSolver(CspSolver):
                  q,
                  q_weight_scaling=1,
                  *args,
+                 target_energy=None,
                  **options
                  ):
+        """
+        :param q: Q matrix of the QUBO problem, dense or scipy.sparse.
+        :param q_weight_scaling: scaling of the Q couplings into synaptic weights.
+        :param target_energy: if given, a solution is only accepted when its energy x^T*Q*x is not above it.
+        """
         self.q = q
+        self.target_energy = target_energy
         self._q_weight_scaling = q_weight_scaling
         self.qubo = Qubo(q)
         self.biases = np.repeat(-self.qubo.q_mtx.diagonal(), 1)
@@ -736,6 +954,7 @@ class QuboSolver(CspSolver):
         self.is_compiled = False
         self.lfsr_offset = 0
         self.snn = None
+        self._constraint_index = None
 
     @property
     def q_weight_scaling(self):
@@ -772,6 +991,108 @@ class QuboSolver(CspSolver):
                 neuron.biasExp = e
 
 
+class CompiledCspSolver:
+    """Handle to a CspSolver whose SNN is compiled once and re-seeded for every run.
+
+    Only the per-run state is written to the board between runs: the voltages of the principal compartments, the
+    LFSR words if requested and the threshold of the summation neuron. Compartment ids are looked up once. Each run
+    is finished before the next one starts, which re-arms the management SNIP with a message on the acknowledgement
+    channel, so that it reports solving times relative to the start of the run. Currents of the previous run are not
+    reset, they vanish after box_duration timesteps.
+
+    :param solver: CspSolver or QuboSolver to compile.
+    :param runtime: maximum number of timesteps of each run.
+    :param partition: partition of the Loihi system to run on.
+    """
+
+    def __init__(self, solver, runtime, partition=None):
+        self.solver = solver
+        self.runtime = runtime
+        self.partition = partition
+        self.solving_times = []
+        solver.is_compiled = False
+        solver._build()
+        solver.solving_times = []
+        solver._channel_size = runtime
+        solver._summation_lmt_axon = solver.snn.integrator.connect_sumation_neuron_to_lmt(runtime)
+        _overwrite_c_snip(lfsr_offset=0)
+        self.board = solver.snn.main_net.compiler.compile(solver.snn.main_net)
+        solver._board = self.board
+        solver.is_compiled = True
+        solver._setup_snips(self.board)
+        self.principal_ids = solver._compartment_ids(solver.snn.principal_population)
+        self.compartments3_ids = solver._compartment_ids(solver.snn.principal_population_c3)
+        (boardId, chipId, coreId, cxId, cxProfileCfgId,
+         vthProfileCfgId) = solver.snn.main_net.resourceMap.compartment(solver.snn.integrator.summation_neuron.nodeId)
+        self._summation_vth_cfg = self.board.n2Chips[chipId].n2Cores[coreId].vthProfileCfg[vthProfileCfgId]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def set_cost(self, target_cost=None):
+        """Write the threshold of the summation neuron for target_cost, or for all variables if None."""
+        sigma_threshold = self.solver.snn.integrator.sigma_threshold if target_cost is None else target_cost
+        self.solver.snn.set_cost(sigma_threshold)
+        self._summation_vth_cfg.staticCfg.vth = sigma_threshold * 2 - 1
+
+    def run(self, seed, target_cost=None, vr_low=-20, vr_high=1, randomize_lfsr_seeds=False):
+        """Re-seed the compiled SNN and run it until it reports a valid solution or runtime is exhausted.
+
+        The last solving time reported by the run, relative to its start, is appended to solving_times, -1 if it
+        reported none.
+
+        :param seed: seed for python's RNG, which draws the initial voltages and LFSR words.
+        :param target_cost: number of satisfied variables that counts as a solution, all variables if None.
+        :param vr_low: low limit of the initial voltages, as for SnnBuilder.randomize_v.
+        :param vr_high: top limit of the initial voltages, as for SnnBuilder.randomize_v.
+        :param randomize_lfsr_seeds: whether to draw new LFSR words for all cores.
+        :return: state of the variables when the SNN reported a solution, last state otherwise.
+        """
+        solver, board = self.solver, self.board
+        random.seed(seed)
+        self.set_cost(target_cost)
+        solver.snn.randomize_v(vr_low, vr_high, board, compartment_ids=self.principal_ids)
+        if randomize_lfsr_seeds:
+            solver.randomize_lfsr_seeds(board)
+        board.run(self.runtime, aSync=True, partition=self.partition)
+        if self.solving_times:
+            # The SNIP waits for this message at the first timestep of every run after the first
+            solver._acknowledgement_channel.write(1, [2])
+        solving_time = solver._notification_channel.read(1)[0]
+        board.pause()
+        state = self._read_state()
+        while solving_time != -1 and solving_time < self.runtime and not solver._check_solution(state):
+            warnings.warn("Solver reported a false positive!")
+            # A single acknowledgement, any other would be read as the message of the next run
+            solver._acknowledgement_channel.write(1, [0])
+            solver._notification_channel.read(1)
+            board.run(self.runtime - solving_time, aSync=True, partition=self.partition)
+            solving_time = solver._notification_channel.read(1)[0]
+            board.pause()
+            state = self._read_state()
+        if solving_time != -1:
+            # Let the SNIP finish this run, it waits to be re-armed when the next one starts
+            solver._acknowledgement_channel.write(1, [1])
+            if solver._check_solution(state):
+                solver.solving_times.append(solving_time)
+                solver._collected_solutions.append(state)
+        board.finishRun()
+        self.solving_times.append(solving_time)
+        return state
+
+    def _read_state(self):
+        solver = self.solver
+        solver.extract_net_state_from_loihi(self.compartments3_ids)
+        return solver._online_read_delayed_state()
+
+    def close(self):
+        """Disconnect from the board."""
+        self.board.disconnect()
+
+
 class SnnBuilder:
     def __init__(self,
                  num_vars, dom_size,
@@ -793,11 +1114,13 @@ class SnnBuilder:
                  compartments_per_core=1024,
                  w_constraints_inh=None,
                  q_weight_scaling=None,
-                 multicompartments_per_summation_neuron=None
+                 multicompartments_per_summation_neuron=None,
+                 sparse_adjacency=False
                  ):
         self.multicompartments_per_summation_neuron = multicompartments_per_summation_neuron if \
             multicompartments_per_summation_neuron is not None else (2048 if num_vars > 16**2 else 4096)
         self.q_weight_scaling = q_weight_scaling
+        self.sparse_adjacency = sparse_adjacency or sparse.issparse(q_mtx)
         self.principal_adjacency_mtx = None
         self.v_initial = None
         self._w_constraints_inh = w_constraints_inh
@@ -1084,7 +1407,8 @@ class SnnBuilder:
         dummy = nx.ConnectionPrototype(signMode=nx.SYNAPSE_SIGN_MODE.INHIBITORY,  # todo delete
                                        weight=0,
                                        weightExponent=self.w_ij_exp)
-        self.principal_adjacency_mtx = CspAdjacencyMatrix(self.num_vars, self.dom_size, self.constraints)
+        self.principal_adjacency_mtx = CspAdjacencyMatrix(self.num_vars, self.dom_size, self.constraints,
+                                                          is_sparse=self.sparse_adjacency)
         mapping = self.principal_adjacency_mtx.adjacency_mtx
         prototype_list = [self.inter_domain_prototype_inh,
                           self.inter_variable_prototype]
@@ -1097,9 +1421,14 @@ class SnnBuilder:
                 self.principal_population.connect(self.principal_population, prototype=proto, connectionMask=mtx)
         elif self.q_mtx is not None:
             qc = np.eye(1)
-            q_mtx_no_diag = np.copy(self.q_mtx)
-            np.fill_diagonal(q_mtx_no_diag, 0)
-            q = np.kron(q_mtx_no_diag, qc)
+            if self.sparse_adjacency:
+                q = sparse.kron(self.q_mtx, qc, format='csr')
+                q = q - sparse.diags(q.diagonal(), format='csr')
+                q.eliminate_zeros()
+            else:
+                q_mtx_no_diag = np.copy(self.q_mtx)
+                np.fill_diagonal(q_mtx_no_diag, 0)
+                q = np.kron(q_mtx_no_diag, qc)
             adjacency_weights = wtas_mtx * self.w_wta_inh  - q * self.q_weight_scaling
             prototype = nx.ConnectionPrototype(signMode=nx.SYNAPSE_SIGN_MODE.INHIBITORY,
                                                delay=self.box_duration,
@@ -1124,11 +1453,12 @@ class SnnBuilder:
                                           **self.sigmaargs
                                           )
 
-    def randomize_v(self, vr_low, vr_high, board):
+    def randomize_v(self, vr_low, vr_high, board, compartment_ids=None):
         """ Generate a 24-bit binary random voltage between rest and threshold voltages.
 
         Args:
             :param board: board object obtained from the compiler.
+            :param compartment_ids: (chipId, coreId, cxId) of the principal compartments, looked up if None.
             :param vr_low: low limit from which random initial voltage will be drawn, values are
                         implicitly multiplied by 2**6, e.g., interval=(0, vThMant) will result in (0*2**6,vThMant*2**6).
             :param vr_high: top limit from which random initial voltage will be drawn, values are
@@ -1142,11 +1472,12 @@ class SnnBuilder:
                                        self.size)
 
         # get ids for base principal compartments
-        compartment_ids = []
-        for compartment in self.principal_population:
-            (boardId, chipId, coreId, cxId, cxProfileCfgId, vthProfileCfgId) = \
-                self.main_net.resourceMap.compartment(compartment.nodeId)
-            compartment_ids.append((chipId, coreId, cxId))
+        if compartment_ids is None:
+            compartment_ids = []
+            for compartment in self.principal_population:
+                (boardId, chipId, coreId, cxId, cxProfileCfgId, vthProfileCfgId) = \
+                    self.main_net.resourceMap.compartment(compartment.nodeId)
+                compartment_ids.append((chipId, coreId, cxId))
         # set v_initial for all base neurons
         count = 0
         for chipId, coreId, cxId in compartment_ids:
@@ -1226,15 +1557,26 @@ class CspPrototypeMap:
 
 
 class CspAdjacencyMatrix:
-    """Represent the connectivity of a neural CSP problem solver, encode WTAs and constraints."""
+    """Represent the connectivity of a neural CSP problem solver, encode WTAs and constraints.
+
+    :param num_variables: number of variables of the CSP.
+    :param domain_size: number of values each variable can take.
+    :param constraints: constraints of the CSP, as specified for Csp.
+    :param is_sparse: whether to build the adjacency matrix as a scipy.sparse CSR matrix, whose memory scales with
+    the number of constraints instead of the squared number of variables.
+    """
 
-    def __init__(self, num_variables=1, domain_size=1, constraints=None):
+    def __init__(self, num_variables=1, domain_size=1, constraints=None, is_sparse=False):
         self.num_variables = num_variables
         self.domain_size = domain_size
         self.constraints = constraints
+        self.is_sparse = is_sparse
         self.size = self.num_variables * self.domain_size
         self.adjacency_mtx = None
-        self._build()
+        if self.is_sparse:
+            self._build_sparse()
+        else:
+            self._build()
 
     def _build(self):
         """Generate the actual adjacency matrix."""
@@ -1264,6 +1606,115 @@ class CspAdjacencyMatrix:
         else:
             self.adjacency_mtx = wta_mtx
 
+    def _build_sparse(self):
+        """Generate the adjacency matrix block by block as a sparse matrix, with the same entries as _build."""
+        doms = self.domain_size
+        mtx = np.ones((doms, doms))
+        np.fill_diagonal(mtx, 2)
+        wta_mtx = sparse.kron(sparse.identity(self.num_variables, format='csr'), mtx, format='csr')
+        if self.constraints and len(self.constraints) > 0:
+            if type(self.constraints) is tuple:
+                # Apply a single relation for all constraints
+                pairs = np.asarray(self.constraints[0], dtype=int).reshape(-1, 2)
+                pairs = np.unique(np.vstack([pairs, pairs[:, ::-1]]), axis=0)
+                cids = sparse.csr_matrix((np.ones(len(pairs)), (pairs[:, 0], pairs[:, 1])),
+                                         shape=(self.num_variables, self.num_variables))
+                relation = np.logical_not(self.constraints[1]) * 3
+                cs_mtx = sparse.kron(cids, relation, format='csr')
+                self.adjacency_mtx = wta_mtx + cs_mtx
+            elif type(self.constraints) is list:
+                # Apply a relation per constraint. Later constraints replace the blocks of earlier ones, including
+                # WTA blocks.
+                blocks = {(i, i): mtx for i in range(self.num_variables)}
+                for i, j, r in self.constraints:
+                    blocks[(i, j)] = np.logical_not(r) * 3
+                    blocks[(j, i)] = np.logical_not(r) * 3
+                rows, cols, data = [], [], []
+                for (i, j), block in blocks.items():
+                    r, c = np.nonzero(block)
+                    rows.append(r + i * doms)
+                    cols.append(c + j * doms)
+                    data.append(block[r, c])
+                self.adjacency_mtx = sparse.csr_matrix(
+                    (np.concatenate(data).astype(float), (np.concatenate(rows), np.concatenate(cols))),
+                    shape=(self.size, self.size))
+        else:
+            self.adjacency_mtx = wta_mtx
+
+
+class ConstraintIndex:
+    """Precompiled constraints and QUBO couplings of a problem, to evaluate candidate states in bulk.
+
+    Constraint pairs are grouped by relation and the distinct relations are stacked in a single array, so the
+    violated constraints of a state, or of a batch of states, are found with one gather over all pairs.
+
+    :param constraints: constraints of a CSP, as specified for Csp.
+    :param q_mtx: Q matrix of a QUBO problem, dense or scipy.sparse.
+    """
+
+    def __init__(self, constraints=None, q_mtx=None):
+        self.q_mtx = q_mtx
+        self.var_pairs = np.zeros((0, 2), dtype=int)
+        self.relation_ids = np.zeros(0, dtype=int)
+        self.relations = np.ones((1, 1, 1), dtype=bool)
+        if constraints is not None and len(constraints) > 0:
+            self._compile(constraints)
+
+    def _compile(self, constraints):
+        """Build the arrays of variable pairs and relation ids, sorted by relation."""
+        if type(constraints) is tuple:
+            var_pairs = np.asarray(constraints[0], dtype=int).reshape(-1, 2)
+            self.relations = np.asarray(constraints[1], dtype=bool)[np.newaxis]
+            relation_ids = np.zeros(len(var_pairs), dtype=int)
+        else:
+            relations, relation_keys, relation_ids = [], dict(), []
+            for _, _, r in constraints:
+                r = np.asarray(r, dtype=bool)
+                key = (r.shape, r.tobytes())
+                if key not in relation_keys:
+                    relation_keys[key] = len(relations)
+                    relations.append(r)
+                relation_ids.append(relation_keys[key])
+            var_pairs = np.asarray([(x, y) for x, y, _ in constraints], dtype=int)
+            self.relations = np.stack(relations)
+            relation_ids = np.asarray(relation_ids, dtype=int)
+        order = np.argsort(relation_ids, kind='stable')
+        self.var_pairs = var_pairs[order]
+        self.relation_ids = relation_ids[order]
+
+    def violations(self, states):
+        """Count the violated constraints of a state or of a batch of states.
+
+        Constraints on an undefined variable, whose state is -1, count as violated.
+
+        :param states: values of the variables, of shape (num_variables,) or (batch_size, num_variables).
+        :return: number of violated constraints, per state for a batch.
+        """
+        states = np.asarray(states, dtype=int)
+        x = states[..., self.var_pairs[:, 0]]
+        y = states[..., self.var_pairs[:, 1]]
+        satisfied = self.relations[self.relation_ids, np.maximum(x, 0), np.maximum(y, 0)]
+        return np.count_nonzero(~satisfied | (x < 0) | (y < 0), axis=-1)
+
+    def energy(self, x):
+        """Evaluate the QUBO cost x^T*Q*x of a binary vector or of a batch of them, one per row."""
+        assert self.q_mtx is not None, "Energy is only defined for QUBO problems."
+        x = np.asarray(x)
+        qx = np.asarray(self.q_mtx.dot(x.T)).T
+        return (x * qx).sum(-1)
+
+    def evaluate(self, states):
+        """Count violations and evaluate the QUBO energy of states as read out from the solver.
+
+        QUBO variables have a single state, so a variable is 1 if its state is defined (0) and 0 otherwise (-1).
+
+        :param states: values of the variables, of shape (num_variables,) or (batch_size, num_variables).
+        :return: tuple (violations, energy), energy is None if there is no Q matrix.
+        """
+        states = np.asarray(states, dtype=int)
+        energy = self.energy((states >= 0).astype(int)) if self.q_mtx is not None else None
+        return self.violations(states), energy
+
 
 class SummationNeuron(Probable):  # Todo there are side effects with Logical core id so this has to be created last
     def __init__(self, sigma_threshold, _do_snips_setup=True, multicompartment_population=None,
@@ -2046,6 +2497,24 @@ class MultiCompartment(Probable):
         self.compartment_group.net.disconnect()
 
 
+def _init_portfolio_worker(solver, stop_event):
+    """Initialize a worker process of CspSolver.solve_portfolio.
+
+    :param CspSolver solver: solver inherited from the parent process on fork.
+    :param stop_event: event set by the parent process once the remaining runs are cancelled.
+    """
+    global _portfolio_solver, _portfolio_stop_event
+    _portfolio_solver = solver
+    _portfolio_stop_event = stop_event
+
+
+def _solve_in_portfolio_worker(task):
+    """Solve with one seed of a portfolio in a worker process, None if the run was cancelled before it started."""
+    if _portfolio_stop_event.is_set():
+        return None
+    return _portfolio_solver._portfolio_run(*task)
+
+
 def _overwrite_c_snip(lfsr_offset):
     """Used for writing the offset time from the lfsr hack."""
     import fileinput
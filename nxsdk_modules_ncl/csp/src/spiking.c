@@ -30,13 +30,27 @@ int probe_id = 0; //  ID of the spike_probe, if only summation is probed it will
 int condition = 0;
 int lfsr_offset = 0; 
 int Dummy = 0;
+int rearm = 2; // Message of the host to re-arm the SNIP for a new run on the same board
+int runEndStep = -1; // Last timestep of the finished run, -1 while the first run is in progress
+int runStartStep = 0;
 
 int do_spiking(runState *s) {// Run SNIP right from the start of simulation and get channel ID
 if (s->time_step==1) {
     channelIDST = getChannelID("nxsummlmt");
     channelIDACK = getChannelID("nxstacknow");
     }
-    if (s->time_step < lfsr_offset+2) {
+    // A new run after a finished one re-seeds the same board, wait for the host to re-arm the SNIP and count time
+    // from the start of the run
+    if (Dummy != 0 && runEndStep != -1 && s->time_step > runEndStep) {
+    int message = 0;
+    readChannel(channelIDACK, &message, 1);
+    if (message == rearm) {
+        Dummy = 0;
+        runEndStep = -1;
+        runStartStep = s->time_step - 1;
+        }
+    }
+    if (s->time_step - runStartStep < lfsr_offset+2) {
     SPIKE_COUNT[(s->time_step-1)&3][0x20+probe_id] = 0;
     return 0;
     }
@@ -56,8 +70,8 @@ void run_spiking(runState *s) {
     if (SPIKE_COUNT[(s->time_step)&3][0x20+probe_id]==1) {
                   printf("SPIKE ON SNIP t=%d and count = %d\n", s->time_step,SPIKE_COUNT[(s->time_step-1)&3][0x20+probe_id]);
         SPIKE_COUNT[(s->time_step)&3][0x20+probe_id] = 0;   // Clear LMT spike counters to prevent overflow
-        if (s->time_step>lfsr_offset+2){
-        int solutionTime=s->time_step-1;
+        if (s->time_step-runStartStep>lfsr_offset+2){
+        int solutionTime=s->time_step-1-runStartStep;
         printf("LMT is writing to channel %d \n", solutionTime);
         writeChannel(channelIDST, &solutionTime, 1);            // Write solution time to channel
         readChannel(channelIDACK, &Dummy, 1);
@@ -67,11 +81,13 @@ void run_spiking(runState *s) {
              writeChannel(channelIDST, &falsePositive, 1);            // Write solution time to channel
             }
         else {
+            runEndStep = s->total_steps;
             }
         }
         }
     else if (s->time_step == s->total_steps && Dummy==0) {
         Dummy=3;
+        runEndStep = s->total_steps;
         printf("\n LMT will write -1 to channel \n");
         writeChannel(channelIDST, &noSolution, 1);             // Write -1 to channel if no solution registered
         printf("\n LMT wrote -1 to channel \n");
@@ -80,6 +80,53 @@ class TestCspSolver(unittest.TestCase):
         solution = self.csp_solver.solve(runtime=100, vr_low=-20)
         print(solution)
 
+    def test_solve_on_cpu(self):
+        solution = self.csp_solver.solve(runtime=1000, backend='cpu', cpukwargs=dict(num_replicas=4, num_threads=2))
+        self.assertEqual(len(self.csp_solver.solving_times), len(self.csp_solver.collected_solutions))
+        if self.csp_solver.solving_times:
+            self.assertTrue(self.csp_solver._check_solution(solution))
+
+    def test_compiled_solver_reruns(self):
+        runtime = 1000
+        with self.csp_solver.compile(runtime=runtime) as compiled:
+            for seed in range(3):
+                solution = compiled.run(seed=seed)
+                print(solution)
+                # Every run reports, either a solving time or -1 once runtime is exhausted
+                self.assertEqual(seed + 1, len(compiled.solving_times))
+        # Solving times are relative to the start of their own run, not to the first run on the board
+        for solving_time in compiled.solving_times:
+            self.assertTrue(solving_time == -1 or 0 < solving_time <= runtime)
+        self.assertEqual(len(self.csp_solver.solving_times), len(self.csp_solver.collected_solutions))
+        self.assertLessEqual(len(self.csp_solver.solving_times), 3)
+        for solution in self.csp_solver.collected_solutions:
+            self.assertTrue(self.csp_solver._check_solution(solution))
+
+    def test_solve_portfolio_on_cpu(self):
+        result = self.csp_solver.solve_portfolio(4, runtime=1000, seed=0, num_workers=2, stop_on_first=False,
+                                                 backend='cpu')
+        self.assertEqual(4, result.num_runs)
+        self.assertEqual(4, len(set(result.seeds)))
+        if result.success_probability > 0:
+            self.assertTrue(self.csp_solver._check_solution(result.best_solution))
+        self.assertEqual(sum(result.valid), len(self.csp_solver.collected_solutions))
+
+    def test_solve_portfolio_stop_on_first(self):
+        result = self.csp_solver.solve_portfolio(8, runtime=1000, seed=0, num_workers=2, stop_on_first=True,
+                                                 backend='cpu')
+        self.assertLessEqual(sum(result.valid), 1)
+        if result.success_probability > 0:
+            self.assertTrue(result.valid[-1])
+        else:
+            self.assertEqual(8, result.num_runs)
+        self.assertEqual(sum(result.valid), len(self.csp_solver.collected_solutions))
+
+    def test_solve_portfolio_in_process(self):
+        result = self.csp_solver.solve_portfolio(3, runtime=1000, seed=0, stop_on_first=False, backend='cpu')
+        self.assertEqual(3, result.num_runs)
+        # Each run solves a single replica, whose reported state is collected once
+        self.assertEqual(sum(t != -1 for t in result.solving_times), len(self.csp_solver.collected_solutions))
+
 
     def test_solve_sudoku(self):
         from nxsdk_modules.csp.src.translators.latin2csp import translateSudoku
@@ -249,6 +296,96 @@ class TestCspAdjMat(unittest.TestCase):
             plt.imshow(am.adjacency_mtx)
             plt.show()
 
+    def test_sparse_adj_mtx(self):
+        """Sparse build must produce the same matrix as the dense one for both constraint formats."""
+        relation = np.logical_not(np.eye(3))
+        for constraints in [None,
+                            ([(0, 1), (1, 2), (2, 0)], relation),
+                            [(1, 2, np.eye(3)), (0, 1, relation), (2, 1, relation)]]:
+            dense = CspAdjacencyMatrix(num_variables=3, domain_size=3, constraints=constraints)
+            sparse = CspAdjacencyMatrix(num_variables=3, domain_size=3, constraints=constraints, is_sparse=True)
+            self.assertTrue(np.array_equal(dense.adjacency_mtx, sparse.adjacency_mtx.toarray()))
+
+
+class TestConstraintIndex(unittest.TestCase):
+    """Tests the vectorized evaluation of candidate solutions against a loop over the constraints."""
+
+    @staticmethod
+    def count_violations(constraints, state):
+        if type(constraints) is tuple:
+            constraints = [(x, y, constraints[1]) for x, y in constraints[0]]
+        return sum(1 for x, y, r in constraints if state[x] < 0 or state[y] < 0 or r[state[x], state[y]] == 0)
+
+    def test_violations(self):
+        rng = np.random.RandomState(0)
+        relation = np.logical_not(np.eye(3))
+        pairs = [tuple(p) for p in rng.randint(0, 8, (20, 2))]
+        for constraints in [(pairs, relation),
+                            [(x, y, relation if i % 3 else rng.rand(3, 3) > 0.5) for i, (x, y) in enumerate(pairs)]]:
+            index = ConstraintIndex(constraints=constraints)
+            states = rng.randint(-1, 3, (16, 8))
+            expected = [self.count_violations(constraints, state) for state in states]
+            self.assertEqual(expected, list(index.violations(states)))
+            self.assertEqual(expected[0], index.violations(states[0]))
+
+    def test_qubo_energy(self):
+        q = np.asarray([[-5, 2, 4, 0],
+                        [2, -3, 1, 0],
+                        [4, 1, -8, 5],
+                        [0, 0, 5, -6]])
+        states = np.asarray([[0, -1, -1, 0], [-1, 0, 0, -1], [0, 0, 0, 0]])
+        x = (states >= 0).astype(int)
+        violations, energies = ConstraintIndex(q_mtx=q).evaluate(states)
+        self.assertEqual([0, 0, 0], list(violations))
+        self.assertEqual([x_i @ q @ x_i for x_i in x], list(energies))
+
+
+class TestCpuSnnSimulator(unittest.TestCase):
+    """Tests the approximate CPU simulator on a graph coloring problem, without building an NxNet."""
+
+    def setUp(self) -> None:
+        self.constraints = ([(0, 1), (1, 2), (2, 3), (3, 0), (0, 2)], np.logical_not(np.eye(3)))
+        mapping = CspAdjacencyMatrix(4, 3, self.constraints, is_sparse=True).adjacency_mtx
+        weights = ((mapping == 1) + (mapping == 3)).astype(int) * -100 * 2 ** 12
+        self.simulator = CpuSnnSimulator(weights, bias=5440, v_th=32760, num_variables=4)
+        random.seed(1)
+        self.v_init = np.stack([self.simulator.random_v(-20, 1, 5440) for _ in range(8)])
+
+    def test_solutions_are_valid(self):
+        solving_times, states = self.simulator.run(2000, num_replicas=8, seed=3, v_init=self.v_init)
+        self.assertTrue((solving_times != -1).any())
+        violations = ConstraintIndex(constraints=self.constraints).violations(states[solving_times != -1])
+        self.assertTrue((violations == 0).all())
+
+    def test_replicas_do_not_depend_on_threads(self):
+        times_1, states_1 = self.simulator.run(500, num_replicas=8, seed=3, v_init=self.v_init)
+        times_3, states_3 = self.simulator.run(500, num_replicas=8, seed=3, v_init=self.v_init, num_threads=3)
+        self.assertTrue(np.array_equal(times_1, times_3))
+        self.assertTrue(np.array_equal(states_1, states_3))
+
+
+class TestPortfolioResult(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.result = PortfolioResult(runtime=100)
+        for seed, solving_time in enumerate([10, -1, 30, -1, 20, -1, -1, -1, 40, -1]):
+            self.result.append(seed, solving_time, 1., np.asarray([seed]), solving_time != -1)
+
+    def test_statistics(self):
+        self.assertEqual(10, self.result.num_runs)
+        self.assertAlmostEqual(0.4, self.result.success_probability)
+        self.assertEqual(25, self.result.median_tts())
+        self.assertEqual([0], list(self.result.best_solution))
+        self.assertAlmostEqual(100 * np.log(0.01) / np.log(0.6), self.result.tts99)
+        self.assertAlmostEqual(np.log(0.01) / np.log(0.6), self.result.tts(wall_time=True))
+
+    def test_statistics_without_success(self):
+        result = PortfolioResult(runtime=100)
+        result.append(0, -1, 1., np.asarray([-1]), False)
+        self.assertIsNone(result.best_solution)
+        self.assertTrue(np.isnan(result.median_tts()))
+        self.assertEqual(np.inf, result.tts99)
+
 
 class TestCspPrototypeMap(unittest.TestCase):
     def test_prototype_map(self):
@@ -39,19 +39,28 @@ from nxsdk_modules_ncl.dnn.tests.test_softreset import printLayerMappings, \
 
 class ComposableDNN(AbstractComposable):
     """A DNN that is composable. See nxsdk_modules_ncl.dnn.src.dnn_layers.NxModel which is the underlying DNN Model"""
-    def __init__(self, model: 'NxModel', num_steps_per_img: int, enable_reset: bool = True):
+    def __init__(self, model: 'NxModel', num_steps_per_img: int, enable_reset: bool = True,
+                 readout_mode: str = 'class', num_imgs: int = None):
         """
         Wraps a DNNModel and makes it composable
 
         :param model (nxsdk_modules_ncl.dnn.src.dnn_layers.NxModel): The underlying DNN Model created from NxTF Layers
         :param num_steps_per_img: Number of steps to run for each image
         :param enable_reset: Whether to reset states after ``num_steps_per_img``.
+        :param readout_mode: What the readout snip sends to the readout channel after each image. 'class' sends the
+            index of the output neuron with the most spikes, 'counts' sends the spike counts (or voltages, for a
+            softmax output layer) of all output neurons.
+        :param num_imgs: Number of images that are run on the board, which sizes the readout channel. Defaults to
+            100000 images.
         """
         super().__init__()
 
         self._logger = get_logger("NET.DNN")
 
-        self._build(model=model, num_steps_per_img=num_steps_per_img, enableReset=enable_reset)
+        assert readout_mode in ('class', 'counts'), "Unknown readout mode {}".format(readout_mode)
+
+        self._build(model=model, num_steps_per_img=num_steps_per_img, enableReset=enable_reset,
+                    readoutMode=readout_mode, numImgs=100000 if num_imgs is None else num_imgs)
 
     def _build(self, *args, **kwargs):
         """Builds the ports, probes and snips for the composable. This method is called from base class constructor"""
@@ -61,6 +70,20 @@ class ComposableDNN(AbstractComposable):
         self._addProcesses()
         self._num_steps_per_img = kwargs["num_steps_per_img"]
         self._enableReset = kwargs['enableReset']
+        self._readoutMode = kwargs['readoutMode']
+        self._numImgs = kwargs['numImgs']
+
+    @property
+    def numReadoutElementsPerImg(self) -> int:
+        """Number of elements the readout snip writes to the readout channel per image"""
+        if self._readoutMode == 'counts':
+            return int(np.prod(self._dnn.layers[-1].output_shape[1:]))
+        return 1
+
+    @property
+    def numReadoutElements(self) -> int:
+        """Number of elements the readout snip writes to the readout channel over all images"""
+        return self.numReadoutElementsPerImg * self._numImgs
 
     def _addPorts(self):
         """Adds ports to the composable"""
@@ -248,6 +271,7 @@ class ComposableDNN(AbstractComposable):
             "READ_SPIKES": int(readSpikes),
             "NUM_CLASSES": num_classes,
             "NUM_STEPS_PER_IMG": self._num_steps_per_img,
+            "SEND_COUNTS": int(self._readoutMode == 'counts'),
             "LMT_OUTPUT_SPIKE_COUNTER_IDS": "{" + str(lmt_output_spike_counter_ids)[1:-1] + "}",
             "CORE_IDS": "{" + str(cores)[1:-1] + "}",
             "CX_IDS": "{" + str(cxIds)[1:-1] + "}"
@@ -280,7 +304,8 @@ class ComposableDNN(AbstractComposable):
         readout_process = self.processes.readout
         processKey = readout_process.getProcessKey()
         snip_readout = processAggregator.getEmbeddedSnipForProcessKey(processKey)
-        self.readout_channel = board.createChannel(bytes('readout', 'utf-8'), "int", numElements=100000)
+        self.readout_channel = board.createChannel(bytes('readout', 'utf-8'), "int",
+                                                   numElements=self.numReadoutElements)
         self.readout_channel.connect(snip_readout, None)
 
     @staticmethod
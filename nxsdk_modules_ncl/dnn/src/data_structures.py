@@ -16,6 +16,7 @@
 Data structures for CNN partitioner.
 """
 
+import json
 import os
 import pickle
 from concurrent.futures import ThreadPoolExecutor
@@ -355,31 +356,331 @@ class Layer:
                 'coreOccupancy': self.coreOccupancy}
 
 
+# Version of the file format written by ``serializeLayer``. Increment when
+# the layout of the arrays changes.
+LAYER_FORMAT_VERSION = 1
+LAYER_FILE_EXTENSION = '.npz'
+
+
+def _jsonDefault(obj):
+    """Convert numpy scalars, which the json module cannot serialize."""
+
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError("{} is not JSON serializable.".format(type(obj)))
+
+
+def _packArrays(arrays):
+    """Concatenate a list of 1D arrays, some of which may be ``None``.
+
+    :param list[np.ndarray | None] arrays: Arrays to concatenate.
+
+    :return: Concatenated arrays, and the length of each array (-1 if
+        ``None``).
+    :rtype: tuple[np.ndarray, np.ndarray]
+    """
+
+    lengths = np.array([-1 if a is None else len(a) for a in arrays], int)
+    arrays = [np.ravel(a) for a in arrays if a is not None]
+    data = np.concatenate(arrays) if len(arrays) else np.zeros(0, int)
+
+    return data, lengths
+
+
+def _unpackArrays(data, lengths):
+    """Inverse of ``_packArrays``.
+
+    :param np.ndarray data: Concatenated arrays.
+    :param np.ndarray lengths: Length of each array (-1 if ``None``).
+
+    :return: List of arrays (views into ``data``).
+    :rtype: list[np.ndarray | None]
+    """
+
+    ptrs = np.concatenate([[0], np.cumsum(np.maximum(lengths, 0))])
+
+    return [None if n < 0 else data[i:i + n]
+            for i, n in zip(ptrs[:-1].tolist(), lengths.tolist())]
+
+
+def _layerToArrays(layer):
+    """Flatten the object graph of a compiled layer into a set of arrays.
+
+    The partitions of the layer are stored in tables, where each row
+    corresponds to one partition, synFmt, synapse group, neuron, synEntry or
+    axon group. Variable-length vectors (e.g. synapse indices) are
+    concatenated and stored together with their lengths. References between
+    objects of a partition are stored as indices relative to that partition.
+
+    :param Layer layer: Compiled layer.
+
+    :return: Dictionary of arrays.
+    :rtype: dict[str, np.ndarray]
+    """
+
+    partitions = layer.partitions
+
+    arrays = {
+        'version': LAYER_FORMAT_VERSION,
+        'id': layer.id,
+        'type': layer.type,
+        'kwargs': json.dumps([layer.compartmentKwargs,
+                              layer.connectionKwargs], default=_jsonDefault),
+        'postLayerId': layer.postLayer if isinstance(layer.postLayer, str)
+        else layer.postLayer.id,
+        'coreIdMap': layer.coreIdMap,
+        'multiplicityMap': layer.multiplicityMap,
+        'isMapped': layer._isMapped,
+        'partitions': np.array(
+            [[p.id, p.sizeInterleaved, p.chipCounter,
+              -1 if p.chipId is None else p.chipId,
+              -1 if p.coreId is None else p.coreId, p.isInhibitory]
+             for p in partitions], int).reshape((-1, 6)),
+        'resetModes': np.array([p.resetMode for p in partitions], str),
+    }
+
+    if layer.coreOccupancy is not None:
+        arrays['coreOccupancy'] = layer.coreOccupancy
+
+    # Compartment groups.
+    cxGrps = [p.compartmentGroup for p in partitions]
+    for attr in CompartmentGroup.__slots__:
+        arrays['cx_' + attr] = _packArrays(
+            [None if g is None else getattr(g, attr) for g in cxGrps])
+
+    # SynFmts.
+    synFmts = [sf for p in partitions for sf in p.synFmts]
+    arrays['synFmtsPerPartition'] = [len(p.synFmts) for p in partitions]
+    arrays['synFmts'] = np.array(
+        [[sf.id, *sf.asArray(), isinstance(sf.compression, Compression)]
+         for sf in synFmts], int).reshape((-1, 11))
+
+    # Synapse groups, and the synEntries of each of their neurons.
+    synGrps = [synGrp for p in partitions for synGrp in p.synapseGroups]
+    synEntryArrays = [synGrp.synEntryArrays for synGrp in synGrps]
+    synEntryFmtIdxs = []
+    for p in partitions:
+        synFmtIdxs = {id(sf): i for i, sf in enumerate(p.synFmts)}
+        for synGrp in p.synapseGroups:
+            synEntries = synGrp.synEntryArrays
+            # Indices into the synFmts of the partition.
+            synFmtMap = np.array([synFmtIdxs[id(sf)]
+                                  for sf in synEntries.synFmts], int)
+            synEntryFmtIdxs.append(synFmtMap[synEntries.synFmtIds]
+                                   if synEntries.numSynEntries else
+                                   np.zeros(0, int))
+
+    arrays['synGrpsPerPartition'] = [len(p.synapseGroups)
+                                     for p in partitions]
+    arrays['synGrpIds'] = [synGrp.id for synGrp in synGrps]
+    arrays['neuronsPerSynGrp'] = [a.numNeurons for a in synEntryArrays]
+    arrays['synEntriesPerNeuron'] = np.concatenate(
+        [np.diff(a.neuronPtrs) for a in synEntryArrays] + [np.zeros(0, int)])
+    arrays['synEntries'] = np.array([
+        np.concatenate([a.prefixOffsets for a in synEntryArrays] +
+                       [np.zeros(0, int)]),
+        np.concatenate(synEntryFmtIdxs + [np.zeros(0, int)])],
+        int).reshape((2, -1))
+    numSyn = [a.getNumSynPerSynEntry() for a in synEntryArrays]
+    for attr in ['idxs', 'weights', 'kernelIds', 'delays']:
+        values = [getattr(a, attr) for a in synEntryArrays]
+        arrays['syn_' + attr] = (
+            np.concatenate([v for v in values if v is not None] +
+                           [np.zeros(0, int)]),
+            np.concatenate([n if v is not None else -np.ones_like(n)
+                            for v, n in zip(values, numSyn)] +
+                           [np.zeros(0, int)]))
+
+    # Input axon groups.
+    inAxGrps = []
+    inAxGrpTable = []
+    for p in partitions:
+        synGrpIdxs = {id(g): i for i, g in enumerate(p.synapseGroups)}
+        for inAxGrp in p.inputAxonGroups:
+            inAxGrps.append(inAxGrp)
+            inAxGrpTable.append([inAxGrp.id, inAxGrp.cxBase,
+                                 synGrpIdxs[id(inAxGrp.synGroup)]])
+    arrays['inAxGrpsPerPartition'] = [len(p.inputAxonGroups)
+                                      for p in partitions]
+    arrays['inAxGrps'] = np.array(inAxGrpTable, np.int64).reshape((-1, 3))
+    for attr in ['srcNodeIds', 'multiplicity']:
+        arrays['inAx_' + attr] = _packArrays(
+            [getattr(g, attr) for g in inAxGrps])
+
+    # Output axon groups.
+    outAxGrps = [g for p in partitions for g in p.outputAxonGroups]
+    arrays['outAxGrpsPerPartition'] = [len(p.outputAxonGroups)
+                                       for p in partitions]
+    arrays['outAxGrps'] = np.array(
+        [[g.inAxGrpId, g._postChipCounter] for g in outAxGrps],
+        np.int64).reshape((-1, 2))
+    for attr in ['cxIds', 'multiplicity', 'relSrcIds']:
+        arrays['outAx_' + attr] = _packArrays(
+            [getattr(g, attr) for g in outAxGrps])
+
+    # Split (data, lengths) tuples into separate arrays.
+    for key in list(arrays):
+        if isinstance(arrays[key], tuple):
+            arrays[key + '_data'], arrays[key + '_len'] = arrays.pop(key)
+
+    return arrays
+
+
+def _layerFromArrays(arrays):
+    """Rebuild a compiled layer from the arrays created by ``_layerToArrays``.
+
+    :param dict[str, np.ndarray] | np.lib.npyio.NpzFile arrays: Arrays.
+
+    :return: Compiled layer. Its ``postLayer`` attribute holds the id of the
+        post-layer.
+    :rtype: Layer
+    """
+
+    version = int(arrays['version'])
+    assert version == LAYER_FORMAT_VERSION, \
+        "Unsupported layer file format version {}.".format(version)
+
+    def unpack(key):
+        return _unpackArrays(arrays[key + '_data'], arrays[key + '_len'])
+
+    def split(items, counts):
+        items = iter(items)
+        return [[next(items) for _ in range(n)] for n in counts]
+
+    compartmentKwargs, connectionKwargs = json.loads(str(arrays['kwargs']))
+    layer = Layer(arrays['id'].item(), str(arrays['type']), compartmentKwargs,
+                  connectionKwargs, arrays['coreIdMap'],
+                  arrays['multiplicityMap'])
+    layer.postLayer = arrays['postLayerId'].item()
+    if 'coreOccupancy' in arrays:
+        layer.coreOccupancy = arrays['coreOccupancy']
+    layer._srcIdMap = None
+
+    # SynFmts.
+    synFmts = []
+    for row in arrays['synFmts'].tolist():
+        synFmtId, cIdxOffset, cIdxMult, numIdxBits, numSkipBits, numWgtBits, \
+            compression, signMode, numDlyBits, softReset, isEnum = row
+        if isEnum:
+            compression = Compression(compression)
+        synFmts.append(SynFmt(synFmtId, cIdxOffset, cIdxMult, numIdxBits,
+                              numSkipBits, numWgtBits, compression, signMode,
+                              numDlyBits, bool(softReset)))
+    synFmts = split(synFmts, arrays['synFmtsPerPartition'])
+
+    # SynEntries, as one SynEntryArrays container per synapse group.
+    prefixOffsets, synFmtIdxs = arrays['synEntries']
+    numSynPerSynEntry = arrays['syn_idxs_len']
+    synPtrs = np.concatenate([[0], np.cumsum(numSynPerSynEntry)])
+    neuronPtrs = np.concatenate([[0],
+                                 np.cumsum(arrays['synEntriesPerNeuron'])])
+    synGrpPtrs = np.concatenate([[0], np.cumsum(arrays['neuronsPerSynGrp'])])
+    synData = {}
+    for attr in ['idxs', 'weights', 'kernelIds', 'delays']:
+        data = arrays['syn_' + attr + '_data']
+        hasData = arrays['syn_' + attr + '_len'] >= 0
+        if not np.all(hasData):
+            # Fill in zeros for synEntries without data.
+            _data = np.zeros(synPtrs[-1], data.dtype)
+            _data[np.repeat(hasData, numSynPerSynEntry)] = data
+            data = _data
+        synData[attr] = (data, hasData)
+
+    synGrps = []
+    for j, synGrpId in enumerate(arrays['synGrpIds'].tolist()):
+        n0, n1 = synGrpPtrs[j], synGrpPtrs[j + 1]
+        e0, e1 = neuronPtrs[n0], neuronPtrs[n1]
+        s0, s1 = synPtrs[e0], synPtrs[e1]
+        synGrpData = [None if e1 > e0 and not np.any(hasData[e0:e1])
+                      else data[s0:s1]
+                      for data, hasData in synData.values()]
+        synGrps.append((synGrpId, (
+            neuronPtrs[n0:n1 + 1] - e0, synPtrs[e0:e1 + 1] - s0,
+            prefixOffsets[e0:e1], synFmtIdxs[e0:e1], synGrpData)))
+    synGrps = split(synGrps, arrays['synGrpsPerPartition'])
+
+    # Axon groups.
+    inAxGrps = split(zip(arrays['inAxGrps'].tolist(),
+                         unpack('inAx_srcNodeIds'),
+                         unpack('inAx_multiplicity')),
+                     arrays['inAxGrpsPerPartition'])
+    outAxGrps = split(zip(arrays['outAxGrps'].tolist(), unpack('outAx_cxIds'),
+                          unpack('outAx_multiplicity'),
+                          unpack('outAx_relSrcIds')),
+                      arrays['outAxGrpsPerPartition'])
+
+    cxGrps = zip(*[unpack('cx_' + attr)
+                   for attr in CompartmentGroup.__slots__])
+
+    for i, (partitionId, sizeInterleaved, chipCounter, chipId, coreId,
+            isInhibitory) in enumerate(arrays['partitions'].tolist()):
+        partition = Partition(partitionId, chipCounter, sizeInterleaved, layer,
+                              bool(isInhibitory),
+                              str(arrays['resetModes'][i]))
+        partition.chipId = None if chipId < 0 else chipId
+        partition.coreId = None if coreId < 0 else coreId
+
+        cxGrp = next(cxGrps)
+        if cxGrp[0] is not None:
+            partition.addCompartmentGroup(CompartmentGroup(*cxGrp))
+
+        for synFmt in synFmts[i]:
+            partition.addSynFmt(synFmt)
+
+        for synGrpId, (neuronPtrs, synPtrs, prefixOffsets, synFmtIdxs,
+                       (idxs, weights, kernelIds, delays)) in synGrps[i]:
+            synEntries = SynEntryArrays(neuronPtrs, synPtrs, prefixOffsets,
+                                        synFmtIdxs, synFmts[i], idxs, weights,
+                                        kernelIds, delays)
+            partition.addSynapseGroup(SynapseGroup(synGrpId, synEntries))
+
+        for (inAxGrpId, cxBase, synGrpIdx), srcNodeIds, multiplicity in \
+                inAxGrps[i]:
+            inAxGrp = InputAxonGroup(srcNodeIds, multiplicity,
+                                     partition.synapseGroups[synGrpIdx],
+                                     cxBase, partition)
+            inAxGrp._id = inAxGrpId
+            partition.addInputAxonGroup(inAxGrp)
+
+        for (inAxGrpId, postChipCounter), cxIds, multiplicity, relSrcIds in \
+                outAxGrps[i]:
+            partition.addOutputAxonGroup(OutputAxonGroup.fromInAxGrpId(
+                cxIds, multiplicity, relSrcIds, inAxGrpId, postChipCounter,
+                partition))
+
+        layer.addPartition(partition)
+
+    if arrays['isMapped']:
+        layer.setMapped()
+
+    return layer
+
+
 def serializeLayer(layer, path):
-    """Save layer as pickle file.
+    """Save layer as npz file.
+
+    The object graph of the layer is stored as a set of flat arrays, see
+    ``_layerToArrays``.
 
     :param Layer layer: Layer to serialize.
     :param str path: Where to save output file.
     """
 
-    postLayer = layer.postLayer
-
     # PostLayer will be None if the last layers of the network are "virtual"
     # layers like Flatten or Reshape. We do not want to serialize those.
-    if postLayer is None:
+    if layer.postLayer is None:
         return
 
-    # Temporarily overwrite pointer to parent layer to avoid redundant storage.
-    layer.postLayer = postLayer.id
-
-    with open(os.path.join(path, layer.id + '.pickle'), 'wb') as f:
-        pickle.dump(layer, f)
-
-    layer.postLayer = postLayer
+    np.savez(os.path.join(path, layer.id + LAYER_FILE_EXTENSION),
+             **_layerToArrays(layer))
 
 
 def deserializeLayer(path, filename):
-    """Load layer from pickle file.
+    """Load layer from npz file.
+
+    Files in the previous pickle format are still supported. If ``filename``
+    does not exist but a pickle file of the same name does, that one is
+    loaded.
 
     :param str path: Directory to saved file.
     :param str filename: Name of file.
@@ -388,12 +689,23 @@ def deserializeLayer(path, filename):
     :rtype: Layer
     """
 
-    with open(os.path.join(path, filename), 'rb') as f:
-        return pickle.load(f)
+    filepath = os.path.join(path, filename)
+    root, ext = os.path.splitext(filepath)
+    if ext != '.pickle' and not os.path.exists(filepath) and \
+            os.path.exists(root + '.pickle'):
+        filepath = root + '.pickle'
+        ext = '.pickle'
+
+    if ext == '.pickle':
+        with open(filepath, 'rb') as f:
+            return pickle.load(f)
+
+    with np.load(filepath) as arrays:
+        return _layerFromArrays(arrays)
 
 
 def saveMappableLayers(layers, path):
-    """Store each partitioned and compiled layer as pickle file on disk.
+    """Store each partitioned and compiled layer as npz file on disk.
 
     :param list[Layer] layers: List of Layer objects.
     :param str path: Where to save partition.
@@ -403,7 +715,7 @@ def saveMappableLayers(layers, path):
     if not os.path.exists(path):
         os.makedirs(path)
 
-    # Save each individual layer as pickle file.
+    # Save each individual layer as npz file.
     with ThreadPoolExecutor() as executor:
         futures = [executor.submit(serializeLayer, layer, path)
                    for layer in layers]
@@ -415,11 +727,11 @@ def loadMappableLayers(path):
     """Load compiled partitions from disk.
 
     The partitions are stored in the subfolder ``<path>/compiled_partitions``.
-    The method expects one pickle file for each layer, and skips over any
-    non-pickle files in that folder.
+    The method expects one npz file (or pickle file, as written by previous
+    versions) for each layer, and skips over any other files in that folder.
 
     :raises FileNotFoundError if the directory does not exist or contains no
-    pickle files.
+    layer files.
 
     :param str path: Path to stored partition files.
     :return: List of compiled ``Layer`` objects.
@@ -431,8 +743,8 @@ def loadMappableLayers(path):
     if not os.path.exists(path):
         raise FileNotFoundError
 
-    filenames = [f for f in os.listdir(path)
-                 if os.path.splitext(f)[1] == '.pickle']
+    filenames = [f for f in os.listdir(path) if os.path.splitext(f)[1] in
+                 [LAYER_FILE_EXTENSION, '.pickle']]
 
     # First, collect all compiled layers from disk.
     layers = {}
@@ -643,6 +955,50 @@ class Partition:
         assert isinstance(synFmt, SynFmt)
         self._synFmts.append(synFmt)
 
+    def replaceSynapseGroups(self, synapseGroups, synFmts):
+        """Replace synapse groups and synFmts, and update cost properties.
+
+        Used to update the weights of a compiled partition. The input axon
+        groups are pointed to the new synapse group with the same id. The cost
+        properties of the parent layer are updated as well.
+
+        :param list[SynapseGroup] synapseGroups: The new synapse groups. Must
+            have the same ids as the current ones.
+        :param list[SynFmt] synFmts: The new synFmts.
+        """
+
+        assert [g.id for g in synapseGroups] == \
+            [g.id for g in self._synapseGroups]
+
+        newSynapseGroups = {id(oldGroup): newGroup for oldGroup, newGroup in
+                            zip(self._synapseGroups, synapseGroups)}
+        for inputAxonGroup in self._inputAxonGroups:
+            inputAxonGroup.synGroup = newSynapseGroups[id(
+                inputAxonGroup.synGroup)]
+
+        layer = self._layer
+        layer._numSyn -= self._numSyn
+        layer._numSynEntries -= self._numSynEntries
+        layer._numSynMemWords -= self._numSynMemWords
+        layer._synapseCost -= self._synapseCost
+
+        self._synapseGroups = []
+        self._synFmts = []
+        self._numSyn = 0
+        self._numSynEntries = 0
+        self._numSynMemWords = 0
+        self._synapseCost = 0
+
+        for synFmt in synFmts:
+            self.addSynFmt(synFmt)
+        for synapseGroup in synapseGroups:
+            self.addSynapseGroup(synapseGroup)
+
+        layer._numSyn += self._numSyn
+        layer._numSynEntries += self._numSynEntries
+        layer._numSynMemWords += self._numSynMemWords
+        layer._synapseCost += self._synapseCost
+
     # -------------------------------------------------------------------------
     # Cost
     @property
@@ -799,20 +1155,23 @@ class SynapseGroup:
     """Shared synapse group for a population of neurons.
 
     :param int groupId: Id of synapse group.
-    :param list[list[SynEntry]] synEntries: List of lists of synEntries. Each
-        sub-list contains the synEntries of a particular neuron in population.
+    :param list[list[SynEntry]] | SynEntryArrays synEntries: SynEntries of the
+        neurons in population. Either a list of lists of ``SynEntry`` objects,
+        where each sub-list contains the synEntries of a particular neuron, or
+        the equivalent ``SynEntryArrays`` container.
     """
 
-    __slots__ = ['id', '_synEntries', '_maxNumBitsPerWord', '_numSyn',
-                 '_numSynEntries', '_numSynMemWords', '_maxNumWords',
-                 '_maxNumSynMemWords', '_cost']
+    __slots__ = ['id', '_synEntries', '_synEntryArrays', '_maxNumBitsPerWord',
+                 '_numSyn', '_numSynEntries', '_numSynMemWords',
+                 '_maxNumWords', '_maxNumSynMemWords', '_cost']
 
     def __init__(self, groupId, synEntries):
         self._maxNumSynMemWords = 16384
         self._maxNumBitsPerWord = 64
 
         self.id = groupId
-        self._synEntries = synEntries
+        self._synEntries = None
+        self._synEntryArrays = None
 
         self._numSyn = None
         self._numSynEntries = None
@@ -820,21 +1179,43 @@ class SynapseGroup:
         self._maxNumWords = None
         self._cost = None
 
-        self._updateCost()
+        self.synEntries = synEntries
+
+    def __setstate__(self, state):
+        """Restore a pickled synapse group.
+
+        Synapse groups pickled before synEntries could be stored as
+        ``SynEntryArrays`` have no ``_synEntryArrays`` slot. Their container
+        is built from the list of ``SynEntry`` objects.
+
+        :param tuple state: Pickled ``(dict, slots)`` state.
+        """
+
+        _, slotState = state
+        for name, value in slotState.items():
+            setattr(self, name, value)
+        if '_synEntryArrays' not in slotState:
+            self._synEntryArrays = SynEntryArrays.fromSynEntries(
+                self._synEntries)
 
     def _updateCost(self):
         """Update the cost of this synapse group."""
 
-        self._numSyn = 0
-        self._numSynEntries = 0
-        numBitsOfNeurons = []
-        for synEntriesOfNeuron in self._synEntries:
-            self._numSynEntries += len(synEntriesOfNeuron)
-            numBitsOfNeuron = 0
-            for synEntry in synEntriesOfNeuron:
-                numBitsOfNeuron += synEntry.numBits
-                self._numSyn += synEntry.numSyn
-            numBitsOfNeurons.append(numBitsOfNeuron)
+        if self._synEntryArrays is not None:
+            self._numSyn = self._synEntryArrays.numSyn
+            self._numSynEntries = self._synEntryArrays.numSynEntries
+            numBitsOfNeurons = self._synEntryArrays.getNumBitsPerNeuron()
+        else:
+            self._numSyn = 0
+            self._numSynEntries = 0
+            numBitsOfNeurons = []
+            for synEntriesOfNeuron in self._synEntries:
+                self._numSynEntries += len(synEntriesOfNeuron)
+                numBitsOfNeuron = 0
+                for synEntry in synEntriesOfNeuron:
+                    numBitsOfNeuron += synEntry.numBits
+                    self._numSyn += synEntry.numSyn
+                numBitsOfNeurons.append(numBitsOfNeuron)
 
         # Keep track of largest number of synMemWords of the neurons within
         # source group as the number of words needs to be the same for all
@@ -845,7 +1226,7 @@ class SynapseGroup:
         incNumSynMemWords = np.logical_or(remainder == 0, remainder >= 59)
         self._maxNumWords = int(np.max(numSynMemWords + incNumSynMemWords))
 
-        numNeurons = len(self._synEntries)
+        numNeurons = len(numBitsOfNeurons)
         self._numSynMemWords = self._maxNumWords * numNeurons
 
         self._cost = self._numSynMemWords / self._maxNumSynMemWords
@@ -854,22 +1235,62 @@ class SynapseGroup:
     def synEntries(self):
         """List of synaptic entries of this synapse group.
 
+        If the group was created from a ``SynEntryArrays`` container, the
+        ``SynEntry`` objects are views into that container, which are created
+        on first access.
+
         :return: List of synaptic entries.
         :rtype: list[list[SynEntry]]
         """
 
+        if self._synEntries is None:
+            self._synEntries = self._synEntryArrays.getSynEntries()
+
         return self._synEntries
 
     @synEntries.setter
     def synEntries(self, synEntries):
         """Set synEntries of this synapse groups, and update cost properties.
 
-        :param list[SynEntry] synEntries: Synaptic entries.
+        :param list[list[SynEntry]] | SynEntryArrays synEntries: Synaptic
+            entries.
         """
 
-        self._synEntries = synEntries
+        if isinstance(synEntries, SynEntryArrays):
+            self._synEntries = None
+            self._synEntryArrays = synEntries
+        else:
+            self._synEntries = synEntries
+            self._synEntryArrays = None
         self._updateCost()
 
+    @property
+    def synEntryArrays(self):
+        """Synaptic entries of this synapse group as struct of arrays.
+
+        :return: SynEntries of this group.
+        :rtype: SynEntryArrays
+        """
+
+        if self._synEntryArrays is None:
+            self._synEntryArrays = SynEntryArrays.fromSynEntries(
+                self._synEntries)
+
+        return self._synEntryArrays
+
+    @property
+    def numNeurons(self):
+        """Number of neurons in group.
+
+        :return: Number of neurons in group.
+        :rtype: int
+        """
+
+        if self._synEntryArrays is not None:
+            return self._synEntryArrays.numNeurons
+
+        return len(self._synEntries)
+
     @property
     def numSyn(self):
         """Number of synapses in group.
@@ -1253,6 +1674,269 @@ class SynEntry:
         print(indent+"  kernelIds={}".format(self.kernelIds))
 
 
+class SynEntryArrays:
+    """Struct-of-arrays container for the synEntries of a synapse group.
+
+    Holds the same information as a list of lists of ``SynEntry`` objects
+    (see ``SynapseGroup``), but stores the synEntries of all neurons in a few
+    flat arrays. This avoids creating a Python object for each synEntry when
+    compiling large layers.
+
+    :param np.ndarray neuronPtrs: Offsets of the synEntries of each neuron
+        into the per-synEntry arrays. Has length ``numNeurons + 1``.
+    :param np.ndarray synPtrs: Offsets of the synapses of each synEntry into
+        the per-synapse arrays. Has length ``numSynEntries + 1``.
+    :param np.ndarray prefixOffsets: Prefix offset of each synEntry.
+    :param np.ndarray synFmtIds: Index of the synFmt of each synEntry into
+        ``synFmts``.
+    :param list[SynFmt] | None synFmts: The synFmts referenced by
+        ``synFmtIds``. May be ``None`` until the synFmts of the core have been
+        compressed, see ``remap``.
+    :param np.ndarray idxs: Concatenated synapse indices of all synEntries.
+    :param np.ndarray weights: Concatenated synapse weights.
+    :param np.ndarray | None kernelIds: Concatenated global indices of synapse
+        weights.
+    :param np.ndarray | None delays: Concatenated synapse delays.
+    """
+
+    __slots__ = ['neuronPtrs', 'synPtrs', 'prefixOffsets', 'synFmtIds',
+                 'synFmts', 'idxs', 'weights', 'kernelIds', 'delays']
+
+    def __init__(self, neuronPtrs, synPtrs, prefixOffsets, synFmtIds,
+                 synFmts, idxs, weights, kernelIds=None, delays=None):
+
+        assert len(synPtrs) == neuronPtrs[-1] + 1
+        assert len(prefixOffsets) == len(synFmtIds) == len(synPtrs) - 1
+        assert len(idxs) == len(weights) == synPtrs[-1]
+        if kernelIds is not None:
+            assert len(kernelIds) == len(idxs)
+        if delays is not None:
+            assert len(delays) == len(idxs)
+
+        self.neuronPtrs = neuronPtrs
+        self.synPtrs = synPtrs
+        self.prefixOffsets = prefixOffsets
+        self.synFmtIds = synFmtIds
+        self.synFmts = synFmts
+        self.idxs = idxs
+        self.weights = weights
+        self.kernelIds = kernelIds
+        self.delays = delays
+
+    @classmethod
+    def fromSynEntries(cls, synEntries):
+        """Create container from a list of lists of ``SynEntry`` objects.
+
+        :param list[list[SynEntry]] synEntries: The synEntries of each neuron.
+
+        :return: SynEntries as struct of arrays.
+        :rtype: SynEntryArrays
+        """
+
+        synEntriesFlat = [e for synEntriesOfNeuron in synEntries
+                          for e in synEntriesOfNeuron]
+
+        synFmts = []
+        synFmtIdxs = {}
+        synFmtIds = []
+        for synEntry in synEntriesFlat:
+            key = id(synEntry.synFmt)
+            if key not in synFmtIdxs:
+                synFmtIdxs[key] = len(synFmts)
+                synFmts.append(synEntry.synFmt)
+            synFmtIds.append(synFmtIdxs[key])
+
+        def concatenate(arrays, optional=False):
+            if optional and all(a is None for a in arrays):
+                return
+            # Fill missing optional arrays with zeros.
+            arrays = [np.zeros(len(e.idxs), int) if a is None else a
+                      for a, e in zip(arrays, synEntriesFlat)]
+            return np.concatenate(arrays) if len(arrays) else np.zeros(0, int)
+
+        neuronPtrs = np.cumsum([0] + [len(n) for n in synEntries])
+        synPtrs = np.cumsum([0] + [e.numSyn for e in synEntriesFlat])
+
+        return cls(neuronPtrs, synPtrs,
+                   np.array([e.prefixOffset for e in synEntriesFlat], int),
+                   np.array(synFmtIds, int), synFmts,
+                   concatenate([e.idxs for e in synEntriesFlat]),
+                   concatenate([e.weights for e in synEntriesFlat]),
+                   concatenate([e.kernelIds for e in synEntriesFlat], True),
+                   concatenate([e.delays for e in synEntriesFlat], True))
+
+    @property
+    def numNeurons(self):
+        """Number of neurons.
+
+        :return: Number of neurons.
+        :rtype: int
+        """
+
+        return len(self.neuronPtrs) - 1
+
+    @property
+    def numSynEntries(self):
+        """Number of synEntries.
+
+        :return: Number of synEntries.
+        :rtype: int
+        """
+
+        return len(self.prefixOffsets)
+
+    @property
+    def numSyn(self):
+        """Number of synapses.
+
+        :return: Number of synapses.
+        :rtype: int
+        """
+
+        return len(self.idxs)
+
+    def getNumSynPerSynEntry(self):
+        """Get the number of synapses of each synEntry.
+
+        :return: Number of synapses per synEntry.
+        :rtype: np.ndarray
+        """
+
+        return np.diff(self.synPtrs)
+
+    def getNeuronIds(self):
+        """Get the index of the neuron that each synEntry belongs to.
+
+        :return: Neuron index per synEntry.
+        :rtype: np.ndarray
+        """
+
+        return np.repeat(np.arange(self.numNeurons), np.diff(self.neuronPtrs))
+
+    def getNumBits(self):
+        """Get the number of bits of each synEntry.
+
+        Vectorized equivalent of ``SynEntry.numBits``.
+
+        :return: Number of bits per synEntry.
+        :rtype: np.ndarray
+        """
+
+        props = self.getSynFmtProperties()
+        numIdxBits = props[:, 2]
+        numSkipBits = props[:, 3]
+        compression = props[:, 5]
+        numSyn = self.getNumSynPerSynEntry()
+
+        numBitsPerSyn = props[:, 4] + props[:, 7]
+        numBitsPerSyn += np.where(compression == Compression.SPARSE,
+                                  numIdxBits, 0)
+        numBitsPerSyn += np.where(compression == Compression.RUNLENGTH,
+                                  numSkipBits, 0)
+
+        numPrefixBits = 4 + 6  # synMemFmtId + numSyn
+        numPrefixBits += np.where(compression != Compression.SPARSE,
+                                  numIdxBits, 0)
+
+        return numPrefixBits + numSyn * numBitsPerSyn
+
+    def getCxIds(self):
+        """Get the compartment index of each synapse.
+
+        Vectorized equivalent of ``SynEntry.getCxIds``.
+
+        :return: Compartment indices of the concatenated synapses.
+        :rtype: np.ndarray
+        """
+
+        numSyn = self.getNumSynPerSynEntry()
+        props = np.repeat(self.getSynFmtProperties(), numSyn, axis=0)
+        compression = props[:, 5]
+
+        # For RUNLENGTH, idx specifies differences, so take the cumulative sum
+        # within each synEntry.
+        cxIds = np.array(self.idxs, int)
+        isRunLength = compression == Compression.RUNLENGTH
+        if np.any(isRunLength):
+            skips = np.where(isRunLength, cxIds, 0)
+            cumSum = np.cumsum(skips)
+            starts = self.synPtrs[:-1][numSyn > 0]
+            cumSum -= np.repeat(cumSum[starts] - skips[starts],
+                                numSyn[numSyn > 0])
+            cxIds[isRunLength] = cumSum[isRunLength]
+
+        # For RUNLENGTH and DENSE, offset by prefixOffset before scaling with
+        # cIdxMult.
+        prefixOffsets = np.repeat(self.prefixOffsets, numSyn)
+        cxIds += np.where(compression != Compression.SPARSE, prefixOffsets, 0)
+
+        return props[:, 0] + cxIds * (props[:, 1] + 1)
+
+    def getSynFmtProperties(self):
+        """Get the properties of the synFmt of each synEntry.
+
+        :return: Array with one row of synFmt properties per synEntry, see
+            ``SynFmt.asArray``.
+        :rtype: np.ndarray
+        """
+
+        assert self.synFmts is not None, "SynFmts have not been assigned."
+
+        if self.numSynEntries == 0:
+            return np.zeros((0, 9), int)
+
+        # Columns: cIdxOffset, cIdxMult, numIdxBits, numSkipBits, numWgtBits,
+        # compression, signMode, numDlyBits, softReset.
+        synFmtTable = np.stack([synFmt.asArray() for synFmt in self.synFmts])
+        return synFmtTable[self.synFmtIds]
+
+    def getNumBitsPerNeuron(self):
+        """Get the total number of synEntry bits of each neuron.
+
+        :return: Number of bits per neuron.
+        :rtype: np.ndarray
+        """
+
+        return np.bincount(self.getNeuronIds(), self.getNumBits(),
+                           self.numNeurons).astype(int)
+
+    def remap(self, synFmts, synEntryToFmtMap):
+        """Point synEntries to a new set of synFmts.
+
+        :param list[SynFmt] synFmts: New synFmts.
+        :param np.ndarray synEntryToFmtMap: Mapping from the current synFmt
+            indices to indices into ``synFmts``.
+        """
+
+        self.synFmtIds = synEntryToFmtMap[self.synFmtIds]
+        self.synFmts = synFmts
+
+    def getSynEntries(self):
+        """Create ``SynEntry`` objects that are views into this container.
+
+        :return: List of synEntries for each neuron.
+        :rtype: list[list[SynEntry]]
+        """
+
+        synPtrs = self.synPtrs.tolist()
+        prefixOffsets = self.prefixOffsets.tolist()
+        synFmtIds = self.synFmtIds.tolist()
+
+        synEntries = []
+        for i in range(self.numSynEntries):
+            s = slice(synPtrs[i], synPtrs[i + 1])
+            synEntries.append(SynEntry(
+                prefixOffsets[i], self.idxs[s], self.weights[s],
+                self.synFmts[synFmtIds[i]],
+                None if self.kernelIds is None else self.kernelIds[s],
+                None if self.delays is None else self.delays[s]))
+
+        neuronPtrs = self.neuronPtrs.tolist()
+
+        return [synEntries[neuronPtrs[i]:neuronPtrs[i + 1]]
+                for i in range(self.numNeurons)]
+
+
 class InputAxonGroup:
     """Input axon group.
 
@@ -1302,6 +1986,15 @@ class InputAxonGroup:
 
         return self._id
 
+    def renewId(self):
+        """Derive a new identifier from this axon group.
+
+        Needed when the axon group was created in a different process, where
+        its id may collide with that of an axon group in this process.
+        """
+
+        self._id = hash(self)
+
     @property
     def partition(self):
         """The parent partition of this axon group.
@@ -1421,6 +2114,48 @@ class OutputAxonGroup:
 
         self._updateCost()
 
+    @classmethod
+    def fromInAxGrpId(cls, cxIds, multiplicity, relSrcIds, inAxGrpId,
+                      postChipCounter, parentPartition):
+        """Create output axon group without access to its input axon group.
+
+        Used when loading a serialized layer, where the input axon groups of
+        the post-layer are not available.
+
+        :param np.ndarray cxIds: Vector of compartment indices.
+        :param np.ndarray multiplicity: Multiplicity vector.
+        :param np.ndarray relSrcIds: Vector of relative source indices.
+        :param int inAxGrpId: Id of corresponding input axon group.
+        :param int postChipCounter: Chip counter of corresponding input axon
+            group.
+        :param Partition parentPartition: The parent partition.
+
+        :return: Output axon group.
+        :rtype: OutputAxonGroup
+        """
+
+        assert isinstance(parentPartition, Partition)
+
+        outAxGrp = cls.__new__(cls)
+
+        outAxGrp._maxNumAxonCfgEntries = 4096
+
+        outAxGrp.cxIds = cxIds
+        outAxGrp._multiplicity = multiplicity
+        outAxGrp.relSrcIds = relSrcIds
+        outAxGrp.inAxGrpId = inAxGrpId
+        outAxGrp._postChipCounter = postChipCounter
+        outAxGrp._partition = parentPartition
+
+        outAxGrp._numNodes = None
+        outAxGrp._numAxons = None
+        outAxGrp._numAxonCfgEntries = None
+        outAxGrp._cost = None
+
+        outAxGrp._updateCost()
+
+        return outAxGrp
+
     @property
     def partition(self):
         """The parent partition of this axon group.
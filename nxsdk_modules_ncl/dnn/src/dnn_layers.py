@@ -39,10 +39,11 @@ from nxsdk_modules_ncl.dnn.src.plotting import plot_multiplicity, \
     visualize_partitions, plot_cost_graph, plot_cost_terms, plot_cx_syn
 from nxsdk_modules_ncl.dnn.src.data_structures import Layer, Partition, \
     SynapseGroup, OutputAxonGroup, CompartmentGroup, InputAxonGroup, \
-    serializeLayer, deserializeLayer
+    serializeLayer, deserializeLayer, LAYER_FILE_EXTENSION
 from nxsdk_modules_ncl.dnn.src.dnn_mapper import DnnMapper
 from nxsdk_modules_ncl.dnn.src.optimization import ExclusionCriteria, \
     PartitionOptimizer, getDummyLayer
+from nxsdk_modules_ncl.dnn.src.partition_cache import PartitionCache
 from nxsdk_modules_ncl.dnn.src.synapse_compression import SynapseEncoder, \
     compressSynFmts, remapSynEntries, reconstructKMapFromPartitions
 from nxsdk_modules_ncl.dnn.src.utils import getWeightsFromIds, _interleave, \
@@ -63,7 +64,7 @@ NX_KWARGS = ['numWeightBits', 'synapseEncoding', 'biasExp', 'vThMant',
              'validatePartitions', 'logger', 'probeSpikes', 'threshOp',
              'saveOutput', 'compartmentKwargs', 'connectionKwargs',
              'resetMode', 'weightExpSoftReset', 'numBiasBits', '_padding',
-             '_zeroPadding', '_signed', 'inputMode']
+             '_zeroPadding', '_signed', 'inputMode', 'lazyKernelIdMap']
 
 # Todo: Add and test soft-reset for all spiking layers.
 SOFT_RESET_LAYERS = {'NxConv2D', 'NxInputLayer', 'NxConv1D',
@@ -323,16 +324,9 @@ def compileConvlike(self, partitionCandidate):
 
     # When using signed spikes the number of channels in the input
     # is doubled.
-    signedInput = False
-    if len(self._inbound_nodes[:1]):
-        layer = self._inbound_nodes[0].inbound_layers
-        # layer may be wrapped in a list of lenght 1:
-        if isinstance(layer, (list, tuple)):
-            layer = layer[0]
-        if hasattr(layer, 'signed'):
-            if layer.signed:
-                signedInput = True
-                inputShape = inputShape[:-1] + (2 * inputShape[-1],)
+    signedInput = _hasSignedInput(self)
+    if signedInput:
+        inputShape = inputShape[:-1] + (2 * inputShape[-1],)
 
     # Subtract zero padding from inputShape if previous layer is ZeroPadding.
     # Not used in actual spiking layer.
@@ -369,18 +363,8 @@ def compileConvlike(self, partitionCandidate):
         preMultiplicityFlat = 2 * np.ones_like(preMultiplicityFlat)
         multiplicityFlat = 2 * np.ones_like(multiplicityFlat)
 
-    # Get weights. Needed for SynEntries.
-    weights, biases = self.get_weights()
-
-    # When using signed input spikes, negated weights are
-    # concatenated to the input channel dimension.
-    if signedInput:
-        weights = np.concatenate([weights, -weights], axis=-2)
-    weights = np.ravel(weights, 'F')
-
-    # Repeat biases for every neuron in channel. Needed for
-    # CompartmentGroup.
-    biasesFlat = np.repeat(biases.astype(int), np.prod(layerShape[:-1]))
+    # Get weights and biases. Needed for SynEntries and CompartmentGroup.
+    weights, biasesFlat = _getWeightsConvlike(self, signedInput, layerShape)
     biasExp = np.ones_like(biasesFlat) * \
         partitionCandidate.compartmentKwargs['biasExp']
 
@@ -397,9 +381,8 @@ def compileConvlike(self, partitionCandidate):
 
         # kMap is the unrolled convolution operator (doubly blocked Toeplitz
         # matrix), with shape (numCxOnCore, numNeuronsInput).
-        kMap = lil_matrix((np.count_nonzero(maskFlat), inputSize), dtype=int)
-        kMap.rows = self.kernelIdMap.rows[maskFlat]
-        kMap.data = self.kernelIdMap.data[maskFlat]
+        kMap = self.getCoreKernelIdMap(maskFlat)
+        assert kMap.shape[1] == inputSize
 
         # The neuronSize is the number of compartments per neuron.
         neuronSize = 2 if self.resetMode == 'soft' else 1
@@ -533,11 +516,12 @@ def compileConvlike(self, partitionCandidate):
                                       0,
                                       np.array([1], int),
                                       softReset=True)
+                synapseEncoder.endNeuron()
 
-                synEntriesOfCore.append([synapseEncoder.popSynEntries()])
+                synEntriesOfCore.append(synapseEncoder.popSynapseGroup())
 
-        synFmts, synEntryMap = compressSynFmts(synapseEncoder.getSynFmts(),
-                                               limits.maxNumSynFmt)
+        synFmts, synEntryMap = compressSynFmts(
+            synapseEncoder.getSynFmtArray(), limits.maxNumSynFmt)
 
         if len(synFmts) > limits.maxNumSynFmt:
             limits.numSynFmts += 1
@@ -697,21 +681,18 @@ def compileConvlike(self, partitionCandidate):
 
 def _encodeSynapseGroup(synapseGroup, weights, cIdxMult, synapseEncoder,
                         neuronSize):
-    """Encode single SynapseGroup into list of synEntries.
+    """Encode single SynapseGroup into synEntries.
 
     :param list[(np.ndarray, np.ndarray)] synapseGroup: Synapses to encode.
     :param np.ndarray weights: Synaptic weights.
     :param int cIdxMult: Multiplier for compartment indices.
     :param SynapseEncoder synapseEncoder: Helper class to encode synapses.
     :param int neuronSize: The number of compartments per neuron.
-    :return: List of list of SynEntry objects. The outer list has one entry for
-        each neuron in the group; the inner list may contain multiple SynEntry
-        objects per neuron.
-    :rtype: list[list[SynEntry]]
+    :return: SynEntries of the neurons in the group. Each neuron may have
+        multiple synEntries.
+    :rtype: SynEntryArrays
     """
 
-    synEntries = []
-
     # Loop over single source neurons.
     for synNeuron in synapseGroup:
 
@@ -737,9 +718,215 @@ def _encodeSynapseGroup(synapseGroup, weights, cIdxMult, synapseEncoder,
                                           (cIdxMult + 1) * neuronSize - 1,
                                           kIds)
 
-        synEntries.append(synapseEncoder.popSynEntries())
+        synapseEncoder.endNeuron()
+
+    return synapseEncoder.popSynapseGroup()
+
+
+def _hasSignedInput(self):
+    """Check whether the pre-layer of a layer emits signed spikes.
+
+    :param NxLayer self: Nx layer.
+    :return: Whether input spikes are signed.
+    :rtype: bool
+    """
+
+    if len(self._inbound_nodes[:1]):
+        layer = self._inbound_nodes[0].inbound_layers
+        # layer may be wrapped in a list of lenght 1:
+        if isinstance(layer, (list, tuple)):
+            layer = layer[0]
+        if hasattr(layer, 'signed'):
+            return bool(layer.signed)
+    return False
+
+
+def _getWeightsConvlike(self, signedInput, layerShape):
+    """Get flattened weights and biases of a convolution-like layer.
+
+    :param NxConv2D | NxDepthwiseConv2D | NxAveragePooling2D | NxCvon1D self:
+        Nx layer.
+    :param bool signedInput: Whether input spikes are signed.
+    :param tuple layerShape: Shape of the layer.
+    :return: Weights flattened in Fortran order, indexed by kernelIds, and
+        biases repeated for every neuron in channel.
+    :rtype: tuple[np.ndarray, np.ndarray]
+    """
+
+    weights, biases = self.get_weights()
+
+    # When using signed input spikes, negated weights are
+    # concatenated to the input channel dimension.
+    if signedInput:
+        weights = np.concatenate([weights, -weights], axis=-2)
+    weights = np.ravel(weights, 'F')
+
+    biasesFlat = np.repeat(biases.astype(int), np.prod(layerShape[:-1]))
+
+    return weights, biasesFlat
 
-    return synEntries
+
+def updateWeightsConvlike(self, mappableLayer):
+    """Update weights and biases of a compiled convolution-like layer.
+
+    :param NxConv2D | NxDepthwiseConv2D | NxAveragePooling2D | NxCvon1D self:
+        Nx layer.
+    :param Layer mappableLayer: The compiled layer.
+
+    :return: ``mappableLayer``, or ``None`` if a core runs out of resources.
+    :rtype: Layer | None
+    """
+
+    weights, biasesFlat = _getWeightsConvlike(
+        self, _hasSignedInput(self), mappableLayer.coreIdMap.shape)
+
+    # Synapse groups are shared by source neurons with the same kernel, so
+    # the kernelIds determine the weights.
+    def getWeights(synGrpId, kernelIds):
+        return getWeightsFromIds(weights, kernelIds)
+
+    return _updateWeights(mappableLayer, getWeights, biasesFlat,
+                          mappableLayer.connectionKwargs['synapseEncoding'],
+                          self.exclusionCriteria)
+
+
+def _updateWeights(mappableLayer, getWeights, biasesFlat, synapseEncoding,
+                   limits):
+    """Update weights and biases of a compiled layer.
+
+    The synapses of each partition are re-encoded with new weights, keeping
+    their destination compartments, kernelIds and synapse groups, so the
+    partitioning and axons of the layer remain valid.
+
+    :param Layer mappableLayer: The compiled layer.
+    :param Callable getWeights: Returns the weights of the synapses in a
+        synapse group, given the id of the group and the kernelIds of the
+        synapses.
+    :param np.ndarray biasesFlat: Bias of each neuron in layer.
+    :param str synapseEncoding: Synapse compression mode.
+    :param ExclusionCriteria limits: Resource limits of a core.
+
+    :return: ``mappableLayer``, or ``None`` if a core runs out of resources.
+    :rtype: Layer | None
+    """
+
+    connKwargs = mappableLayer.connectionKwargs
+
+    for partition in mappableLayer.partitions:
+
+        # Re-encode synapses #
+        ######################
+
+        synapseEncoder = SynapseEncoder(connKwargs['numWeightBits'],
+                                        limits.maxNumSynPerSynEntry,
+                                        synapseEncoding,
+                                        connKwargs['useSharedSign'])
+
+        synEntriesOfCore = []
+        for synapseGroup in partition.synapseGroups:
+            _reencodeSynapseGroup(synapseGroup, getWeights, synapseEncoder)
+            synEntriesOfCore.append(synapseEncoder.popSynapseGroup())
+
+        synFmts, synEntryMap = compressSynFmts(
+            synapseEncoder.getSynFmtArray(), limits.maxNumSynFmt)
+
+        if len(synFmts) > limits.maxNumSynFmt:
+            limits.numSynFmts += 1
+            return
+
+        synEntriesOfCore = remapSynEntries(synEntriesOfCore, synFmts,
+                                           synEntryMap)
+
+        synapseGroups = []
+        synMemOfCore = 0
+        for oldSynapseGroup, synEntriesOfSourceGroup in \
+                zip(partition.synapseGroups, synEntriesOfCore):
+            synapseGroup = SynapseGroup(oldSynapseGroup.id,
+                                        synEntriesOfSourceGroup)
+            if synapseGroup.maxSynMemLen > limits.maxNumSynMemWordsPerAxon:
+                limits.synMemPerAxon += 1
+                return
+            synapseGroups.append(synapseGroup)
+            synMemOfCore += synapseGroup.numSynMemWords
+
+        if synMemOfCore >= limits.maxNumSynMemWords:
+            limits.numSynMemWords += 1
+            return
+
+        partition.replaceSynapseGroups(synapseGroups, synFmts)
+
+        # Biases #
+        ##########
+
+        cxGroup = partition.compartmentGroup
+        absCxIds = cxGroup.relToAbsDestCxIdxMap
+        biasMant = np.zeros_like(cxGroup.biasMant)
+        if partition.resetMode == 'soft':
+            # Only the dendrite compartments have biases; soma compartments
+            # have odd ids and dummy compartments come after all neurons.
+            isDendrite = np.logical_and(absCxIds % 2 == 0,
+                                        absCxIds < 2 * len(biasesFlat))
+            biasMant[cxGroup.cxIds[isDendrite]] = \
+                biasesFlat[absCxIds[isDendrite] // 2]
+        else:
+            biasMant[cxGroup.cxIds] = biasesFlat[absCxIds]
+        cxGroup.biasMant = biasMant
+
+    return mappableLayer
+
+
+def _reencodeSynapseGroup(synapseGroup, getWeights, synapseEncoder):
+    """Encode the synapses of a compiled synapse group with new weights.
+
+    The synapses of each source neuron are passed to ``synapseEncoder`` in the
+    same way as during compilation, i.e. separately for each cIdxOffset and
+    cIdxMult, with compartment indices divided by the multiplier. Dummy
+    synapses (kernelId 0) are dropped; the encoder re-inserts them if needed.
+    Soft-reset synapses keep their weights.
+
+    :param SynapseGroup synapseGroup: Compiled synapse group.
+    :param Callable getWeights: See ``_updateWeights``.
+    :param SynapseEncoder synapseEncoder: Helper class to encode synapses.
+    """
+
+    synEntries = synapseGroup.synEntryArrays
+    kernelIds = synEntries.kernelIds
+    if kernelIds is None:
+        assert synEntries.numSyn == 0, \
+            "Need kernelIds of synapses to update their weights."
+        kernelIds = np.zeros(0, int)
+
+    numSyn = synEntries.getNumSynPerSynEntry()
+    props = np.repeat(synEntries.getSynFmtProperties()[:, [0, 1, 8]], numSyn,
+                      axis=0)
+    neuronIds = np.repeat(synEntries.getNeuronIds(), numSyn)
+    cxIds = synEntries.getCxIds()
+    isSoftReset = props[:, 2] == 1
+
+    weights = np.array(synEntries.weights, int)
+    isSyn = np.logical_and(np.logical_not(isSoftReset), kernelIds != 0)
+    weights[isSyn] = getWeights(synapseGroup.id, kernelIds[isSyn])
+    isValid = np.logical_or(isSyn, isSoftReset)
+
+    # Sort synapses by neuron, synFmt and compartment index.
+    order = np.lexsort((cxIds, props[:, 2], props[:, 1], props[:, 0],
+                        neuronIds))
+    order = order[isValid[order]]
+    keys = np.column_stack([neuronIds, props])[order]
+    starts = np.flatnonzero(np.any(np.diff(keys, axis=0) != 0, axis=1)) + 1
+    starts = np.concatenate([[0], starts]) if len(order) else starts
+    ends = np.append(starts[1:], len(order)).astype(int)
+
+    i = 0
+    for neuronId in range(synEntries.numNeurons):
+        while i < len(starts) and keys[starts[i], 0] == neuronId:
+            cIdxOffset, cIdxMult, softReset = keys[starts[i], 1:].tolist()
+            s = order[starts[i]:ends[i]]
+            synapseEncoder.encode((cxIds[s] - cIdxOffset) // (cIdxMult + 1),
+                                  weights[s], cIdxOffset, cIdxMult,
+                                  kernelIds[s], softReset=bool(softReset))
+            i += 1
+        synapseEncoder.endNeuron()
 
 
 def validatePartitionConvlike(partitionCandidate, kernelIdMap):
@@ -794,7 +981,9 @@ class NxLayer(object):
 
     :param int numWeightBits: Number of bits to use for weights. Default: 8.
     :param str synapseEncoding: Compression mode to use for synapses. Default:
-        'sparse'. Other possibilities: 'runlength', 'dense1', 'dense2'.
+        'sparse'. Other possibilities: 'runlength', 'dense1', 'dense2', and
+        'auto', which picks the mode that uses the fewest synaptic memory
+        words on each core.
     :param int biasExp: Bias exponent. Default: 0.
     :param int vThMant: Threshold mantissa. Default: 2 ** 9.
     :param int weightExponent: Weight exponent. Default: 0.
@@ -815,8 +1004,17 @@ class NxLayer(object):
         when a neuron spikes the membrane potential is reset to zero. If
         'soft', when a neuron spikes the threshold will be subtracted from the
         membrane threshold.
+    :param bool lazyKernelIdMap: If ``True``, do not keep the kernelIdMap of
+        the whole layer in memory during partitioning, but generate only the
+        part needed for the core that is being compiled. Reduces peak memory
+        for large layers at the cost of regenerating the map for each
+        partition candidate. Default: ``False``.
     """
 
+    # Virtual layers have no physical representation on Loihi. Their compile
+    # method passes the partition of the post-layer through.
+    isVirtual = False
+
     def __init__(self, numWeightBits=None, synapseEncoding=None, biasExp=None,
                  vThMant=None, weightExponent=None, useSharedSign=None,
                  visualizePartitions=None, validatePartitions=None,
@@ -947,6 +1145,7 @@ class NxLayer(object):
 
         self._kernelIdMap = None
         self._pathToKernelIdMap = None
+        self.lazyKernelIdMap = kwargs.get('lazyKernelIdMap', False)
 
         # Misc Properties
         self._dummyCxSize = 0
@@ -964,6 +1163,7 @@ class NxLayer(object):
         config = {'compartmentKwargs': self.compartmentKwargs,
                   'connectionKwargs': self.connectionKwargs,
                   'resetMode': self.resetMode,
+                  'lazyKernelIdMap': self.lazyKernelIdMap,
                   }
         return config
 
@@ -984,20 +1184,24 @@ class NxLayer(object):
             except IOError:
                 self.logger.debug("Could not load kernelIdMap from %s.",
                                   self._pathToKernelIdMap)
-        else:
-            tempdir = os.path.abspath(os.path.join(os.path.dirname(
-                os.path.realpath(__file__)),
-                '../../..', 'temp', str(time.time())))
-            os.makedirs(tempdir, exist_ok=True)
-            self._pathToKernelIdMap = os.path.join(
-                tempdir, 'kernelIdMap_{}.npz'.format(hash(self)))
 
         # Finally, compute kernelIdMap.
         if self._kernelIdMap is None:
             self.logger.debug("Computing kernelIdMap.")
             kernelIdMap = self.genKernelIdMap()
+            # Layers that are not convolution-like do not have a kernelIdMap.
+            if kernelIdMap is None:
+                return
             self._kernelIdMap = kernelIdMap.tolil()
 
+            if self._pathToKernelIdMap is None:
+                tempdir = os.path.abspath(os.path.join(os.path.dirname(
+                    os.path.realpath(__file__)),
+                    '../../..', 'temp', str(time.time())))
+                os.makedirs(tempdir, exist_ok=True)
+                self._pathToKernelIdMap = os.path.join(
+                    tempdir, 'kernelIdMap_{}.npz'.format(hash(self)))
+
             self.logger.debug("Storing kernelIdMap in %s.",
                               self._pathToKernelIdMap)
             save_npz(self._pathToKernelIdMap, kernelIdMap)
@@ -1013,11 +1217,38 @@ class NxLayer(object):
                 and os.path.exists(self._pathToKernelIdMap):
             shutil.rmtree(os.path.dirname(self._pathToKernelIdMap))
 
-    def genKernelIdMap(self):
-        """Generate KernelIdMap."""
+    def genKernelIdMap(self, outputIds=None):
+        """Generate KernelIdMap.
+
+        :param np.ndarray | None outputIds: If provided, generate only the rows
+            belonging to these output neurons.
+        """
 
         pass
 
+    def getCoreKernelIdMap(self, maskFlat):
+        """Get the part of the kernelIdMap belonging to a single core.
+
+        :param np.ndarray maskFlat: Boolean mask of the output neurons on the
+            core, flattened in Fortran order.
+
+        :return: kernelIdMap of shape (numCxOnCore, numNeuronsInput).
+        :rtype: lil_matrix
+        """
+
+        # Generate the rows of this core on demand, unless the map of the
+        # whole layer is available already.
+        if self.lazyKernelIdMap and self._kernelIdMap is None:
+            return self.genKernelIdMap(np.flatnonzero(maskFlat)).tolil()
+
+        kernelIdMap = self.kernelIdMap
+        kMap = lil_matrix((np.count_nonzero(maskFlat), kernelIdMap.shape[1]),
+                          dtype=int)
+        kMap.rows = kernelIdMap.rows[maskFlat]
+        kMap.data = kernelIdMap.data[maskFlat]
+
+        return kMap
+
     @abstractmethod
     def compile(self, partitionCandidate):
         """Compile layer.
@@ -1027,6 +1258,23 @@ class NxLayer(object):
 
         pass
 
+    def updateWeights(self, mappableLayer):
+        """Update weights and biases of a compiled layer.
+
+        Re-encodes the synapses of ``mappableLayer`` with the current weights
+        of this layer, keeping its partitioning and axons. Layers without
+        weights return ``mappableLayer`` unchanged.
+
+        Returns ``None`` if a core runs out of resources with the new weights.
+
+        :param Layer mappableLayer: The compiled layer.
+
+        :return: ``mappableLayer``.
+        :rtype: Layer | None
+        """
+
+        return mappableLayer
+
     @abstractmethod
     def getMultiplicityMap(self, coreIdMap):
         """Generate multiplicity map.
@@ -1244,7 +1492,7 @@ class NxConv2D(NxLayer, Conv2D):
                                     self.kernel_size, self.strides,
                                     self.dilation_rate)
 
-    def genKernelIdMap(self):
+    def genKernelIdMap(self, outputIds=None):
         inputShape = self.input_shape[1:]
         # When using signed spikes the number of channels in the input
         # is doubled.
@@ -1259,7 +1507,8 @@ class NxConv2D(NxLayer, Conv2D):
         return _genKernelIdMap(inputShape, self.output_shape[1:],
                                self._padding, self.strides, self.kernel_size,
                                self.dilation_rate,
-                               zeroPadding=self.zeroPadding)
+                               zeroPadding=self.zeroPadding,
+                               outputIds=outputIds)
 
     def getMultiplicityMap(self, coreIdMap):
         """Generate multiplicity map.
@@ -1302,6 +1551,9 @@ class NxConv2D(NxLayer, Conv2D):
     def compile(self, partitionCandidate):
         return compileConvlike(self, partitionCandidate)
 
+    def updateWeights(self, mappableLayer):
+        return updateWeightsConvlike(self, mappableLayer)
+
     def validatePartition(self, partitionCandidate):
         """Validate layer partition.
 
@@ -1403,11 +1655,12 @@ class NxConv1D(NxLayer, Conv1D):
                                       self._kernel_shape2D, self._strides2D,
                                       self._dilation_rate2D)
 
-    def genKernelIdMap(self):
+    def genKernelIdMap(self, outputIds=None):
         return _genKernelIdMap(self._input_shape3D[1:],
                                self._output_shape3D[1:],
                                self._padding2D, self._strides2D,
-                               self._kernel_shape2D, self._dilation_rate2D)
+                               self._kernel_shape2D, self._dilation_rate2D,
+                               outputIds=outputIds)
 
     def getMultiplicityMap(self, coreIdMap):
         """Generate multiplicity map.
@@ -1453,6 +1706,9 @@ class NxConv1D(NxLayer, Conv1D):
     def compile(self, partitionCandidate):
         return compileConvlike(self, partitionCandidate)
 
+    def updateWeights(self, mappableLayer):
+        return updateWeightsConvlike(self, mappableLayer)
+
     def validatePartition(self, partitionCandidate):
         """Validate layer partition.
 
@@ -1544,11 +1800,12 @@ class NxDepthwiseConv2D(NxLayer, DepthwiseConv2D):
                                     self.kernel_size, self.strides,
                                     self.dilation_rate)
 
-    def genKernelIdMap(self):
+    def genKernelIdMap(self, outputIds=None):
         return _genKernelIdMap(self.input_shape[1:], self.output_shape[1:],
                                self._padding, self.strides, self.kernel_size,
                                self.dilation_rate, True,
-                               zeroPadding=self.zeroPadding)
+                               zeroPadding=self.zeroPadding,
+                               outputIds=outputIds)
 
     def getMultiplicityMap(self, coreIdMap):
         """Generate multiplicity map.
@@ -1585,6 +1842,9 @@ class NxDepthwiseConv2D(NxLayer, DepthwiseConv2D):
     def compile(self, partitionCandidate):
         return compileConvlike(self, partitionCandidate)
 
+    def updateWeights(self, mappableLayer):
+        return updateWeightsConvlike(self, mappableLayer)
+
     def validatePartition(self, partitionCandidate):
         """Validate layer partition.
 
@@ -1667,10 +1927,10 @@ class NxAveragePooling2D(NxLayer, AveragePooling2D):
 
         AveragePooling2D.build(self, input_shape)
 
-    def genKernelIdMap(self):
+    def genKernelIdMap(self, outputIds=None):
         return _genKernelIdMap(self.input_shape[1:], self.output_shape[1:],
                                self._padding, self.strides, self.pool_size,
-                               (1, 1), True)
+                               (1, 1), True, outputIds=outputIds)
 
     def getMultiplicityMap(self, coreIdMap):
         """Generate multiplicity map.
@@ -1706,6 +1966,9 @@ class NxAveragePooling2D(NxLayer, AveragePooling2D):
     def compile(self, partitionCandidate):
         return compileConvlike(self, partitionCandidate)
 
+    def updateWeights(self, mappableLayer):
+        return updateWeightsConvlike(self, mappableLayer)
+
     def validatePartition(self, partitionCandidate):
         """Validate layer partition.
 
@@ -1820,20 +2083,7 @@ class NxDense(NxLayer, Dense):
             multiplicityFlat = 2 * np.ones_like(multiplicityFlat)
 
         # Get weights and biases. Needed for SynEntries and CompartmentGroup.
-        weights, biases = self.get_weights()
-
-        if len(self._inbound_nodes):
-            prevLayer = self._inbound_nodes[0].inbound_layers
-            # prevLayer may be wrapped in a list of lenght 1:
-            if isinstance(prevLayer, (list, tuple)):
-                prevLayer = prevLayer[0]
-            if 'Flatten' in prevLayer.__class__.__name__:
-                shape = prevLayer.input_shape[1:]
-                idxs = np.arange(int(np.prod(shape)))
-                permutation = np.ravel(np.reshape(idxs, shape, 'C'), 'F')
-                weights = weights[permutation]
-
-        biases = biases.astype(int)
+        weights, biases = self._getWeights()
         biasExp = np.ones_like(biases) * \
             partitionCandidate.compartmentKwargs['biasExp']
 
@@ -1872,31 +2122,27 @@ class NxDense(NxLayer, Dense):
                 wgts = weights[i, cxIds]
                 synapseEncoder.encode(relCxIds * neuronSize, wgts, 0, 0,
                                       kernelIds)
+                synapseEncoder.endNeuron()
 
-                synEntriesOfSourceGroup = [synapseEncoder.popSynEntries()]
-
-                synEntriesOfCore.append(synEntriesOfSourceGroup)
+                synEntriesOfCore.append(synapseEncoder.popSynapseGroup())
 
             # synEntries and synFmts for recurrent connections
             if self.resetMode == 'soft':
 
                 wgt = np.array([-connKwargs['weightMantSR']])
                 for relCxId in relCxIds:
-                    synEntriesOfRecurrentGroup = []
                     synapseEncoder.encode(np.array([relCxId]) * neuronSize,
                                           wgt,
                                           0,
                                           0,
                                           np.array([1], int),
                                           softReset=True)
+                    synapseEncoder.endNeuron()
 
-                    synEntriesOfRecurrentGroup.append(
-                        synapseEncoder.popSynEntries())
+                    synEntriesOfCore.append(synapseEncoder.popSynapseGroup())
 
-                    synEntriesOfCore.append(synEntriesOfRecurrentGroup)
-
-            synFmts, synEntryMap = compressSynFmts(synapseEncoder.getSynFmts(),
-                                                   limits.maxNumSynFmt)
+            synFmts, synEntryMap = compressSynFmts(
+                synapseEncoder.getSynFmtArray(), limits.maxNumSynFmt)
 
             if len(synFmts) > limits.maxNumSynFmt:
                 limits.numSynFmts += 1
@@ -2054,6 +2300,43 @@ class NxDense(NxLayer, Dense):
 
         return partitionCandidate
 
+    def _getWeights(self):
+        """Get weights and biases.
+
+        If the pre-layer is a ``Flatten`` layer, the rows of the weight matrix
+        are permuted from C to Fortran order, which is used by the compiler.
+
+        :return: Weights and integer biases.
+        :rtype: tuple[np.ndarray, np.ndarray]
+        """
+
+        weights, biases = self.get_weights()
+
+        if len(self._inbound_nodes):
+            prevLayer = self._inbound_nodes[0].inbound_layers
+            # prevLayer may be wrapped in a list of lenght 1:
+            if isinstance(prevLayer, (list, tuple)):
+                prevLayer = prevLayer[0]
+            if 'Flatten' in prevLayer.__class__.__name__:
+                shape = prevLayer.input_shape[1:]
+                idxs = np.arange(int(np.prod(shape)))
+                permutation = np.ravel(np.reshape(idxs, shape, 'C'), 'F')
+                weights = weights[permutation]
+
+        return weights, biases.astype(int)
+
+    def updateWeights(self, mappableLayer):
+
+        weights, biases = self._getWeights()
+
+        # Synapse group i holds the synapses of input neuron i, and the
+        # kernelIds of the synapses are the output neuron ids plus one.
+        def getWeights(synGrpId, kernelIds):
+            return weights[synGrpId, kernelIds - 1]
+
+        return _updateWeights(mappableLayer, getWeights, biases, 'dense1',
+                              self.exclusionCriteria)
+
     def getMultiplicityMap(self, coreIdMap):
 
         # In a fully-connected layer, the multiplicity equals the number of
@@ -2317,13 +2600,12 @@ class NxInputLayer(NxLayer, InputLayer):
                                           weights=weights,
                                           cIdxOffset=0,
                                           cIdxMult=0)
+                    synapseEncoder.endNeuron()
 
-                    synEntriesOfSourceGroup = [synapseEncoder.popSynEntries()]
-
-                    synEntriesOfCore.append(synEntriesOfSourceGroup)
+                    synEntriesOfCore.append(synapseEncoder.popSynapseGroup())
 
                 synFmts, synEntryMap = compressSynFmts(
-                    synapseEncoder.getSynFmts(), limits.maxNumSynFmt)
+                    synapseEncoder.getSynFmtArray(), limits.maxNumSynFmt)
 
                 if len(synFmts) > limits.maxNumSynFmt:
                     limits.numSynFmts += 1
@@ -2403,7 +2685,6 @@ class NxInputLayer(NxLayer, InputLayer):
                         continue
                     mappedCxIds[cxIdHash] = (synGrpId, cxIds, relSrcIds)
                     synGrpId += 1
-                    synEntriesOfRecurrentGroup = []
                     for cxId, relSrcId in zip(cxIds, relSrcIds):
                         wgt = -connKwargs['weightMantSR']
                         if cxId in cxIdMap:
@@ -2416,16 +2697,13 @@ class NxInputLayer(NxLayer, InputLayer):
                                               0,
                                               np.array([1], int),
                                               softReset=True)
+                        synapseEncoder.endNeuron()
 
-                        synEntriesOfRecurrentGroup.append(
-                            synapseEncoder.popSynEntries())
-
-                    synEntriesOfCore.append(synEntriesOfRecurrentGroup)
+                    synEntriesOfCore.append(synapseEncoder.popSynapseGroup())
 
                 # For some configurations a neuron may receive input but is not
                 # connected to the next layer. A recurrent synapse is added to
                 # ensure the v_mem does not overflow.
-                synEntriesOfRecurrentGroup = []
                 numCx = len(relToAbsDestCxIdxMap)
                 for cxId in range(numCx):
                     if cxId not in cxIdMap:
@@ -2436,15 +2714,14 @@ class NxInputLayer(NxLayer, InputLayer):
                                               0,
                                               np.array([1], int),
                                               softReset=True)
+                        synapseEncoder.endNeuron()
 
-                        synEntriesOfRecurrentGroup.append(
-                            synapseEncoder.popSynEntries())
-
-                if len(synEntriesOfRecurrentGroup):
+                synEntriesOfRecurrentGroup = synapseEncoder.popSynapseGroup()
+                if synEntriesOfRecurrentGroup.numNeurons:
                     synEntriesOfCore.append(synEntriesOfRecurrentGroup)
 
                 synFmts, synEntryMap = compressSynFmts(
-                    synapseEncoder.getSynFmts(), limits.maxNumSynFmt)
+                    synapseEncoder.getSynFmtArray(), limits.maxNumSynFmt)
 
                 if len(synFmts) > limits.maxNumSynFmt:
                     limits.numSynFmts += 1
@@ -2602,6 +2879,8 @@ class NxInputLayer(NxLayer, InputLayer):
 class NxFlatten(NxLayer, Flatten):
     """Flatten layer for Loihi DNNs."""
 
+    isVirtual = True
+
     def __init__(self, data_format=None, **kwargs):
 
         NxLayer.__init__(self, **kwargs)
@@ -2656,6 +2935,8 @@ class NxFlatten(NxLayer, Flatten):
 class NxZeroPadding2D(NxLayer, ZeroPadding2D):
     """Padding layer for Loihi DNNs."""
 
+    isVirtual = True
+
     def __init__(self, padding=None, data_format=None, **kwargs):
 
         NxLayer.__init__(self, **kwargs)
@@ -2714,6 +2995,8 @@ class NxZeroPadding2D(NxLayer, ZeroPadding2D):
 class NxReshape(NxLayer, Reshape):
     """Reshape layer for Loihi DNNs."""
 
+    isVirtual = True
+
     def __init__(self, target_shape, **kwargs):
 
         NxLayer.__init__(self, **kwargs)
@@ -2779,6 +3062,10 @@ class NxModel(Model):
         self.verbose = kwargs.pop('verbose', False)
         self.saveOutput = kwargs.pop('saveOutput', False)
         self.storeAllCandidates = kwargs.pop('storeAllCandidates', False)
+        self.numPartitionWorkers = kwargs.pop('numPartitionWorkers', 1)
+        self.numMapWorkers = kwargs.pop('numMapWorkers', 1)
+        self.cacheDir = kwargs.pop('cacheDir', None)
+        self.cacheSize = kwargs.pop('cacheSize', None)
 
         self.board = None
         self.tmpdir = None
@@ -2822,9 +3109,13 @@ class NxModel(Model):
         self.logger.addHandler(logging.FileHandler(
             os.path.join(self.logdir, 'compiler.log')))
 
+        cache = None if self.cacheDir is None else \
+            PartitionCache(self.cacheDir, self.cacheSize, self.logger)
+
         self.partitionOptimizer = PartitionOptimizer(
             self.numCandidatesToCompute, self.logger, logdir=self.logdir,
-            storeAllCandidates=self.storeAllCandidates)
+            storeAllCandidates=self.storeAllCandidates,
+            numWorkers=self.numPartitionWorkers, cache=cache)
 
         self._isInitialized = True
 
@@ -2838,6 +3129,10 @@ class NxModel(Model):
                   'verbose': self.verbose,
                   'saveOutput': self.saveOutput,
                   'storeAllCandidates': self.storeAllCandidates,
+                  'numPartitionWorkers': self.numPartitionWorkers,
+                  'numMapWorkers': self.numMapWorkers,
+                  'cacheDir': self.cacheDir,
+                  'cacheSize': self.cacheSize,
                   '_maxNumCoresPerChip': self._maxNumCoresPerChip}
         baseConfig = super(NxModel, self).get_config()
         config.update(baseConfig)
@@ -2998,12 +3293,19 @@ class NxModel(Model):
 
         mapper = DnnMapper(self.board)
 
+        # With multiple workers, all layers are loaded first and the mapper
+        # creates the register images of their partitions in parallel.
+        # Otherwise, only one layer at a time is kept in memory.
+        isParallel = self.numMapWorkers != 1
+        compilableLayers = []
+        mappableLayers = []
+
         for compilableLayer in reversed(self.layers):
             name = compilableLayer.name
 
             try:
                 mappableLayer = deserializeLayer(self.pathMappables,
-                                                 name + '.pickle')
+                                                 name + LAYER_FILE_EXTENSION)
                 # Ensure that mappables are updated with latest changes, e.g.
                 # threshold or weight exponents.
                 mappableLayer.compartmentKwargs.update(
@@ -3013,19 +3315,41 @@ class NxModel(Model):
             except FileNotFoundError:
                 continue
 
+            if isParallel:
+                compilableLayers.append(compilableLayer)
+                mappableLayers.append(mappableLayer)
+                continue
+
             self.logger.info("Mapping layer %s.", name)
             mapper.map(mappableLayer)
+            self._setMappedLayer(compilableLayer, mappableLayer)
 
-            # This enables accessing neuron fields directly, e.g. for probes.
-            compilableLayer.setBoardAndCxResourceMap(
-                self.board, mappableLayer.genCxResourceMap())
-            if 'Input' in compilableLayer.__class__.__name__ and \
-                    compilableLayer.inputMode == InputModes.AEDAT:
-                compilableLayer.inputAxonResourceMap = \
-                    mappableLayer.genInputAxonResourceMap()
+        if isParallel:
+            self.logger.info("Mapping %d layers with %s workers.",
+                             len(mappableLayers), self.numMapWorkers or 'all')
+            mapper.mapLayers(mappableLayers, self.numMapWorkers)
+            for compilableLayer, mappableLayer in zip(compilableLayers,
+                                                      mappableLayers):
+                self._setMappedLayer(compilableLayer, mappableLayer)
 
         return mapper
 
+    def _setMappedLayer(self, compilableLayer, mappableLayer):
+        """Make the resources of a mapped layer accessible from the compilable
+        layer.
+
+        :param NxLayer compilableLayer: Layer of this model.
+        :param Layer mappableLayer: Mapped layer.
+        """
+
+        # This enables accessing neuron fields directly, e.g. for probes.
+        compilableLayer.setBoardAndCxResourceMap(
+            self.board, mappableLayer.genCxResourceMap())
+        if 'Input' in compilableLayer.__class__.__name__ and \
+                compilableLayer.inputMode == InputModes.AEDAT:
+            compilableLayer.inputAxonResourceMap = \
+                mappableLayer.genInputAxonResourceMap()
+
     @logMemTime('partitionFromSavedConfig')
     def partitionFromSavedConfig(self):
         """Compile partitioned layers from stored partition config.
@@ -3070,6 +3394,63 @@ class NxModel(Model):
             # Update postLayer for next iteration.
             mappablePostLayer = mappableLayer
 
+    @logMemTime('updateWeights')
+    def updateWeights(self):
+        """Update weights and biases of a compiled model on disk.
+
+        Use this after changing the weights of the model, e.g. by fine-tuning,
+        but not its architecture. Instead of compiling every layer again, the
+        stored mappable layers are loaded, their synapses are re-encoded with
+        the current weights, and the result is written back. The coreIdMap,
+        multiplicityMap and axons of the layers are reused.
+
+        If the new weights do not fit on a core of some layer, the model is
+        partitioned again from scratch.
+
+        :return: Whether the stored partitions could be reused.
+        :rtype: bool
+        """
+
+        if not self._isInitialized:
+            self.initialize()
+
+        hasPartitionConfig, hasMappable = self.canLoad()
+
+        if not hasMappable:
+            self.logger.info("No compiled layers found in %s.",
+                             self.pathMappables)
+            if hasPartitionConfig:
+                self.partitionFromSavedConfig()
+            else:
+                self.partition()
+            return False
+
+        for compilableLayer in reversed(self.layers):
+            name = compilableLayer.name
+
+            try:
+                mappableLayer = deserializeLayer(self.pathMappables,
+                                                 name + LAYER_FILE_EXTENSION)
+            except FileNotFoundError:
+                continue
+
+            mappableLayer.compartmentKwargs.update(
+                compilableLayer.compartmentKwargs)
+            mappableLayer.connectionKwargs.update(
+                compilableLayer.connectionKwargs)
+
+            self.logger.info("Updating weights of layer %s.", name)
+            if compilableLayer.updateWeights(mappableLayer) is None:
+                self.logger.info("New weights of layer %s exceed the "
+                                 "resources of a core. Partitioning model "
+                                 "again.", name)
+                self.partition()
+                return False
+
+            serializeLayer(mappableLayer, self.pathMappables)
+
+        return True
+
     def saveExclusionCriteriaHitCount(self, path):
         """Save hit count of exclusion criteria.
 
@@ -3128,7 +3509,8 @@ def loadNxModel(filepath, customObjects=None, doCompile=None, **kwargs):
 
     # Overwrite default attributes set by Keras load_model function.
     for attr in ['verbose', 'numCandidatesToCompute', 'logdir', 'logger',
-                 'saveOutput']:
+                 'saveOutput', 'numPartitionWorkers', 'numMapWorkers',
+                 'cacheDir', 'cacheSize']:
         if attr in kwargs:
             setattr(model, attr, kwargs[attr])
 
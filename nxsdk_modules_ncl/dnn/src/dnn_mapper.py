@@ -12,6 +12,8 @@
 # no express or implied warranties, other than those that are
 # expressly stated in the License.
 
+import multiprocessing
+import os
 from collections import OrderedDict
 from typing import TYPE_CHECKING
 
@@ -27,7 +29,113 @@ if TYPE_CHECKING:
     from nxsdk.arch.n2a.graph.n2acore import N2ACore
 
 
-# ToDo: Check if NodeSet configuration can be vectorized.
+def configureRegisters(registerFile, fields, idxs=None):
+    """Configure registers of a register file from arrays of field values.
+
+    This is the array-level interface through which ``DnnMapper`` writes the
+    synapse, synFmt and compartment tables of a core. If the register file
+    provides a ``configureArrays(idxs, **fields)`` method, the whole table is
+    written in a single call. Otherwise, each register is configured
+    individually.
+
+    :param NodeSet registerFile: Register file, e.g. ``core.synapses``.
+    :param dict[str, np.ndarray] fields: Arrays with the value of each field
+        for each register.
+    :param np.ndarray | None idxs: Indices of the registers to configure.
+        Defaults to the first ``n`` registers, where ``n`` is the length of
+        the field arrays.
+    """
+
+    names = list(fields.keys())
+    if idxs is None:
+        idxs = np.arange(len(fields[names[0]]) if len(names) else 0)
+
+    configureArrays = getattr(registerFile, 'configureArrays', None)
+    if configureArrays is not None:
+        configureArrays(idxs, **fields)
+        return
+
+    columns = [np.asarray(fields[name]).tolist() for name in names]
+    for idx, values in zip(np.asarray(idxs).tolist(), zip(*columns)):
+        registerFile[idx].configure(**dict(zip(names, values)))
+
+
+class _RegisterProxy:
+    """Stand-in for a register, register file or field group of a core.
+
+    Records all writes to it in the operations list of a ``RegisterImage``.
+
+    :param list ops: Operations list of the ``RegisterImage``.
+    :param tuple path: Sequence of attribute names and indices that leads
+        from the core to this register.
+    """
+
+    def __init__(self, ops, path):
+        object.__setattr__(self, '_ops', ops)
+        object.__setattr__(self, '_path', path)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return _RegisterProxy(self._ops, self._path + (name,))
+
+    def __getitem__(self, idx):
+        return _RegisterProxy(self._ops, self._path + (int(idx),))
+
+    def __setattr__(self, name, value):
+        self._ops.append(('set', self._path, name, value))
+
+    def configure(self, **kwargs):
+        self._ops.append(('configure', self._path, kwargs))
+
+    def configureArrays(self, idxs, **fields):
+        self._ops.append(('table', self._path, np.asarray(idxs), fields))
+
+
+class RegisterImage:
+    """Register configuration of a single core, as created by
+    ``DnnMapper.mapToImage``.
+
+    The image records the writes to the synapse, synFmt and compartment
+    registers of a partition in order. It only holds numpy arrays and plain
+    Python values, so it can be created in a worker process and sent to the
+    main process, which applies it to a core of the board.
+    """
+
+    def __init__(self):
+        self._ops = []
+        self.synPtrs = None
+        self.isSomaTraceEnabled = False
+
+    @property
+    def core(self):
+        """Core-like object whose register writes are recorded.
+
+        :return: Stand-in for an ``N2ACore``.
+        :rtype: _RegisterProxy
+        """
+
+        return _RegisterProxy(self._ops, ())
+
+    def apply(self, core):
+        """Write the recorded register configuration to a core.
+
+        :param N2ACore core: Core to configure.
+        """
+
+        for op in self._ops:
+            target = core
+            for key in op[1]:
+                target = target[key] if isinstance(key, int) \
+                    else getattr(target, key)
+            if op[0] == 'set':
+                setattr(target, op[2], op[3])
+            elif op[0] == 'configure':
+                target.configure(**op[2])
+            else:
+                configureRegisters(target, op[3], op[2])
+
+
 class DnnMapper:
     """Map a Deep Neural Network onto Loihi."""
 
@@ -66,7 +174,7 @@ class DnnMapper:
         # contiguous block of memory
         synLensPerAxGrp = []
         for i, synGrp in enumerate(partition.synapseGroups):
-            popSize = len(synGrp.synEntries)
+            popSize = synGrp.numNeurons
             synLens = [self._synGrpMap[(synGrp, j)][1] for j in range(popSize)]
             synPtr, _ = self._synGrpMap[(synGrp, 0)]
             core.synapseMap[i].synapsePtr = synPtr
@@ -147,78 +255,162 @@ class DnnMapper:
         :param N2ACore core: Core to map to.
         """
 
-        sharedCfgs = partition.layer.connectionKwargs
+        synPtrs = self._configureSynapses(partition, core)
+        self._setSynGrpMap(partition, synPtrs)
 
-        # Build synFmts
-        for i, sf in enumerate(partition.synFmts):
-            wgtBits = sf.numWgtBits if sf.numWgtBits != 8 else 7
-            dlyBits = sf.numDlyBits
+    def _configureSynapses(self, partition, core):
+        """Configure synapse and synFmt registers.
 
-            # Check if synFmt is used for soft-reset mode
-            if partition.resetMode == 'soft' and sf.softReset:
-                wgtExp = sharedCfgs["weightExpSR"]
-            else:
-                wgtExp = sharedCfgs["weightExponent"]
-
-            # Original synFmt
-            core.synapseFmt[1 + i * 2 + 0].configure(
-                compression=int(sf.compression),
-                numSynapses=63,
-                wgtExp=wgtExp,
-                wgtBits=wgtBits,
-                dlyBits=dlyBits,
-                skipBits=sf.numSkipBits,
-                idxBits=sf.numIdxBits - 5,
-                cIdxOffset=sf.cIdxOffset,
-                cIdxMult=sf.cIdxMult,
-                fanoutType=sf.signMode)
-            # Copy of synFmt to enforce synEntry switching
-            core.synapseFmt[1 + i * 2 + 1].configure(
-                compression=int(sf.compression),
-                numSynapses=63,
-                wgtExp=wgtExp,
-                wgtBits=wgtBits,
-                dlyBits=dlyBits,
-                skipBits=sf.numSkipBits,
-                idxBits=sf.numIdxBits - 5,
-                cIdxOffset=sf.cIdxOffset,
-                cIdxMult=sf.cIdxMult,
-                fanoutType=sf.signMode)
+        :param Partition partition: Layer partition.
+        :param N2ACore core: Core to configure.
+
+        :return: Offsets of the synapses of each neuron into the synapse
+            registers, per synapse group.
+        :rtype: list[np.ndarray]
+        """
+
+        # Build synFmts. Each synFmt is followed by a copy, see
+        # ``_getHwSynFmtIds``.
+        synFmtTable = self._getSynFmtTable(partition)
+        configureRegisters(core.synapseFmt, synFmtTable,
+                           1 + np.arange(len(synFmtTable['compression'])))
 
         # Build synapses
+        synapseTable, synPtrs = self._getSynapseTable(partition)
+        configureRegisters(core.synapses, synapseTable)
+
+        return synPtrs
+
+    def _setSynGrpMap(self, partition, synPtrs):
+        """Build (synGrp, col)->(synPtr, synLen) map for axon creation.
+
+        :param Partition partition: Layer partition.
+        :param list[np.ndarray] synPtrs: Offsets of the synapses of each
+            neuron into the synapse registers, per synapse group.
+        """
+
+        for synGrp, synPtrsOfGroup in zip(partition.synapseGroups, synPtrs):
+            synPtrsOfGroup = synPtrsOfGroup.tolist()
+            for col in range(synGrp.numNeurons):
+                self._synGrpMap[(synGrp, col)] = \
+                    (synPtrsOfGroup[col],
+                     synPtrsOfGroup[col + 1] - synPtrsOfGroup[col])
+
+    @staticmethod
+    def _getSynFmtTable(partition):
+        """Get the synapseFmt registers of a partition as arrays.
+
+        :param Partition partition: Layer partition.
+
+        :return: Field values of the synapseFmt registers. Each synFmt
+            appears twice in a row.
+        :rtype: dict[str, np.ndarray]
+        """
+
+        sharedCfgs = partition.layer.connectionKwargs
+
+        props = np.zeros((0, 9), int) if len(partition.synFmts) == 0 else \
+            np.stack([synFmt.asArray() for synFmt in partition.synFmts])
+        props = np.repeat(props, 2, axis=0)
+
+        # Check if synFmt is used for soft-reset mode
+        wgtExp = np.full(len(props), sharedCfgs["weightExponent"])
+        if partition.resetMode == 'soft':
+            wgtExp[props[:, 8] == 1] = sharedCfgs["weightExpSR"]
+
+        numWgtBits = props[:, 4]
+
+        return {'compression': props[:, 5],
+                'numSynapses': np.full(len(props), 63),
+                'wgtExp': wgtExp,
+                'wgtBits': np.where(numWgtBits != 8, numWgtBits, 7),
+                'dlyBits': props[:, 7],
+                'skipBits': props[:, 3],
+                'idxBits': props[:, 2] - 5,
+                'cIdxOffset': props[:, 0],
+                'cIdxMult': props[:, 1],
+                'fanoutType': props[:, 6]}
+
+    def _getSynapseTable(self, partition):
+        """Get the synapse registers of a partition as arrays.
+
+        The synapses of all synapse groups are stored consecutively.
+
+        :param Partition partition: Layer partition.
+
+        :return: Field values of the synapse registers, and the offsets of the
+            synapses of each neuron into the synapse registers, per synapse
+            group.
+        :rtype: tuple[dict[str, np.ndarray], list[np.ndarray]]
+        """
+
+        synFmtIds = []
+        cIdxs = []
+        weights = []
+        delays = []
+        synPtrs = []
         j = 0
         for synGrp in partition.synapseGroups:
-            for col, synEntriesPerCol in enumerate(synGrp.synEntries):
-                prevSynFmtId = -1
-                synPtr = j
+            synEntries = synGrp.synEntryArrays
 
-                for synEntry in synEntriesPerCol:
-                    # Different synFmts are spaced by 2 to leave room for copy
-                    synFmtId = synEntry.synFmtId * 2
+            # Expand per-synEntry fields to per-synapse fields.
+            numSynPerSynEntry = synEntries.getNumSynPerSynEntry()
+            synFmtIds.append(np.repeat(1 + self._getHwSynFmtIds(synEntries),
+                                       numSynPerSynEntry))
+            cIdxs.append(np.repeat(synEntries.prefixOffsets,
+                                   numSynPerSynEntry) + synEntries.idxs)
+            weights.append(synEntries.weights)
+            delays.append(synEntries.delays)
 
-                    # Enforce new synEntry by jumping to copy if synFmtId
-                    # does not change
-                    if prevSynFmtId == synFmtId:
-                        synFmtId += 1
-                    prevSynFmtId = synFmtId
+            synPtrs.append(j + synEntries.synPtrs[synEntries.neuronPtrs])
+            j += synEntries.numSyn
 
-                    # Store synapses of synEntry
-                    for i in range(synEntry.numSyn):
-                        synCfgKwargs = {
-                            'synFmtId': 1 + synFmtId,
-                            'CIdx': synEntry.prefixOffset + synEntry.idxs[i],
-                            'Wgt': synEntry.weights[i]}
+        def concatenate(arrays):
+            return np.concatenate(arrays).astype(int) if len(arrays) else \
+                np.zeros(0, int)
 
-                        if synEntry.delays is not None:
-                            synCfgKwargs.update({'Dly': synEntry.delays[i]})
+        synapseTable = {'synFmtId': concatenate(synFmtIds),
+                        'CIdx': concatenate(cIdxs),
+                        'Wgt': concatenate(weights)}
 
-                        core.synapses[j].configure(**synCfgKwargs)
+        if any(d is not None for d in delays):
+            synapseTable['Dly'] = concatenate(
+                [np.zeros(len(w), int) if d is None else d
+                 for d, w in zip(delays, weights)])
 
-                        j += 1
+        return synapseTable, synPtrs
 
-                # Build (synGrp, col)->(synPtr, synLen) map for axon creation
-                synLen = j - synPtr
-                self._synGrpMap[(synGrp, col)] = (synPtr, synLen)
+    @staticmethod
+    def _getHwSynFmtIds(synEntries):
+        """Get the id of the hardware synFmt used by each synEntry.
+
+        Different synFmts are spaced by 2 to leave room for a copy. If two
+        consecutive synEntries of a neuron use the same synFmt, the second one
+        uses the copy, which forces the hardware to start a new synEntry.
+
+        :param SynEntryArrays synEntries: SynEntries of a synapse group.
+
+        :return: Zero-based hardware synFmt id of each synEntry.
+        :rtype: np.ndarray
+        """
+
+        if synEntries.numSynEntries == 0:
+            return np.zeros(0, int)
+
+        synFmtIds = np.array([synFmt.id for synFmt in synEntries.synFmts],
+                             int)[synEntries.synFmtIds] * 2
+
+        # Alternate between original and copy within each run of synEntries
+        # that share the same synFmt.
+        isRunStart = np.ones(len(synFmtIds), bool)
+        isRunStart[1:] = synFmtIds[1:] != synFmtIds[:-1]
+        neuronPtrs = synEntries.neuronPtrs[:-1]
+        isRunStart[neuronPtrs[neuronPtrs < len(synFmtIds)]] = True
+        runStarts = np.maximum.accumulate(
+            np.where(isRunStart, np.arange(len(synFmtIds)), 0))
+        posInRun = np.arange(len(synFmtIds)) - runStarts
+
+        return synFmtIds + posInRun % 2
 
     def _mapCompartments(self, partition, core):
         """Map compartments to NeuroCore.
@@ -238,16 +430,12 @@ class DnnMapper:
         # Multi-compartment neurons profiles are interleaved by neuronSize
         neuronSize = 2 if partition.resetMode == 'soft' else 1
         maxCxId = max(cxGrp.cxIds)
-        for cxId in range(maxCxId + 1):
-            bias = cxGrp.biasMant[cxId]
-            biasExp = cxGrp.biasExp[cxId]
-            profile = (cxId + 2) % neuronSize
-            core.cxCfg[cxId].configure(
-                bias=bias,
-                biasExp=biasExp,
-                cxProfile=profile,
-                vthProfile=0
-            )
+        cxIds = np.arange(maxCxId + 1)
+        configureRegisters(core.cxCfg, {
+            'bias': cxGrp.biasMant[cxIds],
+            'biasExp': cxGrp.biasExp[cxIds],
+            'cxProfile': (cxIds + 2) % neuronSize,
+            'vthProfile': np.zeros_like(cxIds)})
 
         # Configure number of compartments to update
         numCxGroups = int(math.ceil((maxCxId + 1) / 4))
@@ -255,10 +443,7 @@ class DnnMapper:
 
         # Configure compartments to start out in IDLE phase
         somaOp = 3 if sharedCfgs['enableSomaTrace'] else 0
-        for i in range(numCxGroups):
-            core.cxMetaState[i].configure(
-                phase0=2, phase1=2, phase2=2, phase3=2,
-                somaOp0=somaOp, somaOp1=somaOp, somaOp2=somaOp, somaOp3=somaOp)
+        self._configureIdlePhase(core, numCxGroups, somaOp)
 
         # Configure dendritic accumulators to max delay of 8 to support 1024
         # compartments
@@ -328,8 +513,23 @@ class DnnMapper:
         else:
             # Threshold must be stored discretely for each compartment when
             # homeostasis is on
-            for cxId in range(maxCxId+1):
-                core.somaState[cxId].configure(vth=vThMant)
+            configureRegisters(core.somaState,
+                               {'vth': np.full(maxCxId + 1, vThMant)})
+
+    @staticmethod
+    def _configureIdlePhase(core, numCxGroups, somaOp):
+        """Configure compartments to start out in IDLE phase.
+
+        :param N2ACore core: Core to configure.
+        :param int numCxGroups: Number of groups of 4 compartments.
+        :param int somaOp: Soma operation of all compartments.
+        """
+
+        fields = {}
+        for i in range(4):
+            fields['phase{}'.format(i)] = np.full(numCxGroups, 2)
+            fields['somaOp{}'.format(i)] = np.full(numCxGroups, somaOp)
+        configureRegisters(core.cxMetaState, fields)
 
     def _mapOutputAxons(self, partition, core):
         """Map output axons to NeuroCore.
@@ -392,35 +592,23 @@ class DnnMapper:
                 partition.id)
 
         # Configure discrete states
-        maxCxId = 0
-        for i, cxId in enumerate(cxGrp.cxIds):
-            maxCxId = max([cxId, maxCxId])
+        cxIds = np.asarray(cxGrp.cxIds)
+        maxCxId = max(cxGrp.cxIds, default=0)
+        if partition.isInhibitory:
             # Inh Compartment
-            if partition.isInhibitory:
-                core.cxCfg[cxId].configure(
-                    bias=0,
-                    biasExp=0,
-                    cxProfile=0,
-                    vthProfile=0
-                )
-            # Soma
-            elif ((cxId + 1) % 2) == 0:
-                core.cxCfg[cxId].configure(
-                    bias=cxGrp.biasMant[i],
-                    biasExp=cxGrp.biasExp[i],
-                    cxProfile=1,
-                    vthProfile=1
-                )
-            # Dendrite
-            elif ((cxId + 2) % 2) == 0:
-                core.cxCfg[cxId].configure(
-                    bias=cxGrp.biasMant[i],
-                    biasExp=cxGrp.biasExp[i],
-                    cxProfile=0,
-                    vthProfile=0
-                )
-            else:
-                assert False, "Invalid Compartment"
+            configureRegisters(core.cxCfg, {
+                'bias': np.zeros_like(cxIds),
+                'biasExp': np.zeros_like(cxIds),
+                'cxProfile': np.zeros_like(cxIds),
+                'vthProfile': np.zeros_like(cxIds)}, cxIds)
+        else:
+            # Odd compartments are somas, even ones dendrites.
+            isSoma = cxIds % 2
+            configureRegisters(core.cxCfg, {
+                'bias': cxGrp.biasMant[:len(cxIds)],
+                'biasExp': cxGrp.biasExp[:len(cxIds)],
+                'cxProfile': isSoma,
+                'vthProfile': isSoma}, cxIds)
 
         # Configure number of compartments to update
         numCxGroups = int(math.ceil((maxCxId + 1) / 4))
@@ -428,10 +616,7 @@ class DnnMapper:
 
         # Configure compartments to start out in IDLE phase
         somaOp = 3 if sharedCfgs['enableSomaTrace'] else 0
-        for i in range(numCxGroups):
-            core.cxMetaState[i].configure(
-                phase0=2, phase1=2, phase2=2, phase3=2,
-                somaOp0=somaOp, somaOp1=somaOp, somaOp2=somaOp, somaOp3=somaOp)
+        DnnMapper._configureIdlePhase(core, numCxGroups, somaOp)
 
         # Configure dendritic accumulators
         core.dendriteAccumCfg.delayBits = connectionCfgs['numDelayBits']
@@ -629,33 +814,151 @@ class DnnMapper:
         if "outputAxons" in kwargs and kwargs["outputAxons"] is True:
             self._printOutputAxons(core)
 
-    def map(self, layer):
+    def mapToImage(self, partition):
+        """Create the register image of a partition.
+
+        The image contains the synapse, synFmt and compartment registers,
+        which only depend on the partition itself. Input and output axons are
+        not included because they depend on the cores that partitions get
+        allocated to.
+
+        :param Partition partition: Layer partition.
+
+        :return: Register image of the core of ``partition``.
+        :rtype: RegisterImage
+        """
+
+        layer = partition.layer
+        image = RegisterImage()
+
+        if layer.numInputAxons > 0 and len(partition.synapseGroups) > 0:
+            image.synPtrs = self._configureSynapses(partition, image.core)
+
+        isSomaTraceEnabled = self._isSomaTraceEnabled
+        self._isSomaTraceEnabled = False
+        if 'Complex' in layer.type:
+            self._mapComplexCompartments(partition, image.core)
+        else:
+            self._mapCompartments(partition, image.core)
+        image.isSomaTraceEnabled = self._isSomaTraceEnabled
+        self._isSomaTraceEnabled |= isSomaTraceEnabled
+
+        return image
+
+    def map(self, layer, images=None):
         """Map a partitioned layer to the NxCore interface.
 
         :param Layer layer: Mappable layer object that describes how the DNN is
             partitioned across neuro cores.
+        :param list[RegisterImage] | None images: Register images of the
+            partitions of ``layer``, see ``mapToImage``. If provided, the
+            synapses and compartments are configured from the images.
         """
 
         # Map partition to core.
-        for partition in layer.partitions:
+        for i, partition in enumerate(layer.partitions):
             # Allocate a new core for partition
             core = self._board.allocateCores(1, partition.numSyn)[0]
 
+            image = None if images is None else images[i]
+            if image is not None:
+                image.apply(core)
+                self._isSomaTraceEnabled |= image.isSomaTraceEnabled
+
             # Skip synapses / input axons for input layers.
             if layer.numInputAxons > 0:
                 # Skip synapses / input axons for complex input partitions
                 if len(partition.synapseGroups) > 0:
-                    self._mapSynapses(partition, core)
+                    if image is None:
+                        self._mapSynapses(partition, core)
+                    else:
+                        self._setSynGrpMap(partition, image.synPtrs)
                     self._mapInputAxons(partition, core)
             # Skip output axons for output layer.
             if layer.numOutputAxons > 0:
                 self._mapOutputAxons(partition, core)
-            if 'Complex' in layer.type:
-                self._mapComplexCompartments(partition, core)
-            else:
-                self._mapCompartments(partition, core)
+            if image is None:
+                if 'Complex' in layer.type:
+                    self._mapComplexCompartments(partition, core)
+                else:
+                    self._mapCompartments(partition, core)
 
             partition.chipId = core.parent.id
             partition.coreId = core.id
 
         layer.setMapped()
+
+    def mapLayers(self, layers, numWorkers=None):
+        """Map a sequence of partitioned layers to the NxCore interface.
+
+        With more than one worker, the register images of the partitions are
+        created in worker processes, while the main process allocates cores,
+        applies the images and configures the axons. Images are applied in
+        the order of ``layers`` and their partitions, so the result is the
+        same as when calling ``map`` on each layer.
+
+        :param list[Layer] layers: Mappable layers, from output to input
+            layer.
+        :param int numWorkers: Number of worker processes. Default: 1
+            (serial). If 0, use one worker per CPU core.
+        """
+
+        if numWorkers is None:
+            numWorkers = 1
+        if numWorkers == 0:
+            numWorkers = os.cpu_count()
+        assert numWorkers > 0
+
+        if numWorkers == 1:
+            for layer in layers:
+                self.map(layer)
+            return
+
+        # Split partitions into chunks of similar size, so that large layers
+        # are spread across workers as well.
+        numPartitions = sum(len(layer.partitions) for layer in layers)
+        chunkSize = max(1, int(math.ceil(numPartitions / (4 * numWorkers))))
+        tasks = [(i, j, j + chunkSize) for i, layer in enumerate(layers)
+                 for j in range(0, len(layer.partitions), chunkSize)]
+
+        # The workers are forked from the current process, so they inherit
+        # the layers without pickling them.
+        context = multiprocessing.get_context('fork')
+        with context.Pool(numWorkers, _initMapperWorker, (layers,)) as pool:
+            results = pool.imap(_mapToImagesInWorker, tasks)
+            for layer in layers:
+                images = []
+                while len(images) < len(layer.partitions):
+                    images += next(results)
+                self.map(layer, images)
+
+
+# State of the worker processes that create register images. Set once when
+# the worker is forked.
+_workerState = {}
+
+
+def _initMapperWorker(layers):
+    """Initialize a worker process of ``DnnMapper.mapLayers``.
+
+    :param list[Layer] layers: Mappable layers.
+    """
+
+    _workerState['layers'] = layers
+
+
+def _mapToImagesInWorker(task):
+    """Create the register images of a chunk of partitions.
+
+    :param tuple[int, int, int] task: Index of the layer, and start and stop
+        index of the partitions.
+
+    :return: Register images of the partitions.
+    :rtype: list[RegisterImage]
+    """
+
+    layerId, start, stop = task
+    layer = _workerState['layers'][layerId]
+    mapper = DnnMapper(None)
+    return [mapper.mapToImage(partition)
+            for partition in layer.partitions[start:stop]]
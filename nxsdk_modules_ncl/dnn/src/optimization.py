@@ -14,20 +14,23 @@
 
 """Functionality to find the optimal partitioning of a DNN layer."""
 
+import multiprocessing
 import os
 import time
-from collections import namedtuple, OrderedDict
+from collections import namedtuple, OrderedDict, deque
 from typing import TYPE_CHECKING
 
 import numpy as np
 
 from nxsdk_modules_ncl.dnn.src.data_structures import Layer
+from nxsdk_modules_ncl.dnn.src.partition_cache import getCacheKey
 from nxsdk_modules_ncl.dnn.src.utils import getCoreOccupancy, \
     getCoreIdMapFromCoreShape, getS
 
 if TYPE_CHECKING:
     import logging
     from nxsdk_modules_ncl.dnn.src.dnn_layers import NxLayer
+    from nxsdk_modules_ncl.dnn.src.partition_cache import PartitionCache
 
 CostTerms = namedtuple('CostTerms', ['coreCost', 'inputAxonCost',
                                      'outputAxonCost', 'synCost',
@@ -43,7 +46,7 @@ class ExclusionCriteria:
                  'maxNumCoresPerChip', 'numDestinationGroups',
                  'coreSizeInterleaved', 'numSynFmts', 'synMemPerAxon',
                  'numSynMemWords', 'numInputAxons', 'numOutputAxons',
-                 '_counterAttr']
+                 'costBound', '_counterAttr']
 
     def __init__(self):
 
@@ -64,6 +67,9 @@ class ExclusionCriteria:
         self.numSynMemWords = 0
         self.numInputAxons = 0
         self.numOutputAxons = 0
+        # Candidates skipped because their cost could not beat the best ones
+        # found so far.
+        self.costBound = 0
 
         self._counterAttr = [a for a in self.__slots__
                              if 'maxNum' not in a and '_' not in a]
@@ -77,6 +83,18 @@ class ExclusionCriteria:
 
         return [getattr(self, attr) for attr in self._counterAttr]
 
+    def increment(self, counts):
+        """Add hit counts to the counters of the exclusion criteria.
+
+        Used to merge the hit counts collected in worker processes.
+
+        :param list[int] | np.ndarray counts: Hit counts, in the same order as
+            returned by ``toList``.
+        """
+
+        for attr, count in zip(self._counterAttr, counts):
+            setattr(self, attr, getattr(self, attr) + int(count))
+
     def asdict(self):
         """Transform class attributes into dictionary.
 
@@ -109,16 +127,41 @@ class PartitionOptimizer:
     :param bool storeAllCandidates: Whether to keep all partition candidates in
         memory. This flag needs to be set to ``True`` if user wants to call the
         ``saveCanddiateCosts`` method.
+    :param int numWorkers: Number of worker processes used to compile
+        partition candidates in parallel. Default: 1 (serial). If 0, use one
+        worker per CPU core. The selected partitions are identical to the
+        serial case.
+    :param bool pruneCandidates: If ``True`` (default), skip candidates whose
+        lower cost bound exceeds the cost of the best candidates found so far.
+        Does not change the selected partitions. Disabled if
+        ``storeAllCandidates`` is set.
+    :param PartitionCache | None cache: If provided, reuse the partitions of
+        layers that have been partitioned before with the same configuration,
+        weights and post-layer partitions. Not used if ``storeAllCandidates``
+        is set.
     """
 
     def __init__(self, numCandidatesToCompute, logger, logdir=None,
-                 storeAllCandidates=None):
+                 storeAllCandidates=None, numWorkers=None,
+                 pruneCandidates=None, cache=None):
+
+        if numWorkers is None:
+            numWorkers = 1
+        if numWorkers == 0:
+            numWorkers = os.cpu_count()
+        assert numWorkers > 0
+        if pruneCandidates is None:
+            pruneCandidates = True
 
         self.numCandidatesToCompute = numCandidatesToCompute
+        self.numWorkers = numWorkers
+        self.pruneCandidates = pruneCandidates and not storeAllCandidates
         self.logger = logger
         self._optimalPartitions = None
         self._allCandidates = []
         self._storeAllCandidates = storeAllCandidates
+        self.cache = None if storeAllCandidates else cache
+        self._cacheKey = None
 
         if logdir is None:
             logdir = os.path.join(os.path.expanduser('~'),
@@ -237,6 +280,30 @@ class PartitionOptimizer:
 
         self._optimalPartitions = [getDummyLayer(modelOutputShape[:-1])]
 
+    def _loadFromCache(self, layer):
+        """Try loading the optimal partitions of a layer from the cache.
+
+        The cache key of the layer depends on the input axon layout of the
+        post-layer partitions, so a layer is loaded even if a post-layer has
+        been partitioned anew, as long as the result is laid out the same way.
+
+        :param NxLayer | KerasLayer layer: The layer to partition.
+        :return: ``True`` if the partitions of the layer were loaded.
+        :rtype: bool
+        """
+
+        self._cacheKey = getCacheKey(
+            layer, self._optimalPartitions,
+            {'numCandidatesToCompute': self.numCandidatesToCompute})
+
+        candidates = self.cache.load(self._cacheKey, layer,
+                                     list(self._optimalPartitions))
+        if candidates is None:
+            return False
+
+        self._optimalPartitions = candidates
+        return True
+
     def run(self, layer):
         """Partition layer.
 
@@ -253,26 +320,41 @@ class PartitionOptimizer:
         assert self._optimalPartitions is not None, \
             "Need to call PartitionOptimizer.initialize() before running."
 
+        if self.cache is not None:
+            postLayerPartitions = list(self._optimalPartitions)
+            if self._loadFromCache(layer):
+                return
+
         # Propose a set of possible partitions for this layer, purely based on
         # its shape, not taking into account the post-layer partition.
         candidateDict = layer.getPartitionCandidates()
 
         # For each of the selected partition candidates of the post-layer,
-        # choose again as many for the current layer.
+        # choose again as many for the current layer. The costs of the
+        # candidates are collected along the way to prune the search.
         candidates = []
-        for postLayerPartition in self._optimalPartitions:
-            # Todo: The iterations in this loop are independent - parallelize!
-            candidates += self.selectCandidates(candidateDict, layer,
-                                                postLayerPartition)
-
-        # Update the set of optimal partition candidates.
-        costs = [computeTotalCost(partitionCandidate)
-                 for partitionCandidate in candidates]
-        candidates = np.array(candidates)[np.argsort(costs)]
+        costs = []
+        if self._useWorkers(layer):
+            with self._createWorkerPool(layer) as pool:
+                for postLayerPartition in self._optimalPartitions:
+                    candidates += self.selectCandidates(
+                        candidateDict, layer, postLayerPartition, pool, costs)
+        else:
+            for postLayerPartition in self._optimalPartitions:
+                candidates += self.selectCandidates(
+                    candidateDict, layer, postLayerPartition, costs=costs)
+
+        # Update the set of optimal partition candidates. Use a stable sort so
+        # that pruning candidates does not change the order of equal costs.
+        candidates = np.array(candidates)[np.argsort(costs, kind='stable')]
         if self._storeAllCandidates:
             self._allCandidates = candidates
         self._optimalPartitions = candidates[:self.numCandidatesToCompute]
 
+        if self.cache is not None:
+            self.cache.store(self._cacheKey, list(self._optimalPartitions),
+                             postLayerPartitions)
+
         # kernelIdMap of this layer is not needed anymore (can be many GB).
         layer.deleteKernelIdMap()
 
@@ -285,43 +367,160 @@ class PartitionOptimizer:
             for layer in self.getLayers(candidate):
                 layer.clearTemp()
 
-    def selectCandidates(self, candidateDict, layer, postLayerPartition):
+    def _useWorkers(self, layer):
+        """Whether to compile the partition candidates of a layer in parallel.
+
+        In soft-reset mode, the compiler assigns ids to dummy compartments in
+        the order in which candidates are compiled. These ids would differ
+        between worker processes, so we fall back to the serial path.
+
+        :param NxLayer | KerasLayer layer: The layer to partition.
+        :return: ``True`` if worker processes should be used.
+        :rtype: bool
+        """
+
+        if self.numWorkers == 1:
+            return False
+        if getattr(layer, 'resetMode', 'hard') == 'soft':
+            self.logger.debug("Partitioning %s serially (soft-reset mode).",
+                              layer.name)
+            return False
+        return True
+
+    def _createWorkerPool(self, layer):
+        """Create a pool of worker processes to compile partition candidates.
+
+        The workers are forked from the current process, so they inherit the
+        layer and the post-layer partitions without pickling them. Costly
+        state that is shared by all candidates is computed before forking.
+
+        :param NxLayer | KerasLayer layer: The layer to partition.
+        :return: Process pool.
+        :rtype: multiprocessing.pool.Pool
+        """
+
+        # TensorFlow is not fork-safe, so fetch the weights in this process.
+        weights = layer.get_weights()
+        # Convolution-like layers share one kernelIdMap across candidates.
+        # Compute it once here rather than in every worker.
+        if not getattr(layer, 'lazyKernelIdMap', False):
+            getattr(layer, 'kernelIdMap', None)
+
+        context = multiprocessing.get_context('fork')
+        return context.Pool(self.numWorkers, _initPartitionWorker,
+                            (layer, list(self._optimalPartitions),
+                             self.logdir, weights))
+
+    def _tryCreatePartitionsAsync(self, pool, configs, layer,
+                                  postLayerPartition):
+        """Compile partition candidates in worker processes.
+
+        Keeps up to ``numWorkers`` candidates in flight and yields the results
+        in the same order as the serial search, so that the consumer can stop
+        early without changing the outcome. Results of candidates that are
+        still in flight when the consumer stops are discarded.
+
+        :param multiprocessing.pool.Pool pool: Pool of worker processes.
+        :param list configs: List of (numCoresPerAxis, coreShape) tuples.
+        :param NxLayer | KerasLayer layer: The layer to partition.
+        :param Layer postLayerPartition: The next higher layer, which has been
+            partitioned already.
+
+        :return: Generator of valid partition candidates or ``None``.
+        """
+
+        postLayerId = [i for i, p in enumerate(self._optimalPartitions)
+                       if p is postLayerPartition][0]
+
+        pending = deque()
+        for numCoresPerAxis, coreShape in configs:
+            pending.append(pool.apply_async(
+                _tryCreatePartitionInWorker,
+                (postLayerId, numCoresPerAxis, coreShape)))
+            if len(pending) == self.numWorkers:
+                yield _collectPartitionCandidate(
+                    pending.popleft().get(), layer, postLayerPartition)
+
+        while len(pending):
+            yield _collectPartitionCandidate(
+                pending.popleft().get(), layer, postLayerPartition)
+
+    def selectCandidates(self, candidateDict, layer, postLayerPartition,
+                         pool=None, costs=None):
         """From a set of candidates, choose a subset of valid partitions.
 
+        Candidates are visited in order of increasing number of cores. If
+        ``costs`` is given and pruning is enabled, the search stops as soon as
+        the lower cost bound of the next candidate exceeds the cost of the
+        ``numCandidatesToCompute``-th best candidate found so far. Because the
+        bound grows with the number of cores, none of the remaining candidates
+        could be selected either.
+
         :param dict candidateDict: Set of possible partition candidates.
         :param NxLayer | KerasLayer layer: The layer to partition.
         :param Layaer postLayerPartition: The next higher layer, which has been
             partitioned already.
+        :param multiprocessing.pool.Pool | None pool: If provided, compile the
+            candidates in these worker processes.
+        :param list[float] | None costs: Total costs of the candidates found so
+            far for this layer. The costs of new candidates are appended.
 
         :return:
         :rtype: list[Layer]
         """
 
+        configs = [(numCoresPerAxis, coreShape)
+                   for numCores in sorted(candidateDict)
+                   for numCoresPerAxis, coreShape in candidateDict[numCores]]
+
+        if pool is None:
+            partitionCandidates = (
+                tryCreatePartition(numCoresPerAxis, coreShape,
+                                   postLayerPartition, layer, self.logdir)
+                for numCoresPerAxis, coreShape in configs)
+        else:
+            partitionCandidates = self._tryCreatePartitionsAsync(
+                pool, configs, layer, postLayerPartition)
+
+        # Virtual layers just pass the post-layer partition through, so their
+        # cost is not bounded by their number of cores.
+        doPrune = self.pruneCandidates and costs is not None and \
+            not getattr(layer, 'isVirtual', False)
+        postLayerCost = computeTotalCost(postLayerPartition)
+
         # Iterate through set of partition candidates for this layer,
         # and validate candidate based on the partition of the subsequent
         # layer.
         candidates = []
         numToFind = self.numCandidatesToCompute
         numFound = 0
-        for numCores in sorted(candidateDict):
-            for numCoresPerAxis, coreShape in candidateDict[numCores]:
-
-                partitionCandidate = tryCreatePartition(
-                    numCoresPerAxis, coreShape, postLayerPartition, layer,
-                    self.logdir)
-
-                if partitionCandidate is not None:
-                    candidates.append(partitionCandidate)
-
-                    numFound = len(candidates)
-                    if numFound == numToFind:
-                        print('\n')
-                        break
-
-            if numFound == numToFind:
-                break
-
-        if numFound == 0:
+        numPruned = 0
+        for i, (numCoresPerAxis, _) in enumerate(configs):
+
+            if doPrune and len(costs) >= numToFind:
+                maxCost = np.partition(costs, numToFind - 1)[numToFind - 1]
+                if getCostLowerBound(numCoresPerAxis,
+                                     postLayerCost) > maxCost:
+                    numPruned = len(configs) - i
+                    layer.exclusionCriteria.costBound += numPruned
+                    break
+
+            partitionCandidate = next(partitionCandidates)
+
+            if partitionCandidate is not None:
+                candidates.append(partitionCandidate)
+                if costs is not None:
+                    costs.append(computeTotalCost(partitionCandidate))
+
+                numFound = len(candidates)
+                if numFound == numToFind:
+                    print('\n')
+                    break
+
+        if numPruned:
+            self.logger.debug("Pruned %s partition candidate%s by cost.",
+                              numPruned, getS(numPruned))
+        elif numFound == 0:
             layer.exclusionCriteria.print()
             raise RuntimeError("No valid partition found.")
         if numFound < numToFind:
@@ -332,6 +531,103 @@ class PartitionOptimizer:
         return candidates
 
 
+# State of the worker processes that compile partition candidates. Set once
+# when the worker is forked.
+_workerState = {}
+
+
+def _initPartitionWorker(layer, postLayerPartitions, logdir, weights):
+    """Initialize a worker process of the ``PartitionOptimizer``.
+
+    :param NxLayer | KerasLayer layer: The layer to partition.
+    :param list[Layer] postLayerPartitions: Partition candidates of the next
+        higher layer.
+    :param str logdir: Where to save plots.
+    :param list[np.ndarray] weights: Weights of ``layer``.
+    """
+
+    # Serve the weights fetched by the parent process instead of calling into
+    # TensorFlow after the fork.
+    layer.get_weights = lambda: weights
+
+    _workerState['layer'] = layer
+    _workerState['postLayerPartitions'] = postLayerPartitions
+    _workerState['logdir'] = logdir
+
+
+def _tryCreatePartitionInWorker(postLayerId, numCoresPerAxis, coreShape):
+    """Try creating a partition of the layer in a worker process.
+
+    :param int postLayerId: Index of the post-layer partition.
+    :param np.ndarray numCoresPerAxis: Number of cores along each layer
+        dimension.
+    :param np.ndarray coreShape: The shape of the largest core.
+
+    :return: (partitionCandidate, counts) tuple, where ``counts`` holds the
+        increments of the exclusion criteria counters. If the layer is virtual,
+        ``partitionCandidate`` is the string 'postLayer'.
+    :rtype: tuple[Layer | str | None, np.ndarray]
+    """
+
+    layer = _workerState['layer']
+    postLayerPartition = _workerState['postLayerPartitions'][postLayerId]
+
+    counts = layer.exclusionCriteria.toList()
+
+    partitionCandidate = tryCreatePartition(
+        numCoresPerAxis, coreShape, postLayerPartition, layer,
+        _workerState['logdir'])
+
+    counts = np.subtract(layer.exclusionCriteria.toList(), counts)
+
+    # Virtual layers just pass the post-layer partition through.
+    if partitionCandidate is postLayerPartition:
+        return 'postLayer', counts
+
+    # Avoid sending the post-layer partition back to the main process.
+    if partitionCandidate is not None:
+        partitionCandidate.postLayer = None
+
+    return partitionCandidate, counts
+
+
+def _collectPartitionCandidate(result, layer, postLayerPartition):
+    """Merge the result of a worker process into the main process.
+
+    :param tuple result: Return value of ``_tryCreatePartitionInWorker``.
+    :param NxLayer | KerasLayer layer: The layer to partition.
+    :param Layer postLayerPartition: The next higher layer, which has been
+        partitioned already.
+
+    :return: Valid partition candidate.
+    :rtype: Layer | None
+    """
+
+    partitionCandidate, counts = result
+
+    layer.exclusionCriteria.increment(counts)
+
+    if isinstance(partitionCandidate, str):
+        return postLayerPartition
+
+    if partitionCandidate is None:
+        return
+
+    partitionCandidate.postLayer = postLayerPartition
+    partitionCandidate.compartmentKwargs = layer.compartmentKwargs
+    partitionCandidate.connectionKwargs = layer.connectionKwargs
+
+    # Input axon groups are identified by their hash, which the worker derived
+    # from its own address space. Renew the ids so that they stay unique
+    # within this process. The output axon groups refer to the input axon
+    # groups of the post-layer, whose ids were assigned before forking.
+    for partition in partitionCandidate.partitions:
+        for inputAxonGroup in partition.inputAxonGroups:
+            inputAxonGroup.renewId()
+
+    return partitionCandidate
+
+
 def getDummyLayer(shape):
     """Create a dummy layer, typically as postLayer of the output layer.
 
@@ -434,6 +730,22 @@ def getCostTerms(partitionedLayer):
                      postLayerCost)
 
 
+def getCostLowerBound(numCoresPerAxis, postLayerCost):
+    """Get a lower bound on the total cost of a partition candidate.
+
+    Computed without compiling the candidate. Each core contributes one unit
+    of core cost, and the axon and synapse costs are non-negative.
+
+    :param np.ndarray | list | tuple numCoresPerAxis: Number of cores along
+        each layer dimension.
+    :param float postLayerCost: Total cost of the post-layer partition.
+    :return: Lower bound on the total cost of the partition candidate.
+    :rtype: float
+    """
+
+    return np.prod(numCoresPerAxis) + postLayerCost
+
+
 def computeTotalCost(partitionedLayer, weights=None):
     """Get total cost of partitioned layer.
 
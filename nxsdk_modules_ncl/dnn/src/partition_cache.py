@@ -0,0 +1,330 @@
+#
+# Copyright © 2020 Intel Corporation.
+#
+# This software and the related documents are Intel copyrighted
+# materials, and your use of them is governed by the express
+# license under which they were provided to you (License). Unless
+# the License provides otherwise, you may not use, modify, copy,
+# publish, distribute, disclose or transmit  this software or the
+# related documents without Intel's prior written permission.
+#
+# This software and the related documents are provided as is, with
+# no express or implied warranties, other than those that are
+# expressly stated in the License.
+
+"""Persistent cache of partitioned and compiled DNN layers."""
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from nxsdk_modules_ncl.dnn.src.data_structures import Layer
+
+if TYPE_CHECKING:
+    import logging
+    from nxsdk_modules_ncl.dnn.src.dnn_layers import NxLayer
+
+# Increment when the partitioning algorithm or the ``Layer`` data structure
+# changes in a way that invalidates existing cache entries.
+CACHE_VERSION = 3
+
+
+def _getInputAxonLayout(postLayer):
+    """Describe the part of a post-layer partition that a layer depends on.
+
+    When partitioning a layer, the compiler reads the multiplicity map of the
+    post-layer, the input axon groups it connects to (via the source id map),
+    the chip counters of their partitions, and the number of cores and total
+    cost of the chain of post-layers. Input axon groups are described by their
+    position in the post-layer rather than by their id, which differs between
+    sessions.
+
+    :param Layer postLayer: Partition candidate of the post-layer.
+
+    :return: JSON-serializable description of the input axon layout.
+    :rtype: list
+    """
+
+    positions = {id(inputAxonGroup): (i, j)
+                 for i, partition in enumerate(postLayer.partitions)
+                 for j, inputAxonGroup in enumerate(partition.inputAxonGroups)}
+
+    srcIdMap = [[int(srcId), [[positions[id(inputAxonGroup)], int(relSrcId)]
+                              for inputAxonGroup, relSrcId in values]]
+                for srcId, values in sorted(postLayer.srcIdMap.items())]
+
+    partitions = [[partition.chipCounter, len(partition.inputAxonGroups)]
+                  for partition in postLayer.partitions]
+
+    numCores = 0
+    cost = 0
+    layer = postLayer
+    while layer.postLayer is not None:
+        numCores += layer.numCores
+        cost += layer.cost
+        layer = layer.postLayer
+
+    multiplicityMap = np.ascontiguousarray(postLayer.multiplicityMap)
+
+    return [str((multiplicityMap.dtype, multiplicityMap.shape)),
+            hashlib.sha256(multiplicityMap.tobytes()).hexdigest(), srcIdMap,
+            partitions, int(numCores), repr(float(cost))]
+
+
+def _getInputLayerContext(layer):
+    """Describe the pre-layer of a layer as far as the compiler reads it.
+
+    Convolution-like layers double their input channels if the pre-layer
+    emits signed spikes, and dense layers permute their weights if the
+    pre-layer is a ``Flatten`` layer.
+
+    :param NxLayer | KerasLayer layer: The layer to partition.
+
+    :return: Class name of the pre-layer and whether it emits signed spikes.
+    :rtype: list
+    """
+
+    if not len(layer._inbound_nodes[:1]):
+        return [None, False]
+
+    prevLayer = layer._inbound_nodes[0].inbound_layers
+    # prevLayer may be wrapped in a list of length 1:
+    if isinstance(prevLayer, (list, tuple)):
+        prevLayer = prevLayer[0]
+
+    return [prevLayer.__class__.__name__,
+            bool(getattr(prevLayer, 'signed', False))]
+
+
+def getCacheKey(layer, postLayerPartitions, options):
+    """Compute the cache key of a layer partition.
+
+    The key identifies everything that the partitioning of a layer depends on:
+    The layer type and configuration, its weights, input and output shapes,
+    the type of its pre-layer and whether that emits signed spikes, the input
+    axon layout of the post-layer partitions, and the compiler options. The layer name is not part of the key, so that a layer can be
+    reused in a model where it has a different name.
+
+    :param NxLayer | KerasLayer layer: The layer to partition.
+    :param list[Layer] postLayerPartitions: Partition candidates of the
+        post-layer.
+    :param dict options: Compiler options that affect the partitioning.
+
+    :return: Hexadecimal cache key.
+    :rtype: str
+    """
+
+    config = dict(layer.get_config())
+    config.pop('name', None)
+
+    # Limits of the hardware resources, without the hit counters.
+    limits = {attr: getattr(layer.exclusionCriteria, attr)
+              for attr in layer.exclusionCriteria.__slots__
+              if 'maxNum' in attr}
+
+    postLayerLayouts = [_getInputAxonLayout(postLayer)
+                        for postLayer in postLayerPartitions]
+
+    h = hashlib.sha256()
+    h.update(json.dumps([CACHE_VERSION, layer.__class__.__name__, config,
+                         str(layer.input_shape), str(layer.output_shape),
+                         _getInputLayerContext(layer), limits, options,
+                         postLayerLayouts],
+                        sort_keys=True, default=str).encode())
+    for weights in layer.get_weights():
+        weights = np.ascontiguousarray(weights)
+        h.update(str((weights.dtype, weights.shape)).encode())
+        h.update(weights.tobytes())
+
+    return h.hexdigest()
+
+
+def _getInputAxonGroupPositions(layer, isRecurrent):
+    """Map the ids of the input axon groups of a layer to their positions.
+
+    :param Layer layer: Partitioned layer.
+    :param bool isRecurrent: Whether the input axon groups belong to the layer
+        itself, rather than to its post-layer.
+
+    :return: Dictionary mapping from input axon group id to a tuple
+        ``(isRecurrent, partitionIdx, inputAxonGroupIdx)``.
+    :rtype: dict[int, tuple[bool, int, int]]
+    """
+
+    return {inputAxonGroup.id: (isRecurrent, i, j)
+            for i, partition in enumerate(layer.partitions)
+            for j, inputAxonGroup in enumerate(partition.inputAxonGroups)}
+
+
+class PartitionCache:
+    """Content-addressed cache of partitioned and compiled layers.
+
+    Each entry holds the set of optimal partition candidates that the
+    ``PartitionOptimizer`` found for one layer. Entries are stored as pickle
+    files in ``path``. If the total size of the cache exceeds ``maxSize``,
+    the least recently used entries are removed.
+
+    :param str path: Cache directory.
+    :param int maxSize: Maximum size of the cache in bytes. Default: 10 GB.
+    :param logging.Logger | None logger: Logging object.
+    """
+
+    def __init__(self, path, maxSize=None, logger=None):
+
+        if maxSize is None:
+            maxSize = 10 * 2 ** 30
+        assert maxSize > 0
+
+        self.path = path
+        self.maxSize = maxSize
+        self.logger = logger
+
+        self.numHits = 0
+        self.numMisses = 0
+
+        os.makedirs(self.path, exist_ok=True)
+
+    def _getFilepath(self, key):
+        return os.path.join(self.path, key + '.pickle')
+
+    def _log(self, msg, *args):
+        if self.logger is not None:
+            self.logger.info(msg, *args)
+
+    def load(self, key, layer, postLayerPartitions):
+        """Load the partition candidates of a layer from the cache.
+
+        :param str key: Cache key, see ``getCacheKey``.
+        :param NxLayer | KerasLayer layer: The layer to partition.
+        :param list[Layer] postLayerPartitions: Partition candidates of the
+            post-layer, as used when the entry was stored.
+
+        :return: Partition candidates of the layer, or ``None`` if the cache
+            has no entry for ``key``.
+        :rtype: list[Layer] | None
+        """
+
+        filepath = self._getFilepath(key)
+
+        try:
+            with open(filepath, 'rb') as f:
+                candidates = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            self.numMisses += 1
+            self._log("Partition cache miss for layer %s.", layer.name)
+            return
+
+        # Mark entry as recently used.
+        os.utime(filepath)
+
+        self.numHits += 1
+        self._log("Partition cache hit for layer %s.", layer.name)
+
+        # Virtual layers pass the post-layer partitions through; these are
+        # stored by index. All other candidates point to their post-layer by
+        # index.
+        for i, candidate in enumerate(candidates):
+            if isinstance(candidate, int):
+                candidates[i] = postLayerPartitions[candidate]
+                continue
+            candidate.id = layer.name
+            candidate.postLayer = postLayerPartitions[candidate.postLayer]
+            candidate.compartmentKwargs = layer.compartmentKwargs
+            candidate.connectionKwargs = layer.connectionKwargs
+
+            # Input axon groups are identified by their hash, which was
+            # derived in the session that stored the entry. Renew the ids so
+            # that they stay unique within this session, then point the output
+            # axon groups to the input axon groups they were stored with.
+            for partition in candidate.partitions:
+                for inputAxonGroup in partition.inputAxonGroups:
+                    inputAxonGroup.renewId()
+            for partition in candidate.partitions:
+                for outputAxonGroup in partition.outputAxonGroups:
+                    isRecurrent, partitionIdx, groupIdx = \
+                        outputAxonGroup.inAxGrpId
+                    target = candidate if isRecurrent else candidate.postLayer
+                    outputAxonGroup.inAxGrpId = target.partitions[
+                        partitionIdx].inputAxonGroups[groupIdx].id
+
+        return candidates
+
+    def store(self, key, candidates, postLayerPartitions):
+        """Store the partition candidates of a layer in the cache.
+
+        :param str key: Cache key, see ``getCacheKey``.
+        :param list[Layer] candidates: Partition candidates of the layer.
+        :param list[Layer] postLayerPartitions: Partition candidates of the
+            post-layer.
+        """
+
+        postLayerIds = {id(p): i for i, p in enumerate(postLayerPartitions)}
+
+        # Temporarily overwrite pointers to post-layers to avoid storing them
+        # again, and the ids of the input axon groups that output axon groups
+        # point to by their position.
+        entry = []
+        postLayers = []
+        inAxGrpIds = []
+        for candidate in candidates:
+            if id(candidate) in postLayerIds:
+                entry.append(postLayerIds[id(candidate)])
+                continue
+            assert isinstance(candidate, Layer)
+            positions = _getInputAxonGroupPositions(candidate.postLayer, False)
+            positions.update(_getInputAxonGroupPositions(candidate, True))
+            for partition in candidate.partitions:
+                for outputAxonGroup in partition.outputAxonGroups:
+                    inAxGrpIds.append(outputAxonGroup.inAxGrpId)
+                    outputAxonGroup.inAxGrpId = \
+                        positions[outputAxonGroup.inAxGrpId]
+            postLayers.append(candidate.postLayer)
+            candidate.postLayer = postLayerIds[id(candidate.postLayer)]
+            entry.append(candidate)
+
+        try:
+            # Write to temporary file first so that concurrent readers never
+            # see an incomplete entry.
+            fd, tmpPath = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(entry, f)
+            os.replace(tmpPath, self._getFilepath(key))
+        finally:
+            for candidate in entry:
+                if isinstance(candidate, Layer):
+                    candidate.postLayer = postLayers.pop(0)
+                    for partition in candidate.partitions:
+                        for outputAxonGroup in partition.outputAxonGroups:
+                            outputAxonGroup.inAxGrpId = inAxGrpIds.pop(0)
+
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until cache fits ``maxSize``."""
+
+        entries = []
+        for filename in os.listdir(self.path):
+            if os.path.splitext(filename)[1] != '.pickle':
+                continue
+            stat = os.stat(os.path.join(self.path, filename))
+            entries.append((stat.st_mtime, stat.st_size, filename))
+
+        size = sum(entry[1] for entry in entries)
+        for _, fileSize, filename in sorted(entries):
+            if size <= self.maxSize:
+                break
+            os.remove(os.path.join(self.path, filename))
+            size -= fileSize
+            self._log("Evicted %s from partition cache.", filename)
+
+    def clear(self):
+        """Remove all entries from the cache."""
+
+        for filename in os.listdir(self.path):
+            if os.path.splitext(filename)[1] in ['.pickle', '.tmp']:
+                os.remove(os.path.join(self.path, filename))
@@ -17,12 +17,13 @@ This module contains functions for encoding synapses in synEntries, and
 compressing the corresponding synFmts.
 """
 
+import heapq
 import math
 import numpy as np
 from scipy.sparse import lil_matrix
 
 from nxsdk_modules_ncl.dnn.src.data_structures import SynFmt, SynEntry, \
-    Compression
+    SynEntryArrays, Compression
 
 
 class SynapseEncoder:
@@ -31,13 +32,19 @@ class SynapseEncoder:
     :param int numWeightBits: Number of bit used for weights.
     :param int maxNumSynPerSynEntry: The maximum number of synapses per
         synEntry.
-    :param str compression: Compression mode of synapses.
+    :param str compression: Compression mode of synapses. One of 'sparse',
+        'runlength', 'dense1', 'dense2' or 'auto'. In 'auto' mode, the
+        encoder chooses the mode that uses the fewest synMem words, see
+        ``_getOptimalEncoding``.
     :param bool useSharedSign: How to deal with inhibitory and excitatory
         connections. If ``True``, negative and positive weights are separated
         and their sign is shared. Otherwise, the sign of each weight is stored.
     :param int | None numDelayBits: Number of bits used for delays.
     """
 
+    # Compression modes evaluated in 'auto' mode.
+    AUTO_MODES = ('sparse', 'runlength', 'dense1', 'dense2')
+
     def __init__(self, numWeightBits, maxNumSynPerSynEntry,
                  compression, useSharedSign, numDelayBits=None):
 
@@ -46,13 +53,96 @@ class SynapseEncoder:
         self.numDelayBits = numDelayBits
         self._maxNumSynPerSynEntry = maxNumSynPerSynEntry
         self._maxNumSkipBits = 5
+        # Properties of the synFmt of each synEntry, in the order of
+        # ``SynFmt.asArray``. Kept for all synEntries of the core.
         self._synFmts = []
-        self._synEntries = []
+        # Columns of the synEntries of the current synapse group.
+        self._prefixOffsets = []
+        self._synFmtIds = []
+        self._idxs = []
+        self._weights = []
+        self._kernelIds = []
+        self._delays = []
+        # Offsets of the synEntries of each neuron in current synapse group.
+        self._neuronPtrs = [0]
         self.compression = compression
         self.useSharedSign = useSharedSign
+        # State of the 'auto' compression mode: Number of synMem words that
+        # each of the compression modes in AUTO_MODES would have used for the
+        # neurons sampled so far.
+        self._maxNumAutoSamples = 16
+        self._numAutoSamples = 0
+        self._autoNumWords = np.zeros(len(self.AUTO_MODES))
+
+    def _addSynEntry(self, prefixOffset, idxs, weights, cIdxOffset, cIdxMult,
+                     numIdxBits, numSkipBits, compression, signMode,
+                     kernelIds, delays, softReset):
+        """Add a synEntry with its own synFmt to the current neuron."""
+
+        self._synFmtIds.append(len(self._synFmts))
+        self._synFmts.append((cIdxOffset, cIdxMult, numIdxBits, numSkipBits,
+                              self.numWeightBits, int(compression), signMode,
+                              0 if self.numDelayBits is None
+                              else self.numDelayBits, int(softReset)))
+        self._prefixOffsets.append(prefixOffset)
+        self._idxs.append(idxs)
+        self._weights.append(weights)
+        self._kernelIds.append(kernelIds)
+        self._delays.append(delays)
+
+    def endNeuron(self):
+        """Assign the synEntries encoded since the last call to a new neuron.
+
+        Needs to be called after encoding the synapses of each source neuron
+        in a ``SynapseGroup``, even if the neuron has no synapses.
+        """
+
+        self._neuronPtrs.append(len(self._prefixOffsets))
+
+    def popSynapseGroup(self):
+        """Return and remove the synEntries of the current ``SynapseGroup``.
+
+        The ``synFmtIds`` of the returned container index the synFmts of all
+        synEntries encoded by this instance (see ``getSynFmtArray``). Its
+        ``synFmts`` attribute is assigned by ``remapSynEntries`` after the
+        synFmts have been compressed.
+
+        :return: SynEntries of all neurons passed to ``endNeuron`` since the
+            last call.
+        :rtype: SynEntryArrays
+        """
+
+        numSynEntries = self._neuronPtrs[-1]
+        idxs = self._idxs[:numSynEntries]
+        numSyn = [len(i) for i in idxs]
+
+        def concatenate(arrays, optional=False):
+            arrays = arrays[:numSynEntries]
+            if optional and all(a is None for a in arrays):
+                return
+            # Fill missing optional arrays with zeros.
+            arrays = [np.zeros(n, int) if a is None else a
+                      for a, n in zip(arrays, numSyn)]
+            return np.concatenate(arrays) if len(arrays) else np.zeros(0, int)
+
+        synEntryArrays = SynEntryArrays(
+            np.array(self._neuronPtrs, int), np.cumsum([0] + numSyn),
+            np.array(self._prefixOffsets[:numSynEntries], int),
+            np.array(self._synFmtIds[:numSynEntries], int), None,
+            concatenate(self._idxs), concatenate(self._weights),
+            concatenate(self._kernelIds, True),
+            concatenate(self._delays, True))
+
+        # Synapses encoded after the last call to endNeuron are kept.
+        for column in [self._prefixOffsets, self._synFmtIds, self._idxs,
+                       self._weights, self._kernelIds, self._delays]:
+            del column[:numSynEntries]
+        self._neuronPtrs = [0]
+
+        return synEntryArrays
 
     def popSynEntries(self):
-        """Return and remove ``SynEntry`` list for current ``SynapseGroup``.
+        """Return and remove ``SynEntry`` list for current neuron.
 
         :return: synEntries.
         :rtype: list[SynEntry]
@@ -65,31 +155,58 @@ class SynapseEncoder:
         return synEntries
 
     def getSynEntries(self):
-        """Get list of ``SynEntry`` objects for current ``SynapseGroup``.
+        """Get list of ``SynEntry`` objects for current neuron.
+
+        The synEntries of the current neuron are those that have been encoded
+        since the last call to ``endNeuron``.
 
         :return: synEntries.
         :rtype: list[SynEntry]
         """
 
-        return self._synEntries
+        synFmts = self.getSynFmts()
+
+        start = self._neuronPtrs[-1]
+
+        return [SynEntry(prefixOffset, idxs, weights, synFmts[synFmtId],
+                         kernelIds, delays)
+                for prefixOffset, synFmtId, idxs, weights, kernelIds, delays
+                in zip(self._prefixOffsets[start:], self._synFmtIds[start:],
+                       self._idxs[start:], self._weights[start:],
+                       self._kernelIds[start:], self._delays[start:])]
 
     def getSynFmts(self):
-        """Get list of ``SynFmt`` objects for current ``SynapseGroup``.
+        """Get list of ``SynFmt`` objects for all synEntries.
 
         :return: synFmts.
         :rtype: list[SynFmt]
         """
 
-        return self._synFmts
+        return [SynFmt(i, *row[:5], compression=Compression(row[5]),
+                       signMode=row[6], numDlyBits=row[7],
+                       softReset=bool(row[8]))
+                for i, row in enumerate(self._synFmts)]
+
+    def getSynFmtArray(self):
+        """Get the properties of the synFmts of all synEntries.
+
+        :return: Array of shape (numSynEntries, 9), where each row has the
+            same layout as ``SynFmt.asArray``.
+        :rtype: np.ndarray
+        """
+
+        return np.array(self._synFmts, int).reshape((-1, 9))
 
     def resetSynEntries(self):
-        """Reset synEntries.
+        """Discard synEntries of current neuron.
 
-        Needed when ``SynapseEncoder`` iterates over ``SynapseGroup`` objects
-        of current partition.
+        The synFmts of the discarded synEntries are kept.
         """
 
-        self._synEntries = []
+        start = self._neuronPtrs[-1]
+        for column in [self._prefixOffsets, self._synFmtIds, self._idxs,
+                       self._weights, self._kernelIds, self._delays]:
+            del column[start:]
 
     @staticmethod
     def _getNumIdxBits(val):
@@ -160,14 +277,9 @@ class SynapseEncoder:
             numIdxBits = self._getNumIdxBits(np.max(idx))
 
             # Generate synapses and synEntries
-            synFmt = SynFmt(len(self._synFmts), cIdxOffset, cIdxMult,
-                            numIdxBits, 0, self.numWeightBits,
-                            Compression.SPARSE, signMode, self.numDelayBits,
-                            softReset)
-            self._synFmts.append(synFmt)
-
-            synEntry = SynEntry(0, idx, wgts, synFmt, kIds, dlys)
-            self._synEntries.append(synEntry)
+            self._addSynEntry(0, idx, wgts, cIdxOffset, cIdxMult, numIdxBits,
+                              0, Compression.SPARSE, signMode, kIds, dlys,
+                              softReset)
 
     def _encodeSynRunLength(self, synIds, weights, cIdxOffset, cIdxMult,
                             signMode, kernelIds=None, delays=None,
@@ -223,15 +335,10 @@ class SynapseEncoder:
             numSkipBits = self._getNumSkipBits(np.max(skipIdx))
 
             # Generate synapses and synEntries
-            synFmt = SynFmt(len(self._synFmts), cIdxOffset, cIdxMult,
-                            numIdxBits, numSkipBits, self.numWeightBits,
-                            Compression.RUNLENGTH, signMode, self.numDelayBits,
-                            softReset)
-            self._synFmts.append(synFmt)
-
-            synEntry = SynEntry(prefixOffset, skipIdx, wgts, synFmt, kIds,
-                                dlys)
-            self._synEntries.append(synEntry)
+            self._addSynEntry(prefixOffset, skipIdx, wgts, cIdxOffset,
+                              cIdxMult, numIdxBits, numSkipBits,
+                              Compression.RUNLENGTH, signMode, kIds, dlys,
+                              softReset)
 
             cIdStart = cIdEnd
 
@@ -284,15 +391,10 @@ class SynapseEncoder:
             numIdxBits = self._getNumIdxBits(prefixOffset)
 
             # Generate synapses and synEntries
-            synFmt = SynFmt(len(self._synFmts), cIdxOffset, cIdxMult,
-                            numIdxBits, 0, self.numWeightBits,
-                            Compression.DENSE, signMode, self.numDelayBits,
-                            softReset)
-            self._synFmts.append(synFmt)
-
-            synEntry = SynEntry(prefixOffset, idx - prefixOffset, wgts, synFmt,
-                                kIds, dlys)
-            self._synEntries.append(synEntry)
+            self._addSynEntry(prefixOffset, idx - prefixOffset, wgts,
+                              cIdxOffset, cIdxMult, numIdxBits, 0,
+                              Compression.DENSE, signMode, kIds, dlys,
+                              softReset)
 
             cIdStart = cIdEnd
 
@@ -360,14 +462,9 @@ class SynapseEncoder:
             wgtsUnprocessed = wgtsUnprocessed[notMask]
 
             # Generate synapses and synEntries
-            synFmt = SynFmt(len(self._synFmts), cIdxOffset, cIdxMult,
-                            numIdxBits, 0, self.numWeightBits,
-                            Compression.DENSE, signMode, self.numDelayBits,
-                            softReset)
-            self._synFmts.append(synFmt)
-
-            synEntry = SynEntry(prefixOffset, idx, wgts, synFmt, kIds, dlys)
-            self._synEntries.append(synEntry)
+            self._addSynEntry(prefixOffset, idx, wgts, cIdxOffset, cIdxMult,
+                              numIdxBits, 0, Compression.DENSE, signMode, kIds,
+                              dlys, softReset)
 
     def encode(self, synIds, weights, cIdxOffset, cIdxMult, kernelIds=None,
                delays=None, softReset=False):
@@ -393,7 +490,8 @@ class SynapseEncoder:
         #     "cIdxMult must be within [0, 15]."
 
         assert isinstance(softReset, bool)
-        assert self.compression in {'sparse', 'runlength', 'dense1', 'dense2'}
+        assert self.compression in {'sparse', 'runlength', 'dense1', 'dense2',
+                                    'auto'}
         if self.compression == 'sparse':
             encodeFct = self._encodeSynSparse
         elif self.compression == 'runlength':
@@ -403,7 +501,7 @@ class SynapseEncoder:
         elif self.compression == 'dense2':
             encodeFct = self._encodeSynDense2
         else:
-            encodeFct = self._getOptimalEncoding()
+            encodeFct = self._getOptimalEncoding(synIds, weights)
 
         if self.useSharedSign:
             idxPos = weights >= 0
@@ -418,18 +516,160 @@ class SynapseEncoder:
             encodeFct(synIds, weights, cIdxOffset, cIdxMult, 1, kernelIds,
                       delays, softReset)
 
-    def _getOptimalEncoding(self):
+    def _getOptimalEncoding(self, synIds, weights):
         """Find optimal compression mode for encoding a given set of synapses.
 
-        Apply all four encoding functions (for pos/neg weights separately
-        if ``useSharedSign`` is ``True``). Repeat ``N`` times (by setting
-        self.compression = None again, but remembering the cost of each
-        encoding). Then pick the most efficient encoding and fix for the rest
-        of the partition.
+        Computes the number of synMem words that each compression mode would
+        use for the synapses of the current neuron (for pos/neg weights
+        separately if ``useSharedSign`` is ``True``), and accumulates them
+        over the first ``N`` neurons encoded by this instance. Returns the
+        encoding function of the mode with the fewest words so far. After
+        ``N`` neurons, the mode is fixed for the rest of the partition.
+
+        :param np.ndarray synIds: Synapse indices.
+        :param np.ndarray weights: Weight values.
+
+        :return: Encoding function.
+        :rtype: Callable
+        """
+
+        if self._numAutoSamples < self._maxNumAutoSamples:
+            if self.useSharedSign:
+                idxPos = weights >= 0
+                numBits = (self._getNumBitsPerMode(synIds[idxPos]) +
+                           self._getNumBitsPerMode(synIds[~idxPos]))
+            else:
+                numBits = self._getNumBitsPerMode(synIds)
+
+            self._autoNumWords += self._getNumSynMemWords(numBits)
+            self._numAutoSamples += 1
+
+        mode = self.AUTO_MODES[int(np.argmin(self._autoNumWords))]
+
+        return {'sparse': self._encodeSynSparse,
+                'runlength': self._encodeSynRunLength,
+                'dense1': self._encodeSynDense1,
+                'dense2': self._encodeSynDense2}[mode]
+
+    @staticmethod
+    def _getNumSynMemWords(numBits):
+        """Compute number of synMem words used by the synEntries of a neuron.
+
+        Uses the same rounding as ``SynapseGroup``.
+
+        :param np.ndarray numBits: Total number of synEntry bits.
+
+        :return: Number of synMem words.
+        :rtype: np.ndarray
+        """
+
+        remainder = np.mod(numBits, 64)
+        return np.ceil(numBits / 64) + np.logical_or(remainder == 0,
+                                                     remainder >= 59)
+
+    @staticmethod
+    def _getNumIdxBitsVectorized(vals):
+        """Vectorized version of ``_getNumIdxBits``.
+
+        Returns infinity for values that exceed the limit of 10 bits.
+
+        :param np.ndarray vals: Largest compartment index of each synEntry.
+
+        :return: Number of bits required by compartment indices.
+        :rtype: np.ndarray
+        """
+
+        numIdxBits = np.maximum(6, np.ceil(np.log2(vals + 1)))
+        return np.where(numIdxBits <= 10, numIdxBits, np.inf)
+
+    def _getEntryStarts(self, synIds, isGap):
+        """Get indices where ``_encodeSynRunLength`` and ``_encodeSynDense1``
+        start a new synEntry.
+
+        A synEntry ends at a gap in the synapse indices, or after
+        ``maxNumSynPerSynEntry`` synapses.
+
+        :param np.ndarray synIds: Synapse indices.
+        :param np.ndarray isGap: Boolean vector of length ``len(synIds) - 1``,
+            indicating a gap between consecutive synapses.
+
+        :return: Index of first synapse of each synEntry.
+        :rtype: np.ndarray
+        """
+
+        ids = np.arange(len(synIds))
+        segmentStarts = np.maximum.accumulate(
+            np.where(np.insert(isGap, 0, True), ids, 0))
+        return np.flatnonzero(
+            (ids - segmentStarts) % self._maxNumSynPerSynEntry == 0)
+
+    def _getNumBitsPerMode(self, synIds):
+        """Compute number of bits used by each compression mode.
+
+        Evaluates all modes in ``AUTO_MODES`` from the synapse indices alone,
+        without creating any synEntries. Invalid encodings (e.g. because an
+        index exceeds the number of index bits) are assigned infinite cost.
+
+        :param np.ndarray synIds: Synapse indices.
+
+        :return: Total number of synEntry bits for each mode in
+            ``AUTO_MODES``.
+        :rtype: np.ndarray
         """
 
-        # Todo: Implement.
-        return self._encodeSynSparse
+        numBits = np.zeros(len(self.AUTO_MODES))
+        numSyn = len(synIds)
+        if numSyn == 0:
+            return numBits
+
+        synIds = np.sort(synIds)
+        numSynBits = self.numWeightBits + (0 if self.numDelayBits is None
+                                           else self.numDelayBits)
+        numPrefixBits = 4 + 6  # synMemFmtId + numSyn
+        maxNumSyn = self._maxNumSynPerSynEntry
+        deltas = np.diff(synIds)
+
+        # SPARSE
+        starts = np.arange(0, numSyn, maxNumSyn)
+        numIdxBits = self._getNumIdxBitsVectorized(
+            np.maximum.reduceat(synIds, starts))
+        numSynPerEntry = np.diff(np.append(starts, numSyn))
+        numBits[0] = np.sum(numPrefixBits +
+                            numSynPerEntry * (numSynBits + numIdxBits))
+
+        # RUNLENGTH
+        starts = self._getEntryStarts(synIds,
+                                      deltas >= 2 ** self._maxNumSkipBits)
+        numIdxBits = self._getNumIdxBitsVectorized(synIds[starts])
+        skipIdxs = np.insert(deltas, 0, 0)
+        skipIdxs[starts] = 0
+        numSkipBits = np.maximum(2, np.ceil(np.log2(
+            np.maximum.reduceat(skipIdxs, starts) + 1)))
+        numSynPerEntry = np.diff(np.append(starts, numSyn))
+        numBits[1] = np.sum(numPrefixBits + numIdxBits +
+                            numSynPerEntry * (numSynBits + numSkipBits))
+
+        # DENSE without dummy synapses
+        starts = self._getEntryStarts(synIds, deltas > 1)
+        numIdxBits = self._getNumIdxBitsVectorized(synIds[starts])
+        numSynPerEntry = np.diff(np.append(starts, numSyn))
+        numBits[2] = np.sum(numPrefixBits + numIdxBits +
+                            numSynPerEntry * numSynBits)
+
+        # DENSE with dummy synapses. A synEntry starting at synapse i spans
+        # all synapses up to nextStarts[i].
+        nextStarts = np.searchsorted(synIds, synIds + maxNumSyn).tolist()
+        starts = [0]
+        while nextStarts[starts[-1]] < numSyn:
+            starts.append(nextStarts[starts[-1]])
+        starts = np.array(starts, int)
+        ends = np.append(starts[1:], numSyn)
+        numIdxBits = self._getNumIdxBitsVectorized(synIds[starts])
+        numSynPerEntry = synIds[ends - 1] - synIds[starts] + 1
+        numBits[3] = np.sum(numPrefixBits + numIdxBits +
+                            numSynPerEntry * numSynBits)
+
+        return numBits
 
 
 def reconstructKMapFromPartitions(partitions, shape):
@@ -485,7 +725,9 @@ def compressSynFmts(synFmts, maxNumSynFmt):
     Finds the unique set of synFmts and merges the remaining synFmts until the
     number of different synFmts is below ``maxNumSynFmts``.
 
-    :param list[SynFmt] synFmts: List of all synFmt objects.
+    :param list[SynFmt] | np.ndarray synFmts: List of all synFmt objects, or
+        array of their properties as returned by
+        ``SynapseEncoder.getSynFmtArray``.
     :param int maxNumSynFmt: Maximum number of synFmts supported by core.
     :returns: tuple(synFmts, synEntryToFmtMap)
         synFmts is a list of merged synFmt objects.
@@ -494,61 +736,23 @@ def compressSynFmts(synFmts, maxNumSynFmt):
     """
 
     # Extract synFmt properties into array for processing
-    synFmtProperties = np.stack([synFmt.asArray() for synFmt in synFmts])
+    if isinstance(synFmts, np.ndarray):
+        synFmtProperties = synFmts
+    else:
+        synFmtProperties = np.stack([synFmt.asArray() for synFmt in synFmts])
 
     # Extract unique synFmts properties and mapping from synEntries to synFmts
     synFmtProperties, synEntryToFmtMap = np.unique(synFmtProperties,
                                                    return_inverse=True, axis=0)
     numSynFmts = synFmtProperties.shape[0]
 
-    # Compute pairwise distances between rows of synFmtProperties
-    # (cIdx{Offset/Mult} and compression receive high weight because they are
-    # not allowed to differ). It's conceivable to merge different compressions
-    # but that requires re-encoding of synEntries.
-    distances = np.infty * np.ones((numSynFmts, numSynFmts))
-    for i in range(numSynFmts):
-        for j in range(i):
-            distances[i, j] = _computeDistance(synFmtProperties[i],
-                                               synFmtProperties[j])
-
     # Merge closest rows of synFmtProperties iteratively until number of
     # distinct synFmts is small enough.
-    while numSynFmts > maxNumSynFmt:
-
-        if np.all(np.isinf(distances)):
-            print(numSynFmts)
-            break
-
-        # Find index of shortest distance in distances.
-        idx = np.unravel_index([np.argmin(distances)], distances.shape)
-        idx0, idx1 = sorted([idx[0][0], idx[1][0]])
-
-        # Overwrite the first of the two closest rows with the merged row.
-        # The merged row has the same cIdx{Offset/Mult} and compression but
-        # uses their max of numIdxBits, numSkipBits and numWgtBits.
-        synFmtProperties[idx0, 2:5] = \
-            np.max(synFmtProperties[[idx0, idx1], 2:5], axis=0)
-
-        # Delete the second of the two closest rows in synFmtProperties and in
-        # distances.
-        synFmtProperties = np.delete(synFmtProperties, idx1, axis=0)
-        distances = np.delete(np.delete(distances, idx1, axis=0), idx1, axis=1)
-
-        # Recompute distances of all other rows to merged row.
-        for j in range(idx0):
-            distances[idx0, j] = _computeDistance(synFmtProperties[idx0],
-                                                  synFmtProperties[j])
-        for j in range(idx0 + 1, distances.shape[1]):
-            distances[j, idx0] = _computeDistance(synFmtProperties[j],
-                                                  synFmtProperties[idx0])
-
-        # Remap synEntryToFmtMap from redundant row to merged row.
-        synEntryToFmtMap[synEntryToFmtMap == idx1] = idx0
-
-        # Reduce all row indices above the redundant row by one.
-        synEntryToFmtMap[synEntryToFmtMap > idx1] -= 1
-
-        numSynFmts -= 1
+    if numSynFmts > maxNumSynFmt:
+        synFmtProperties, fmtMap = _mergeSynFmtProperties(synFmtProperties,
+                                                          maxNumSynFmt)
+        synEntryToFmtMap = fmtMap[synEntryToFmtMap]
+        numSynFmts = synFmtProperties.shape[0]
 
     synFmts = []
     for i in range(numSynFmts):
@@ -563,6 +767,94 @@ def compressSynFmts(synFmts, maxNumSynFmt):
     return synFmts, synEntryToFmtMap
 
 
+def _mergeSynFmtProperties(synFmtProperties, maxNumSynFmt):
+    """Merge closest rows of ``synFmtProperties`` agglomeratively.
+
+    Only synFmts with the same cIdx{Offset/Mult}, compression and signMode can
+    be merged (it's conceivable to merge different compressions but that
+    requires re-encoding of synEntries). The rows are therefore grouped into
+    buckets of mergeable synFmts, and the pairwise distances within each bucket
+    are kept in a priority queue. Entries that refer to a row which has been
+    merged since are invalidated lazily via a version counter per row.
+
+    The merged row replaces the row with the lower index and uses the max of
+    numIdxBits, numSkipBits and numWgtBits of both rows. Ties are broken in
+    favor of the pair with the lowest (higher index, lower index), so the merge
+    sequence is the same as when taking the argmin over the lower triangle of
+    the full distance matrix.
+
+    :param np.ndarray synFmtProperties: Unique synFmt properties, one row per
+        synFmt. Rows are modified in place.
+    :param int maxNumSynFmt: Maximum number of synFmts supported by core.
+    :returns: tuple(synFmtProperties, fmtMap)
+        synFmtProperties are the remaining rows after merging.
+        fmtMap maps each input row to its row in the merged synFmtProperties.
+    """
+
+    numSynFmts = synFmtProperties.shape[0]
+    parents = np.arange(numSynFmts)
+    versions = np.zeros(numSynFmts, int)
+    isAlive = np.ones(numSynFmts, bool)
+
+    _, bucketIds = np.unique(synFmtProperties[:, [0, 1, 5, 6]], axis=0,
+                             return_inverse=True)
+    bucketIds = np.ravel(bucketIds)
+    buckets = np.split(np.argsort(bucketIds, kind='stable'),
+                       np.cumsum(np.bincount(bucketIds))[:-1])
+
+    # Priority queue of (distance, higher row, lower row, version of higher
+    # row, version of lower row).
+    queue = []
+    for bucket in buckets:
+        lowIdxs, highIdxs = np.triu_indices(len(bucket), 1)
+        lowIdxs = bucket[lowIdxs]
+        highIdxs = bucket[highIdxs]
+        distances = _computeNumBitDistance(synFmtProperties[highIdxs, 2:5],
+                                           synFmtProperties[lowIdxs, 2:5])
+        zeros = [0] * len(distances)
+        queue.extend(zip(distances.tolist(), highIdxs.tolist(),
+                         lowIdxs.tolist(), zeros, zeros))
+    heapq.heapify(queue)
+
+    while numSynFmts > maxNumSynFmt:
+
+        if len(queue) == 0:
+            print(numSynFmts)
+            break
+
+        _, idx1, idx0, version1, version0 = heapq.heappop(queue)
+        if not (isAlive[idx0] and isAlive[idx1]) or \
+                versions[idx0] != version0 or versions[idx1] != version1:
+            continue
+
+        # Overwrite the lower of the two closest rows with the merged row.
+        synFmtProperties[idx0, 2:5] = \
+            np.max(synFmtProperties[[idx0, idx1], 2:5], axis=0)
+        isAlive[idx1] = False
+        parents[idx1] = idx0
+        versions[idx0] += 1
+        numSynFmts -= 1
+
+        # Recompute distances of all other rows in the bucket to merged row.
+        bucket = buckets[bucketIds[idx0]]
+        others = bucket[isAlive[bucket] & (bucket != idx0)]
+        distances = _computeNumBitDistance(synFmtProperties[others, 2:5],
+                                           synFmtProperties[idx0, 2:5])
+        for other, distance in zip(others.tolist(), distances.tolist()):
+            high, low = (other, idx0) if other > idx0 else (idx0, other)
+            heapq.heappush(queue, (distance, high, low, versions[high],
+                                   versions[low]))
+
+    # Rows are always merged into rows with a lower index, so resolving the
+    # parents in ascending order yields the surviving row of each input row.
+    for i in range(len(parents)):
+        parents[i] = parents[parents[i]]
+
+    fmtMap = (np.cumsum(isAlive) - 1)[parents]
+
+    return synFmtProperties[isAlive], fmtMap
+
+
 def _computeNumBitDistance(numBits1, numBits2):
     """Define pairwise distance metric between vectors of numBits.
 
@@ -571,34 +863,18 @@ def _computeNumBitDistance(numBits1, numBits2):
     merge two formats with numBits 6 and 7 the relative increase in bits is
     smaller than if we merge such with numBits 1 and 2.
 
-    :param np.ndarray numBits1: First vector of numBits.
-    :param np.ndarray numBits2: Second vector of numBits.
+    :param np.ndarray numBits1: First vector of numBits, or array with one
+        vector per row.
+    :param np.ndarray numBits2: Second vector of numBits, or array with one
+        vector per row.
     :return: Distance measure.
-    :rtype: float
+    :rtype: float | np.ndarray
     """
 
     numBitsDelta = numBits1 - numBits2
     numBitsSum = numBits1 + numBits2
-    return numBitsDelta.dot(numBitsDelta) / numBitsSum.dot(numBitsSum)
-
-
-def _computeDistance(a, b):
-    """Compute distance between two vectors of ``SynFmt`` properties.
-
-    Returns infinity if the two synFmts differ in offset, multiplier,
-    compression or signMode. Otherwise returns the distance of the numBit
-    properties.
-
-    :param np.ndarray a: First vector of synFmt propoerties.
-    :param np.ndarray b: Second vector of synFmt propoerties.
-    :return: Distance measure.
-    :rtype: float
-    """
-
-    if not np.array_equal(a[[0, 1, 5, 6]], b[[0, 1, 5, 6]]):
-        return np.infty
-    else:
-        return _computeNumBitDistance(a[[2, 3, 4]], b[[2, 3, 4]])
+    return np.sum(numBitsDelta * numBitsDelta, -1) / \
+        np.sum(numBitsSum * numBitsSum, -1)
 
 
 def remapSynEntries(synEntriesOfCore, synFmts, synEntryToFmtMap):
@@ -607,19 +883,25 @@ def remapSynEntries(synEntriesOfCore, synFmts, synEntryToFmtMap):
     Remaps the ``synFmtId`` pointers in each ``SynEntry`` to the merged set of
     synFmts according to synEntryToFmtMap.
 
-    :param list[list[list[synEntry]]] synEntriesOfCore: List of synEntires for
-        all synGroups per core, for all source nodes per synGroup and for all
-        synEntries per source node.
-    :param list[SynFmt] synFmts: List of all synFmts (before merging).
+    :param list[list[list[synEntry]] | SynEntryArrays] synEntriesOfCore: List
+        of synEntires for all synGroups per core, for all source nodes per
+        synGroup and for all synEntries per source node. The synEntries of a
+        synGroup may also be given as ``SynEntryArrays``, as returned by
+        ``SynapseEncoder.popSynapseGroup``.
+    :param list[SynFmt] synFmts: List of merged synFmts.
     :param np.ndarray synEntryToFmtMap: Mapping vector from global synEntry id
         to merged synFmtIds.
 
     :return: List of remapped synEntries.
-    :rtype: list[list[list[SynEntry]]]
+    :rtype: list[list[list[SynEntry]] | SynEntryArrays]
     """
 
     i = 0
     for synEntriesOfGroup in synEntriesOfCore:
+        if isinstance(synEntriesOfGroup, SynEntryArrays):
+            # The synFmtIds of the container are the global synEntry ids.
+            synEntriesOfGroup.remap(synFmts, synEntryToFmtMap)
+            continue
         for synEntriesOfNeuron in synEntriesOfGroup:
             for synEntry in synEntriesOfNeuron:
                 synEntry.synFmt = synFmts[synEntryToFmtMap[i]]
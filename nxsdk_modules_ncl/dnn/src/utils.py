@@ -269,8 +269,44 @@ def _getMultiplicityMapConvlike(coreIdMap, inputShape, kernelShape, strides,
     return multiplicityMap
 
 
+def _gatherReceptiveFields(inputIdMap, inIdsY, inIdsX, kernelShape,
+                           dilation, inputChannels):
+    """Gather the input neuron ids in the receptive field of output neurons.
+
+    :param np.ndarray inputIdMap: Ids of input neurons, padded with -1.
+    :param np.ndarray inIdsY: Row of the top left corner of each receptive
+        field.
+    :param np.ndarray inIdsX: Column of the top left corner of each receptive
+        field.
+    :param np.ndarray | tuple | list kernelShape: Shape of kernel (height,
+        width).
+    :param tuple dilation: Dilation rate.
+    :param int inputChannels: Number of input channels seen by the kernel.
+
+    :return: Input ids of shape (numReceptiveFields, kernelSize). The kernel
+        axis is flattened in Fortran order.
+    :rtype: np.ndarray
+    """
+
+    dy, dx = dilation
+
+    # Shape (numReceptiveFields, inputChannels, kernelWidth, kernelHeight), so
+    # that flattening the last three axes yields the kernel in Fortran order.
+    inIdsY = inIdsY[:, None, None, None] + \
+        dy * np.arange(kernelShape[0])[None, None, None, :]
+    inIdsX = inIdsX[:, None, None, None] + \
+        dx * np.arange(kernelShape[1])[None, None, :, None]
+    channelIds = np.arange(inputChannels)[None, :, None, None]
+
+    kernelSize = kernelShape[0] * kernelShape[1] * inputChannels
+
+    return inputIdMap[inIdsY, inIdsX, channelIds].reshape(len(inIdsY),
+                                                          kernelSize)
+
+
 def _genKernelIdMap(inputShape, outputShape, padding, strides, kernelShape,
-                    dilation, isDepthwise=False, zeroPadding=None):
+                    dilation, isDepthwise=False, zeroPadding=None,
+                    outputIds=None):
     """Generate a KernelIdMap of the layer.
 
     :param np.ndarray | tuple | list inputShape: Shape of layer input (not
@@ -288,6 +324,10 @@ def _genKernelIdMap(inputShape, outputShape, padding, strides, kernelShape,
         input feature map separately (e.g. pooling or depth-wise separable
         convolution).
     :param tuple zeroPadding: Zero padding values from previous padding layer.
+    :param np.ndarray | None outputIds: If provided, generate only the rows of
+        the kernelIdMap belonging to these output neurons (flat indices in
+        Fortran order). Row ``i`` of the returned matrix then corresponds to
+        output neuron ``outputIds[i]``.
 
     :return: kernelIdMap.
     :rtype: coo_matrix
@@ -303,7 +343,6 @@ def _genKernelIdMap(inputShape, outputShape, padding, strides, kernelShape,
     inputSize = np.prod(inputShape).item()
     outputSize = np.prod(outputShape).item()
     numStrides = np.prod(outputShape[:-1]).item()
-    outIds = np.arange(numStrides)
     inputIdMap = np.reshape(np.arange(inputSize), inputShape, 'F')
     if isDepthwise:
         inputChannels = 1
@@ -319,56 +358,66 @@ def _genKernelIdMap(inputShape, outputShape, padding, strides, kernelShape,
         inputIdMap = np.pad(inputIdMap, ((py0, py1), (px0, px1), (0, 0)),
                             'constant', constant_values=-1)
 
-    dy, dx = dilation
-
-    # Get indices of input neurons where conv kernel will be applied.
-    outIdsY, outIdsX, _ = np.unravel_index(outIds, outputShape, 'F')
-    inIdsY = outIdsY * strides[0]
-    inIdsX = outIdsX * strides[1]
-
     # Generate a flat dummy kernel. Need to offset by 1 because lil_matrix does
     # not store zeros.
     kernelSize = np.prod(kernelShape).item() * inputChannels
     kIds = np.arange(kernelSize) + 1
 
-    inputIds = []
-    kernelIds = []
-    outputIds = []
-    for outId, inIdY, inIdX in zip(outIds, inIdsY, inIdsX):
-        inIds = inputIdMap[slice(inIdY, inIdY + dy * kernelShape[0], dy),
-                           slice(inIdX, inIdX + dx * kernelShape[1], dx),
-                           slice(inputChannels)]
-        inIds = np.ravel(inIds, 'F')
+    if outputIds is not None:
+        # Generate the receptive field of each requested neuron separately,
+        # so that memory scales with the number of neurons requested.
+        outputIds = np.asarray(outputIds)
+        outIds = outputIds % numStrides
+        cIds = (outputIds // numStrides)[:, None]
+
+        outIdsY, outIdsX, _ = np.unravel_index(outIds, outputShape, 'F')
+        inputIds = _gatherReceptiveFields(
+            inputIdMap, outIdsY * strides[0], outIdsX * strides[1],
+            kernelShape, dilation, inputChannels)
+
+        data = kIds + cIds * kernelSize
+        rows = np.broadcast_to(np.arange(len(outputIds))[:, None],
+                               inputIds.shape)
+        cols = inputIds + cIds * inputShift
 
         # Remove zero-padding.
         if doPad:
-            paddingMask = inIds > -1
-            inIds = inIds[paddingMask]
-            _kIds = kIds[paddingMask]
-        else:
-            _kIds = kIds
-
-        inputIds.append(inIds)
-        kernelIds.append(_kIds)
-        outputIds.append([outId] * len(_kIds))
-
-    inputIds = np.concatenate(inputIds)
-    kernelIds = np.concatenate(kernelIds)
-    outputIds = np.concatenate(outputIds)
-
-    # Insert kernel into all channels of feature map.
-    data = []
-    rows = []
-    cols = []
-    for cId in range(outputShape[-1]):
-        # Increment kernel ids by the kernelSize for the next channel.
-        data.append(kernelIds + cId * kernelSize)
-        cols.append(inputIds + cId * inputShift)
-        rows.append(outputIds + cId * numStrides)
-
-    data = np.concatenate(data)
-    rows = np.concatenate(rows)
-    cols = np.concatenate(cols)
+            paddingMask = inputIds > -1
+            data = data[paddingMask]
+            rows = rows[paddingMask]
+            cols = cols[paddingMask]
+
+        return coo_matrix((np.ravel(data), (np.ravel(rows), np.ravel(cols))),
+                          (len(outputIds), inputSize), int)
+
+    # Get indices of input neurons where conv kernel will be applied.
+    outIds = np.arange(numStrides)
+    outIdsY, outIdsX, _ = np.unravel_index(outIds, outputShape, 'F')
+
+    # Gather the receptive field of all output positions at once.
+    inputIds = _gatherReceptiveFields(inputIdMap, outIdsY * strides[0],
+                                      outIdsX * strides[1], kernelShape,
+                                      dilation, inputChannels)
+    kernelIds = np.broadcast_to(kIds, inputIds.shape)
+    outputIds = np.broadcast_to(outIds[:, None], inputIds.shape)
+
+    # Remove zero-padding.
+    if doPad:
+        paddingMask = inputIds > -1
+        inputIds = inputIds[paddingMask]
+        kernelIds = kernelIds[paddingMask]
+        outputIds = outputIds[paddingMask]
+    else:
+        inputIds = inputIds.ravel()
+        kernelIds = kernelIds.ravel()
+        outputIds = outputIds.ravel()
+
+    # Insert kernel into all channels of feature map. Increment kernel ids by
+    # the kernelSize for the next channel.
+    cIds = np.arange(outputShape[-1])[:, None]
+    data = (kernelIds + cIds * kernelSize).ravel()
+    rows = (outputIds + cIds * numStrides).ravel()
+    cols = (inputIds + cIds * inputShift).ravel()
 
     return coo_matrix((data, (rows, cols)), (outputSize, inputSize), int)
 
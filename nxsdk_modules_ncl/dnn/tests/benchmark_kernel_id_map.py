@@ -0,0 +1,141 @@
+#
+# Copyright © 2020 Intel Corporation.
+#
+# This software and the related documents are Intel copyrighted
+# materials, and your use of them is governed by the express
+# license under which they were provided to you (License). Unless
+# the License provides otherwise, you may not use, modify, copy,
+# publish, distribute, disclose or transmit  this software or the
+# related documents without Intel's prior written permission.
+#
+# This software and the related documents are provided as is, with
+# no express or implied warranties, other than those that are
+# expressly stated in the License.
+
+"""Benchmark generation of the kernelIdMap.
+
+Compares the vectorized ``_genKernelIdMap`` against the previous
+implementation, which loops over output positions and channels. Both have to
+produce the same coo_matrix.
+
+Run with ``python -m nxsdk_modules_ncl.dnn.tests.benchmark_kernel_id_map``.
+"""
+
+import time
+
+import numpy as np
+from scipy.sparse import coo_matrix
+
+from nxsdk_modules_ncl.dnn.src.utils import _genKernelIdMap
+
+
+def _genKernelIdMapLoop(inputShape, outputShape, padding, strides,
+                        kernelShape, dilation, isDepthwise=False):
+    """Reference implementation of ``_genKernelIdMap`` using Python loops."""
+
+    inputSize = np.prod(inputShape).item()
+    outputSize = np.prod(outputShape).item()
+    numStrides = np.prod(outputShape[:-1]).item()
+    outIds = np.arange(numStrides)
+    inputIdMap = np.reshape(np.arange(inputSize), inputShape, 'F')
+    if isDepthwise:
+        inputChannels = 1
+        inputShift = inputShape[0] * inputShape[1]
+    else:
+        inputChannels = inputShape[-1]
+        inputShift = 0
+
+    doPad = np.any(padding)
+    if doPad:
+        py0, py1, px0, px1 = padding
+        inputIdMap = np.pad(inputIdMap, ((py0, py1), (px0, px1), (0, 0)),
+                            'constant', constant_values=-1)
+
+    dy, dx = dilation
+
+    outIdsY, outIdsX, _ = np.unravel_index(outIds, outputShape, 'F')
+    inIdsY = outIdsY * strides[0]
+    inIdsX = outIdsX * strides[1]
+
+    kernelSize = np.prod(kernelShape).item() * inputChannels
+    kIds = np.arange(kernelSize) + 1
+
+    inputIds = []
+    kernelIds = []
+    outputIds = []
+    for outId, inIdY, inIdX in zip(outIds, inIdsY, inIdsX):
+        inIds = inputIdMap[slice(inIdY, inIdY + dy * kernelShape[0], dy),
+                           slice(inIdX, inIdX + dx * kernelShape[1], dx),
+                           slice(inputChannels)]
+        inIds = np.ravel(inIds, 'F')
+
+        if doPad:
+            paddingMask = inIds > -1
+            inIds = inIds[paddingMask]
+            _kIds = kIds[paddingMask]
+        else:
+            _kIds = kIds
+
+        inputIds.append(inIds)
+        kernelIds.append(_kIds)
+        outputIds.append([outId] * len(_kIds))
+
+    inputIds = np.concatenate(inputIds)
+    kernelIds = np.concatenate(kernelIds)
+    outputIds = np.concatenate(outputIds)
+
+    data = []
+    rows = []
+    cols = []
+    for cId in range(outputShape[-1]):
+        data.append(kernelIds + cId * kernelSize)
+        cols.append(inputIds + cId * inputShift)
+        rows.append(outputIds + cId * numStrides)
+
+    data = np.concatenate(data)
+    rows = np.concatenate(rows)
+    cols = np.concatenate(cols)
+
+    return coo_matrix((data, (rows, cols)), (outputSize, inputSize), int)
+
+
+# (name, inputShape, outputShape, padding, strides, kernelShape, dilation,
+#  isDepthwise)
+CONFIGS = [
+    ('conv 3x3 same', (224, 224, 3), (224, 224, 16), (1, 1, 1, 1), (1, 1),
+     (3, 3), (1, 1), False),
+    ('conv 3x3 stride 2', (112, 112, 32), (55, 55, 32), (0, 0, 0, 0), (2, 2),
+     (3, 3), (1, 1), False),
+    ('conv 3x3 dilated', (56, 56, 32), (52, 52, 32), (0, 0, 0, 0), (1, 1),
+     (3, 3), (2, 2), False),
+    ('depthwise 3x3 same', (112, 112, 64), (112, 112, 64), (1, 1, 1, 1),
+     (1, 1), (3, 3), (1, 1), True),
+    ('avg pooling 2x2', (224, 224, 32), (112, 112, 32), (0, 0, 0, 0), (2, 2),
+     (2, 2), (1, 1), True),
+]
+
+
+def _timeit(func, *args):
+    t0 = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - t0
+
+
+def main():
+    print("{:<20}{:>12}{:>12}{:>12}{:>10}".format(
+        'layer', 'nnz', 'loop [s]', 'vector [s]', 'speedup'))
+    for name, *args in CONFIGS:
+        kMapRef, tRef = _timeit(_genKernelIdMapLoop, *args)
+        kMap, t = _timeit(_genKernelIdMap, *args)
+
+        assert kMap.shape == kMapRef.shape
+        assert np.array_equal(kMap.row, kMapRef.row)
+        assert np.array_equal(kMap.col, kMapRef.col)
+        assert np.array_equal(kMap.data, kMapRef.data)
+
+        print("{:<20}{:>12}{:>12.3f}{:>12.3f}{:>10.1f}".format(
+            name, kMap.nnz, tRef, t, tRef / t))
+
+
+if __name__ == '__main__':
+    main()
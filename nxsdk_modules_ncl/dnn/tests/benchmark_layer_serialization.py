@@ -0,0 +1,151 @@
+#
+# Copyright © 2020 Intel Corporation.
+#
+# This software and the related documents are Intel copyrighted
+# materials, and your use of them is governed by the express
+# license under which they were provided to you (License). Unless
+# the License provides otherwise, you may not use, modify, copy,
+# publish, distribute, disclose or transmit  this software or the
+# related documents without Intel's prior written permission.
+#
+# This software and the related documents are provided as is, with
+# no express or implied warranties, other than those that are
+# expressly stated in the License.
+
+"""Benchmark serialization of compiled layers.
+
+Compares the npz format written by ``serializeLayer``, which stores the
+synEntries of each synapse group as ``SynEntryArrays``, against the previous
+implementation, which pickles the layer with one ``SynEntry`` object per
+synEntry. Loading a pickle file builds the ``SynEntryArrays`` of each synapse
+group, which the mapper needs either way. Both have to restore the same
+synapses.
+
+Run with ``python -m nxsdk_modules_ncl.dnn.tests.benchmark_layer_serialization``.
+"""
+
+import os
+import pickle
+import tempfile
+import time
+
+import numpy as np
+
+from nxsdk_modules_ncl.dnn.src.data_structures import Layer, Partition, \
+    SynFmt, SynEntry, SynapseGroup, serializeLayer, deserializeLayer, \
+    LAYER_FILE_EXTENSION
+
+
+def _serializeLayerPickle(layer, path):
+    """Reference implementation of ``serializeLayer`` using pickle."""
+
+    postLayer = layer.postLayer
+    layer.postLayer = postLayer.id
+
+    with open(os.path.join(path, layer.id + '.pickle'), 'wb') as f:
+        pickle.dump(layer, f)
+
+    layer.postLayer = postLayer
+
+
+def _deserializeLayerPickle(path, filename):
+    """Reference implementation of ``deserializeLayer`` using pickle."""
+
+    with open(os.path.join(path, filename), 'rb') as f:
+        return pickle.load(f)
+
+
+def _genLayer(numPartitions, numNeurons, numSynEntriesPerNeuron,
+              numSynPerSynEntry, seed=0):
+    """Generate a compiled layer with ``numPartitions`` partitions, each
+    holding one synapse group of ``numNeurons`` neurons. The synapse groups
+    store lists of ``SynEntry`` objects, as created by the partitioner."""
+
+    rng = np.random.RandomState(seed)
+    postLayer = Layer('post', '', {}, {}, np.array([]), np.array([]))
+    layer = Layer('layer', 'NxConv2D', {}, {'weightExponent': 0},
+                  np.zeros(numPartitions, int), np.ones(numNeurons, int),
+                  postLayer)
+
+    for i in range(numPartitions):
+        partition = Partition(i, 0, numNeurons, layer)
+        synFmts = [SynFmt(j + 1, 0, 1, 6, 0, 8, 0, 1) for j in range(4)]
+        for synFmt in synFmts:
+            partition.addSynFmt(synFmt)
+        synEntries = [[SynEntry(int(rng.randint(1024)),
+                                rng.randint(0, 64, numSynPerSynEntry),
+                                rng.randint(-128, 128, numSynPerSynEntry),
+                                synFmts[rng.randint(len(synFmts))],
+                                rng.randint(0, 9, numSynPerSynEntry))
+                       for _ in range(numSynEntriesPerNeuron)]
+                      for _ in range(numNeurons)]
+        partition.addSynapseGroup(SynapseGroup(0, synEntries))
+        layer.addPartition(partition)
+
+    return layer
+
+
+def _getSynapses(layer):
+    """Get the synapses of all synapse groups of a layer."""
+
+    return [(synEntries.neuronPtrs, synEntries.prefixOffsets,
+             synEntries.idxs, synEntries.weights, synEntries.kernelIds)
+            for partition in layer.partitions
+            for synEntries in [synGrp.synEntryArrays
+                               for synGrp in partition.synapseGroups]]
+
+
+# (numPartitions, numNeurons, numSynEntriesPerNeuron, numSynPerSynEntry)
+CONFIGS = [
+    (10, 256, 4, 16),
+    (50, 256, 4, 16),
+    (50, 512, 8, 32),
+]
+
+
+def _timeit(func, *args):
+    t0 = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - t0
+
+
+def main():
+    print("{:>10}{:>12}{:>14}{:>12}{:>14}{:>12}".format(
+        'synEntries', 'pickle [MB]', 'pickle [s]', 'npz [MB]', 'npz [s]',
+        'speedup'))
+    for config in CONFIGS:
+        # The pickle format is measured on a fresh layer, because
+        # ``serializeLayer`` caches the SynEntryArrays of each synapse group.
+        layerRef = _genLayer(*config)
+        layer = _genLayer(*config)
+        numSynEntries = config[0] * config[1] * config[2]
+
+        with tempfile.TemporaryDirectory() as path:
+            _, tDumpRef = _timeit(_serializeLayerPickle, layerRef, path)
+            loadedRef, tLoadRef = _timeit(_deserializeLayerPickle, path,
+                                          layerRef.id + '.pickle')
+            sizeRef = os.path.getsize(os.path.join(path,
+                                                   layerRef.id + '.pickle'))
+
+            _, tDump = _timeit(serializeLayer, layer, path)
+            loaded, tLoad = _timeit(deserializeLayer, path,
+                                    layer.id + LAYER_FILE_EXTENSION)
+            size = os.path.getsize(os.path.join(
+                path, layer.id + LAYER_FILE_EXTENSION))
+
+        synapsesRef = _getSynapses(loadedRef)
+        synapses = _getSynapses(loaded)
+        assert len(synapses) == len(synapsesRef)
+        for a, b in zip(synapsesRef, synapses):
+            for x, y in zip(a, b):
+                assert np.array_equal(x, y)
+
+        tRef = tDumpRef + tLoadRef
+        t = tDump + tLoad
+        print("{:>10}{:>12.1f}{:>14.3f}{:>12.1f}{:>14.3f}{:>12.1f}".format(
+            numSynEntries, sizeRef / 2 ** 20, tRef, size / 2 ** 20, t,
+            tRef / t))
+
+
+if __name__ == '__main__':
+    main()
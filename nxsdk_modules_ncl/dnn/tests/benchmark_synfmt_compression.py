@@ -0,0 +1,141 @@
+#
+# Copyright © 2020 Intel Corporation.
+#
+# This software and the related documents are Intel copyrighted
+# materials, and your use of them is governed by the express
+# license under which they were provided to you (License). Unless
+# the License provides otherwise, you may not use, modify, copy,
+# publish, distribute, disclose or transmit  this software or the
+# related documents without Intel's prior written permission.
+#
+# This software and the related documents are provided as is, with
+# no express or implied warranties, other than those that are
+# expressly stated in the License.
+
+"""Benchmark compression of synFmts.
+
+Compares the bucketed priority-queue merge in ``compressSynFmts`` against the
+previous implementation, which builds the full pairwise distance matrix and
+deletes a row and column of it after each merge. Both have to produce the same
+synFmts and the same mapping from synEntries to synFmts.
+
+Run with ``python -m nxsdk_modules_ncl.dnn.tests.benchmark_synfmt_compression``.
+"""
+
+import time
+
+import numpy as np
+
+from nxsdk_modules_ncl.dnn.src.synapse_compression import compressSynFmts, \
+    _computeNumBitDistance
+
+
+def _computeDistance(a, b):
+    if not np.array_equal(a[[0, 1, 5, 6]], b[[0, 1, 5, 6]]):
+        return np.inf
+    else:
+        return _computeNumBitDistance(a[[2, 3, 4]], b[[2, 3, 4]])
+
+
+def _compressSynFmtPropertiesDense(synFmtProperties, maxNumSynFmt):
+    """Reference implementation of ``compressSynFmts`` using a dense distance
+    matrix. Returns the merged synFmt properties instead of SynFmt objects."""
+
+    synFmtProperties, synEntryToFmtMap = np.unique(synFmtProperties,
+                                                   return_inverse=True, axis=0)
+    synEntryToFmtMap = np.ravel(synEntryToFmtMap)
+    numSynFmts = synFmtProperties.shape[0]
+
+    distances = np.inf * np.ones((numSynFmts, numSynFmts))
+    for i in range(numSynFmts):
+        for j in range(i):
+            distances[i, j] = _computeDistance(synFmtProperties[i],
+                                               synFmtProperties[j])
+
+    while numSynFmts > maxNumSynFmt:
+
+        if np.all(np.isinf(distances)):
+            break
+
+        idx = np.unravel_index([np.argmin(distances)], distances.shape)
+        idx0, idx1 = sorted([idx[0][0], idx[1][0]])
+
+        synFmtProperties[idx0, 2:5] = \
+            np.max(synFmtProperties[[idx0, idx1], 2:5], axis=0)
+
+        synFmtProperties = np.delete(synFmtProperties, idx1, axis=0)
+        distances = np.delete(np.delete(distances, idx1, axis=0), idx1, axis=1)
+
+        for j in range(idx0):
+            distances[idx0, j] = _computeDistance(synFmtProperties[idx0],
+                                                  synFmtProperties[j])
+        for j in range(idx0 + 1, distances.shape[1]):
+            distances[j, idx0] = _computeDistance(synFmtProperties[j],
+                                                  synFmtProperties[idx0])
+
+        synEntryToFmtMap[synEntryToFmtMap == idx1] = idx0
+        synEntryToFmtMap[synEntryToFmtMap > idx1] -= 1
+
+        numSynFmts -= 1
+
+    return synFmtProperties, synEntryToFmtMap
+
+
+def _genSynFmtProperties(numSynEntries, numBuckets, seed=0):
+    """Generate random synFmt properties of ``numSynEntries`` synEntries,
+    spread over ``numBuckets`` combinations of cIdxOffset, cIdxMult,
+    compression and signMode."""
+
+    rng = np.random.RandomState(seed)
+    buckets = np.column_stack([rng.randint(0, 256, numBuckets),
+                               rng.randint(0, 16, numBuckets),
+                               rng.choice([0, 1, 3], numBuckets),
+                               rng.randint(1, 4, numBuckets)])
+    bucketIds = rng.randint(0, numBuckets, numSynEntries)
+    return np.column_stack([buckets[bucketIds, :2],
+                            rng.randint(6, 11, numSynEntries),
+                            rng.randint(0, 6, numSynEntries),
+                            rng.randint(1, 9, numSynEntries),
+                            buckets[bucketIds, 2:],
+                            np.zeros((numSynEntries, 2), int)])
+
+
+# (numSynEntries, numBuckets, maxNumSynFmt)
+CONFIGS = [
+    (10000, 1, 15),
+    (10000, 4, 60),
+    (20000, 8, 250),
+]
+
+
+def _timeit(func, *args):
+    t0 = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - t0
+
+
+def main():
+    print("{:>10}{:>10}{:>10}{:>12}{:>12}{:>10}".format(
+        'synEntries', 'unique', 'buckets', 'dense [s]', 'heap [s]',
+        'speedup'))
+    for numSynEntries, numBuckets, maxNumSynFmt in CONFIGS:
+        synFmtProperties = _genSynFmtProperties(numSynEntries, numBuckets)
+        numUnique = len(np.unique(synFmtProperties, axis=0))
+
+        (propsRef, mapRef), tRef = _timeit(_compressSynFmtPropertiesDense,
+                                           synFmtProperties.copy(),
+                                           maxNumSynFmt)
+        (synFmts, synEntryToFmtMap), t = _timeit(compressSynFmts,
+                                                 synFmtProperties.copy(),
+                                                 maxNumSynFmt)
+
+        props = np.stack([synFmt.asArray() for synFmt in synFmts])
+        assert np.array_equal(props, propsRef)
+        assert np.array_equal(np.ravel(synEntryToFmtMap), mapRef)
+
+        print("{:>10}{:>10}{:>10}{:>12.3f}{:>12.3f}{:>10.1f}".format(
+            numSynEntries, numUnique, numBuckets, tRef, t, tRef / t))
+
+
+if __name__ == '__main__':
+    main()
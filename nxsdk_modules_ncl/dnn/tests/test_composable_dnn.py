@@ -14,6 +14,7 @@
 
 """Unit test for ComposableDNN"""
 
+import os
 import unittest
 
 from nxsdk.composable.model import Model
@@ -24,7 +25,7 @@ from nxsdk_modules_ncl.dnn.src.dnn_layers import NxInputLayer, NxConv2D, NxAvera
 class TestComposableDNN(unittest.TestCase):
     """Unit test for ComposableDNN"""
     @staticmethod
-    def setUpDNN() -> ComposableDNN:
+    def setUpDNN(readoutMode: str = 'class', numImgs: int = None) -> ComposableDNN:
         """Sets up a DNN"""
         # Specify input shape of network.
         inputShape = (16, 16, 3)
@@ -43,7 +44,9 @@ class TestComposableDNN(unittest.TestCase):
         DNNModel = NxModel(inputLayer.input, x)
 
         composableDNNModel = ComposableDNN(model=DNNModel,
-                                           num_steps_per_img=100)
+                                           num_steps_per_img=100,
+                                           readout_mode=readoutMode,
+                                           num_imgs=numImgs)
         return composableDNNModel
 
     def testComposableDNN(self):
@@ -58,3 +61,20 @@ class TestComposableDNN(unittest.TestCase):
         with Model("dnn_pipeline") as model:
             self.setUpDNN()
             model.compile()
+
+    def testComposableDNNWithCountReadout(self):
+        """Tests that the readout snip sends the spike counts of all classes"""
+        composableDNNModel = self.setUpDNN(readoutMode='counts', numImgs=250)
+        model = Model("dnn_pipeline")
+        model.add(composableDNNModel)
+        model.compile()
+
+        self.assertEqual(composableDNNModel.numReadoutElementsPerImg, 10)
+        # The readout channel holds the counts of all images.
+        self.assertEqual(composableDNNModel.numReadoutElements, 2500)
+
+        cFilePath = os.path.join(os.path.dirname(__file__), '..', 'snips',
+                                 'readout_spike_activity',
+                                 'snip_class_readout.c')
+        with open(cFilePath) as cFile:
+            self.assertIn('#define SEND_COUNTS 1', cFile.read())
@@ -22,10 +22,90 @@ import numpy as np
 from nxsdk.arch.n2a.n2board import N2Board
 from nxsdk_modules_ncl.dnn.src.data_structures import Layer, SynFmt, Partition, \
     SynapseGroup, SynEntry, OutputAxonGroup, InputAxonGroup, CompartmentGroup
-from nxsdk_modules_ncl.dnn.src.dnn_mapper import DnnMapper
+from nxsdk_modules_ncl.dnn.src.dnn_mapper import DnnMapper, \
+    configureRegisters
 from nxsdk_modules_ncl.dnn.src.optimization import getDummyLayer
 
 
+class BulkRegisterFile:
+    """Register file that records the tables written via
+    ``configureArrays``."""
+
+    def __init__(self):
+        self.tables = []
+
+    def configureArrays(self, idxs, **fields):
+        self.tables.append((np.asarray(idxs), fields))
+
+
+class BulkCore:
+    """Core whose synapse register files support bulk writes."""
+
+    def __init__(self):
+        self.synapses = BulkRegisterFile()
+        self.synapseFmt = BulkRegisterFile()
+
+
+def mapSynapsesPerRegister(partition, core):
+    """Reference mapping of synapses and synFmts that configures one
+    register at a time, as DnnMapper did before bulk configuration.
+
+    :param Partition partition: Layer partition.
+    :param N2ACore core: Core to map to.
+    :return: (synGrp, col)->(synPtr, synLen) map.
+    :rtype: dict
+    """
+
+    sharedCfgs = partition.layer.connectionKwargs
+
+    for i, sf in enumerate(partition.synFmts):
+        if partition.resetMode == 'soft' and sf.softReset:
+            wgtExp = sharedCfgs["weightExpSR"]
+        else:
+            wgtExp = sharedCfgs["weightExponent"]
+
+        # Original synFmt and its copy to enforce synEntry switching
+        for k in range(2):
+            core.synapseFmt[1 + i * 2 + k].configure(
+                compression=int(sf.compression),
+                numSynapses=63,
+                wgtExp=wgtExp,
+                wgtBits=sf.numWgtBits if sf.numWgtBits != 8 else 7,
+                dlyBits=sf.numDlyBits,
+                skipBits=sf.numSkipBits,
+                idxBits=sf.numIdxBits - 5,
+                cIdxOffset=sf.cIdxOffset,
+                cIdxMult=sf.cIdxMult,
+                fanoutType=sf.signMode)
+
+    synGrpMap = {}
+    j = 0
+    for synGrp in partition.synapseGroups:
+        for col, synEntriesPerCol in enumerate(synGrp.synEntries):
+            prevSynFmtId = -1
+            synPtr = j
+
+            for synEntry in synEntriesPerCol:
+                synFmtId = synEntry.synFmtId * 2
+                if prevSynFmtId == synFmtId:
+                    synFmtId += 1
+                prevSynFmtId = synFmtId
+
+                for i in range(synEntry.numSyn):
+                    synCfgKwargs = {
+                        'synFmtId': 1 + synFmtId,
+                        'CIdx': synEntry.prefixOffset + synEntry.idxs[i],
+                        'Wgt': synEntry.weights[i]}
+                    if synEntry.delays is not None:
+                        synCfgKwargs.update({'Dly': synEntry.delays[i]})
+                    core.synapses[j].configure(**synCfgKwargs)
+                    j += 1
+
+            synGrpMap[(synGrp, col)] = (synPtr, j - synPtr)
+
+    return synGrpMap
+
+
 class TestDnnMapper(unittest.TestCase):
     """Test DNN mapper."""
 
@@ -671,6 +751,104 @@ class TestDnnMapper(unittest.TestCase):
         self.assertEqual(c._synGrpMap[(sg1, 1)], (13, 2))
         self.assertEqual(c._synGrpMap[(sg1, 2)], (15, 5))
 
+    def test_mapSynapses_bulk(self):
+        """Check that bulk and per-register configuration of synapses and
+        synFmts write the same registers as configuring one synapse at a
+        time."""
+
+        layer = Layer(layerId=0, layerType='', compartmentKwargs={},
+                      connectionKwargs={"weightExponent": 2},
+                      coreIdMap=np.array([]), multiplicityMap=np.array([]),
+                      postLayer=None)
+
+        sf0 = SynFmt(synFmtId=0, cIdxOffset=0, cIdxMult=2, numIdxBits=6,
+                     numSkipBits=0, numWgtBits=8, compression=0, signMode=1)
+        sf1 = SynFmt(synFmtId=1, cIdxOffset=1, cIdxMult=0, numIdxBits=8,
+                     numSkipBits=2, numWgtBits=4, compression=3, signMode=2)
+
+        se0 = SynEntry(prefixOffset=0, idxs=np.array([0, 1, 2]),
+                       weights=np.array([6, 7, 8]), synFmt=sf0)
+        se1 = SynEntry(prefixOffset=10, idxs=np.array([0, 1]),
+                       weights=np.array([16, 17]), synFmt=sf1)
+        se2 = SynEntry(prefixOffset=20, idxs=np.array([0, 1, 2]),
+                       weights=np.array([26, 27, 28]), synFmt=sf1)
+
+        sg0 = SynapseGroup(groupId=0, synEntries=[[se0, se1, se2], [se2]])
+        sg1 = SynapseGroup(groupId=1, synEntries=[[se0, se0], [], [se1]])
+
+        p = Partition(partitionId=0, chipCounter=0, sizeInterleaved=-1,
+                      parentLayer=layer)
+        p.addSynFmt(sf0)
+        p.addSynFmt(sf1)
+        p.addSynapseGroup(sg0)
+        p.addSynapseGroup(sg1)
+        layer.addPartition(p)
+
+        numSyn = 19
+        synFmtIds = [1, 2, 3, 4]
+        synFields = ['synFmtId', 'CIdx', 'Wgt', 'Dly']
+        synFmtFields = ['compression', 'numSynapses', 'wgtExp', 'wgtBits',
+                        'dlyBits', 'skipBits', 'idxBits', 'cIdxOffset',
+                        'cIdxMult', 'fanoutType']
+
+        board = N2Board(0)
+        coreRef = board.allocateCores(1, numSyn)[0]
+        synGrpMapRef = mapSynapsesPerRegister(p, coreRef)
+
+        # Per-register fallback of configureRegisters
+        c = DnnMapper(board)
+        core = board.allocateCores(1, numSyn)[0]
+        c._mapSynapses(p, core)  # pylint: disable=protected-access
+
+        for idx in range(numSyn):
+            for name in synFields:
+                self.assertEqual(getattr(core.synapses[idx], name),
+                                 getattr(coreRef.synapses[idx], name))
+        for idx in synFmtIds:
+            for name in synFmtFields:
+                self.assertEqual(getattr(core.synapseFmt[idx], name),
+                                 getattr(coreRef.synapseFmt[idx], name))
+        self.assertDictEqual(c._synGrpMap, synGrpMapRef)
+
+        # Bulk configuration writes each register file as a single table
+        cBulk = DnnMapper(N2Board(0))
+        coreBulk = BulkCore()
+        cBulk._mapSynapses(p, coreBulk)  # pylint: disable=protected-access
+
+        self.assertEqual(len(coreBulk.synapses.tables), 1)
+        self.assertEqual(len(coreBulk.synapseFmt.tables), 1)
+
+        idxs, fields = coreBulk.synapses.tables[0]
+        self.assertListEqual(list(idxs), list(range(numSyn)))
+        for name in synFields:
+            values = fields.get(name, np.zeros(numSyn, int))
+            for k, idx in enumerate(idxs):
+                self.assertEqual(values[k],
+                                 getattr(coreRef.synapses[idx], name))
+
+        idxs, fields = coreBulk.synapseFmt.tables[0]
+        self.assertListEqual(list(idxs), synFmtIds)
+        for name in synFmtFields:
+            for k, idx in enumerate(idxs):
+                self.assertEqual(fields[name][k],
+                                 getattr(coreRef.synapseFmt[idx], name))
+        self.assertDictEqual(cBulk._synGrpMap, synGrpMapRef)
+
+    def test_configureRegisters(self):
+        """Check per-register fallback of configureRegisters."""
+
+        board = N2Board(0)
+        core = board.allocateCores(1, 0)[0]
+
+        configureRegisters(core.cxCfg, {'bias': np.array([3, 4, 5]),
+                                        'biasExp': np.array([0, 1, 2])},
+                           np.array([7, 2, 4]))
+
+        self.assertEqual(len(core.cxCfg.modified), 3)
+        self.assertEqual(core.cxCfg[7].bias, 3)
+        self.assertEqual(core.cxCfg[2].bias, 4)
+        self.assertEqual(core.cxCfg[4].biasExp, 2)
+
     def test_mapCompartments_1(self):
         """Check mapping of CompartmentGroups without soma traces."""
 
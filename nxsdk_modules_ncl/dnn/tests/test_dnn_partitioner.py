@@ -14,21 +14,25 @@
 
 """Test DNN partitioning code."""
 import os
+import pickle
 import unittest
 
 import numpy as np
 from scipy.sparse import lil_matrix
 from test import support
 
+from nxsdk.arch.n2a.n2board import N2Board
 from nxsdk.graph.nxprobes import N2Probe, N2SpikeProbe
 from nxsdk_modules_ncl.dnn.src.optimization import getDummyLayer
 from nxsdk_modules_ncl.dnn.src.utils import getCoreIdMapFromCoreShape
 from nxsdk_modules_ncl.dnn.src.plotting import plotMat
-from nxsdk_modules_ncl.dnn.src.data_structures import Layer
+from nxsdk_modules_ncl.dnn.src.data_structures import Layer, \
+    SynapseGroup, deserializeLayer
 from nxsdk_modules_ncl.dnn.src.dnn_layers import NxInputLayer, NxConv2D, \
     NxModel, ProbableStates, NxAveragePooling2D, NxDepthwiseConv2D, NxDense, \
     NxFlatten, NxConv1D, loadNxModel
-from nxsdk_modules_ncl.dnn.src.synapse_compression import SynapseEncoder
+from nxsdk_modules_ncl.dnn.src.synapse_compression import SynapseEncoder, \
+    compressSynFmts, remapSynEntries
 
 @unittest.skip
 class TestSynapseEncoding(unittest.TestCase):
@@ -502,6 +506,122 @@ class TestSynapseEncoding(unittest.TestCase):
                 for er, r in zip(expectedResult, result):
                     self.assertEqual(er, r)
 
+
+class TestSynapseGroup(unittest.TestCase):
+    """Test encoding synapses into synapse groups."""
+
+    def setUp(self):
+        """Define common parameters."""
+
+        self.numWeightBits = 8
+        self.maxNumSynPerSynEntry = 60
+
+    def test_encodeSynAuto(self):
+        """Check automatic selection of compression mode.
+
+        The 'auto' mode has to use no more synMem words than the best of the
+        individual compression modes.
+        """
+
+        synIdsList = [np.arange(40),
+                      np.array([0, 5, 6, 11, 200, 400]),
+                      np.concatenate([np.arange(10), np.arange(20, 80, 2)])]
+
+        for synIds in synIdsList:
+            numSynMemWords = {}
+            for compression in ['sparse', 'runlength', 'dense1', 'dense2',
+                                'auto']:
+                synapseEncoder = SynapseEncoder(self.numWeightBits,
+                                                self.maxNumSynPerSynEntry,
+                                                compression, False)
+                synapseEncoder.encode(synIds, np.ones(len(synIds), int), 0,
+                                      0)
+                synapseEncoder.endNeuron()
+                synEntries = synapseEncoder.popSynapseGroup()
+                synFmts, synEntryMap = compressSynFmts(
+                    synapseEncoder.getSynFmtArray(), 16)
+                remapSynEntries([synEntries], synFmts, synEntryMap)
+                numSynMemWords[compression] = \
+                    SynapseGroup(0, synEntries).numSynMemWords
+
+            with self.subTest(synIds=synIds):
+                self.assertEqual(numSynMemWords.pop('auto'),
+                                 min(numSynMemWords.values()))
+
+    def test_popSynapseGroup(self):
+        """Check struct-of-arrays container of synEntries.
+
+        The container has to yield the same synEntries and synapse group cost
+        as the equivalent list of ``SynEntry`` objects.
+        """
+
+        synapseEncoder = SynapseEncoder(self.numWeightBits, 2, 'runlength',
+                                        True)
+        synEntriesOfGroup = []
+        for synIds in [[0, 5, 6, 11, 100], [], [3, 4]]:
+            synIds = np.array(synIds, int)
+            synVals = np.arange(len(synIds)) - 1
+            synapseEncoder.encode(synIds, synVals, 0, 0, synVals + 10)
+            synEntriesOfGroup.append(synapseEncoder.getSynEntries())
+            synapseEncoder.endNeuron()
+
+        synEntryArrays = synapseEncoder.popSynapseGroup()
+
+        self.assertEqual(synEntryArrays.numNeurons, 3)
+        self.assertEqual(synEntryArrays.numSynEntries,
+                         sum(len(n) for n in synEntriesOfGroup))
+        self.assertEqual(synEntryArrays.numSyn, 7)
+
+        synFmts, synEntryMap = compressSynFmts(
+            synapseEncoder.getSynFmtArray(), 16)
+        remapSynEntries([synEntryArrays, synEntriesOfGroup], synFmts,
+                        synEntryMap)
+
+        synapseGroup1 = SynapseGroup(0, synEntriesOfGroup)
+        synapseGroup2 = SynapseGroup(0, synEntryArrays)
+
+        self.assertEqual(synapseGroup1.numSynEntries,
+                         synapseGroup2.numSynEntries)
+        self.assertEqual(synapseGroup1.numSynMemWords,
+                         synapseGroup2.numSynMemWords)
+        self.assertEqual(synapseGroup1.cost, synapseGroup2.cost)
+
+        for synEntries1, synEntries2 in zip(synapseGroup1.synEntries,
+                                            synapseGroup2.synEntries):
+            self.assertEqual(len(synEntries1), len(synEntries2))
+            for synEntry1, synEntry2 in zip(synEntries1, synEntries2):
+                self.assertEqual(synEntry1.prefixOffset,
+                                 synEntry2.prefixOffset)
+                self.assertEqual(tuple(synEntry1.idxs),
+                                 tuple(synEntry2.idxs))
+                self.assertEqual(tuple(synEntry1.weights),
+                                 tuple(synEntry2.weights))
+                self.assertEqual(tuple(synEntry1.kernelIds),
+                                 tuple(synEntry2.kernelIds))
+                self.assertEqual(synEntry1.synFmtId, synEntry2.synFmtId)
+                self.assertEqual(synEntry1.numBits, synEntry2.numBits)
+
+    def test_loadLegacySynapseGroup(self):
+        """Check loading a synapse group pickled before synEntries could be
+        stored as struct of arrays."""
+
+        path = os.path.join(os.path.dirname(__file__), 'data',
+                            'synapse_group_legacy.pickle')
+        with open(path, 'rb') as f:
+            synapseGroup = pickle.load(f)
+
+        synEntryArrays = synapseGroup.synEntryArrays
+
+        self.assertEqual(synEntryArrays.numNeurons, 3)
+        self.assertEqual(synEntryArrays.numSynEntries, 3)
+        self.assertEqual(list(synEntryArrays.idxs), [0, 5, 9, 3, 4, 1])
+        self.assertEqual(list(synEntryArrays.weights), [1, -2, 3, 5, 6, -7])
+        self.assertEqual(list(synEntryArrays.kernelIds),
+                         [10, 11, 12, 13, 14, 15])
+        self.assertEqual(SynapseGroup(0, synEntryArrays).numSynMemWords,
+                         synapseGroup.numSynMemWords)
+
+
 class TestNxConv2D(unittest.TestCase):
     """Test methods for partitioning a Nx convolution layer."""
 
@@ -811,6 +931,354 @@ class TestNxModel(unittest.TestCase):
 
         model.clearTemp()
 
+    def test_partitionModelLazyKernelIdMap(self):
+        """Test partitioning of a NxModel without materializing kernelIdMaps.
+
+        The kernelIdMap of a lazy layer must not be built when partitions are
+        not validated, and the partitions must be the same as those obtained
+        from the kernelIdMap of the whole layer.
+        """
+
+        def getModel(lazyKernelIdMap):
+            inputLayer = NxInputLayer((33, 51, 2))
+            hiddenLayer = NxConv2D(
+                7, 4, padding='same',
+                lazyKernelIdMap=lazyKernelIdMap)(inputLayer.input)
+            hiddenLayer = NxDepthwiseConv2D(
+                3, strides=2, lazyKernelIdMap=lazyKernelIdMap)(hiddenLayer)
+            hiddenLayer = NxAveragePooling2D(
+                2, lazyKernelIdMap=lazyKernelIdMap)(hiddenLayer)
+            hiddenLayer = NxFlatten()(hiddenLayer)
+            outputLayer = NxDense(4)(hiddenLayer)
+            return NxModel(inputLayer.input, outputLayer)
+
+        model1 = getModel(False)
+        model1.partition()
+        layers1 = model1.partitionOptimizer.getLayers()
+
+        model2 = getModel(True)
+        model2.partition()
+        layers2 = model2.partitionOptimizer.getLayers()
+
+        lazyLayers = [layer for layer in model2.layers
+                      if getattr(layer, 'lazyKernelIdMap', False)]
+        self.assertEqual(len(lazyLayers), 3)
+        for layer in lazyLayers:
+            self.assertFalse(layer.validatePartitions)
+            self.assertIsNone(layer._kernelIdMap)
+            self.assertIsNone(layer._pathToKernelIdMap)
+
+        self.assertEqual(len(layers1), len(layers2))
+        for layer1, layer2 in zip(layers1, layers2):
+            self.assertTrue(np.array_equal(layer1.coreIdMap,
+                                           layer2.coreIdMap))
+            self.assertEqual(layer1.cost, layer2.cost)
+
+        model1.clearTemp()
+        model2.clearTemp()
+
+    def test_partitionModelPruned(self):
+        """Test that pruning candidates by cost yields the same partitions."""
+
+        inputShape = (33, 51, 2)
+        inputLayer = NxInputLayer(inputShape)
+        hiddenLayer = NxConv2D(7, 4, padding='same')(inputLayer.input)
+        hiddenLayer = NxConv2D(9, 3, strides=2)(hiddenLayer)
+        hiddenLayer = NxFlatten()(hiddenLayer)
+        outputLayer = NxDense(4)(hiddenLayer)
+
+        model = NxModel(inputLayer.input, outputLayer,
+                        numCandidatesToCompute=3)
+        model.initialize()
+        model.partitionOptimizer.pruneCandidates = False
+        model.partition()
+        layers1 = model.partitionOptimizer.getLayers()
+
+        model.partitionOptimizer.pruneCandidates = True
+        model.partition()
+        layers2 = model.partitionOptimizer.getLayers()
+
+        self.assertEqual(len(layers1), len(layers2))
+        for layer1, layer2 in zip(layers1, layers2):
+            self.assertEqual(layer1.id, layer2.id)
+            self.assertTrue(np.array_equal(layer1.coreIdMap,
+                                           layer2.coreIdMap))
+            self.assertEqual(layer1.cost, layer2.cost)
+
+        model.clearTemp()
+
+    def test_partitionModelCached(self):
+        """Test reusing layer partitions from the partition cache."""
+
+        def getModel(cacheDir, signed=False):
+            inputLayer = NxInputLayer((33, 51, 2), signed=signed)
+            hiddenLayer = NxConv2D(7, 4, padding='same')(inputLayer.input)
+            hiddenLayer = NxConv2D(9, 3, strides=2)(hiddenLayer)
+            hiddenLayer = NxFlatten()(hiddenLayer)
+            outputLayer = NxDense(4)(hiddenLayer)
+            return NxModel(inputLayer.input, outputLayer, cacheDir=cacheDir)
+
+        def getInputAxonGroupIds(layer):
+            return {g.id for p in layer.partitions for g in p.inputAxonGroups}
+
+        def assertAxonGroupsConnected(layers):
+            # Output axon groups must point to input axon groups of this
+            # session, either of the post-layer or of the layer itself.
+            for layer in layers:
+                inAxGrpIds = getInputAxonGroupIds(layer) | \
+                    getInputAxonGroupIds(layer.postLayer)
+                for p in layer.partitions:
+                    for g in p.outputAxonGroups:
+                        self.assertIn(g.inAxGrpId, inAxGrpIds)
+
+        def assertLayersEqual(layers1, layers2):
+            self.assertEqual(len(layers1), len(layers2))
+            for layer1, layer2 in zip(layers1, layers2):
+                self.assertTrue(np.array_equal(layer1.coreIdMap,
+                                               layer2.coreIdMap))
+                self.assertEqual(layer1.cost, layer2.cost)
+
+        cacheDir = os.path.abspath(os.path.join(os.path.dirname(
+            os.path.realpath(__file__)), '../../..', 'temp',
+            'partition_cache_{}'.format(os.getpid())))
+
+        model1 = getModel(cacheDir)
+        model1.partition()
+        cache = model1.partitionOptimizer.cache
+        self.assertEqual(cache.numHits, 0)
+        layers1 = model1.partitionOptimizer.getLayers()
+
+        # Same architecture and weights: All layers are loaded from cache.
+        model2 = getModel(cacheDir)
+        model2.set_weights(model1.get_weights())
+        model2.partition()
+        cache = model2.partitionOptimizer.cache
+        self.assertEqual(cache.numHits, len(model2.layers))
+        self.assertEqual(cache.numMisses, 0)
+        layers2 = model2.partitionOptimizer.getLayers()
+
+        assertLayersEqual(layers1, layers2)
+        assertAxonGroupsConnected(layers2)
+
+        # Loaded input axon groups get ids of their own.
+        for layer1, layer2 in zip(layers1, layers2):
+            self.assertFalse(getInputAxonGroupIds(layer1) &
+                             getInputAxonGroupIds(layer2))
+
+        # Different weights of the output layer: The output layer is
+        # partitioned anew. Layers below are only reused if they connect to
+        # the same input axon layout, so the result is the same as without
+        # cache.
+        model3 = getModel(cacheDir)
+        model3.partition()
+        self.assertGreater(model3.partitionOptimizer.cache.numMisses, 0)
+        layers3 = model3.partitionOptimizer.getLayers()
+        assertAxonGroupsConnected(layers3)
+
+        model4 = getModel(None)
+        model4.set_weights(model3.get_weights())
+        model4.partition()
+        assertLayersEqual(layers3, model4.partitionOptimizer.getLayers())
+
+        # Signed input spikes double the input channels of the first conv
+        # layer: The input layer and the first conv layer are partitioned
+        # anew, all other layers are loaded from cache.
+        model5 = getModel(cacheDir, signed=True)
+        model5.set_weights(model1.get_weights())
+        model5.partition()
+        cache = model5.partitionOptimizer.cache
+        self.assertEqual(cache.numMisses, 2)
+        self.assertEqual(cache.numHits, len(model5.layers) - 2)
+        assertAxonGroupsConnected(model5.partitionOptimizer.getLayers())
+
+        cache.clear()
+        for model in [model1, model2, model3, model4, model5]:
+            model.clearTemp()
+
+    def test_serializeLayers(self):
+        """Test that compiled layers are restored from disk unchanged."""
+
+        inputShape = (33, 51, 2)
+        inputLayer = NxInputLayer(inputShape)
+        hiddenLayer = NxConv2D(7, 4, padding='same')(inputLayer.input)
+        hiddenLayer = NxConv2D(9, 3, strides=2)(hiddenLayer)
+        hiddenLayer = NxFlatten()(hiddenLayer)
+        outputLayer = NxDense(4)(hiddenLayer)
+
+        model = NxModel(inputLayer.input, outputLayer)
+
+        model.partition()
+
+        for layer1 in model.partitionOptimizer.getLayers():
+            layer2 = deserializeLayer(model.pathMappables,
+                                      layer1.id + '.npz')
+            self.assertEqual(layer1.id, layer2.id)
+            self.assertEqual(layer1.postLayer.id, layer2.postLayer)
+            self.assertTrue(np.array_equal(layer1.coreIdMap,
+                                           layer2.coreIdMap))
+            self.assertEqual(layer1.cost, layer2.cost)
+            self.assertEqual(len(layer1.partitions), len(layer2.partitions))
+            for p1, p2 in zip(layer1.partitions, layer2.partitions):
+                self.assertEqual(p1.cost, p2.cost)
+                self.assertEqual([g.id for g in p1.inputAxonGroups],
+                                 [g.id for g in p2.inputAxonGroups])
+                self.assertEqual([g.inAxGrpId for g in p1.outputAxonGroups],
+                                 [g.inAxGrpId for g in p2.outputAxonGroups])
+                for g1, g2 in zip(p1.synapseGroups, p2.synapseGroups):
+                    synEntries1 = [e for n in g1.synEntries for e in n]
+                    synEntries2 = [e for n in g2.synEntries for e in n]
+                    self.assertEqual(len(synEntries1), len(synEntries2))
+                    for e1, e2 in zip(synEntries1, synEntries2):
+                        self.assertTrue(np.array_equal(e1.idxs, e2.idxs))
+                        self.assertTrue(np.array_equal(e1.weights,
+                                                       e2.weights))
+                        self.assertTrue(np.array_equal(e1.synFmt.asArray(),
+                                                       e2.synFmt.asArray()))
+
+        model.clearTemp()
+
+    def test_updateWeights(self):
+        """Test that updating weights reuses the partitions of a model.
+
+        The updated layers have to contain the same synapses, with the same
+        weights, as layers compiled from scratch with the new weights.
+        """
+
+        inputShape = (33, 51, 2)
+        inputLayer = NxInputLayer(inputShape)
+        hiddenLayer = NxConv2D(7, 4, padding='same')(inputLayer.input)
+        hiddenLayer = NxConv2D(9, 3, strides=2)(hiddenLayer)
+        hiddenLayer = NxFlatten()(hiddenLayer)
+        outputLayer = NxDense(4)(hiddenLayer)
+
+        model = NxModel(inputLayer.input, outputLayer)
+        model.partition()
+
+        layerNames = [layer.id for layer in
+                      model.partitionOptimizer.getLayers()]
+
+        def loadLayers():
+            return [deserializeLayer(model.pathMappables, name + '.npz')
+                    for name in layerNames]
+
+        def getSynapses(synapseGroup):
+            synEntries = synapseGroup.synEntryArrays
+            numSyn = synEntries.getNumSynPerSynEntry()
+            neuronIds = np.repeat(synEntries.getNeuronIds(), numSyn)
+            synapses = np.column_stack([neuronIds, synEntries.getCxIds(),
+                                        synEntries.kernelIds,
+                                        synEntries.weights])
+            synapses = synapses[synEntries.kernelIds != 0]
+            return synapses[np.lexsort(synapses.T[::-1])]
+
+        layers1 = loadLayers()
+
+        rng = np.random.RandomState(0)
+        model.set_weights([rng.randint(-100, 100, w.shape)
+                           for w in model.get_weights()])
+
+        self.assertTrue(model.updateWeights())
+        layers2 = loadLayers()
+
+        # Compile layers from scratch, using the same partitions.
+        for filename in os.listdir(model.pathMappables):
+            os.remove(os.path.join(model.pathMappables, filename))
+        model.partitionFromSavedConfig()
+        layers3 = loadLayers()
+
+        for layer1, layer2, layer3 in zip(layers1, layers2, layers3):
+            self.assertTrue(np.array_equal(layer1.coreIdMap,
+                                           layer2.coreIdMap))
+            for p1, p2, p3 in zip(layer1.partitions, layer2.partitions,
+                                  layer3.partitions):
+                self.assertEqual([g.id for g in p1.inputAxonGroups],
+                                 [g.id for g in p2.inputAxonGroups])
+                self.assertEqual([g.inAxGrpId for g in p1.outputAxonGroups],
+                                 [g.inAxGrpId for g in p2.outputAxonGroups])
+                self.assertTrue(np.array_equal(p2.compartmentGroup.biasMant,
+                                               p3.compartmentGroup.biasMant))
+                self.assertEqual(len(p2.synapseGroups), len(p3.synapseGroups))
+                for g2, g3 in zip(p2.synapseGroups, p3.synapseGroups):
+                    self.assertTrue(np.array_equal(getSynapses(g2),
+                                                   getSynapses(g3)))
+
+        model.clearTemp()
+
+    def test_partitionModelParallel(self):
+        """Test partitioning of a NxModel with multiple worker processes.
+
+        The partitions found in parallel have to be identical to the ones found
+        serially.
+        """
+
+        inputShape = (33, 51, 2)
+        inputLayer = NxInputLayer(inputShape)
+        hiddenLayer = NxConv2D(7, 4, padding='same')(inputLayer.input)
+        hiddenLayer = NxConv2D(9, 3, strides=2)(hiddenLayer)
+        hiddenLayer = NxFlatten()(hiddenLayer)
+        outputLayer = NxDense(4)(hiddenLayer)
+
+        model = NxModel(inputLayer.input, outputLayer,
+                        numCandidatesToCompute=3)
+        model.partition()
+        layers1 = model.partitionOptimizer.getLayers()
+
+        model.partitionOptimizer.numWorkers = 4
+        model.partition()
+        layers2 = model.partitionOptimizer.getLayers()
+
+        self.assertEqual(len(layers1), len(layers2))
+        for layer1, layer2 in zip(layers1, layers2):
+            self.assertEqual(layer1.id, layer2.id)
+            self.assertTrue(np.array_equal(layer1.coreIdMap,
+                                           layer2.coreIdMap))
+            self.assertEqual(layer1.cost, layer2.cost)
+
+        model.clearTemp()
+
+    def test_mapModelParallel(self):
+        """Test mapping of a NxModel with multiple worker processes.
+
+        The registers of each core have to be configured the same way as when
+        mapping serially.
+        """
+
+        inputShape = (33, 51, 2)
+        inputLayer = NxInputLayer(inputShape)
+        hiddenLayer = NxConv2D(7, 4, padding='same')(inputLayer.input)
+        hiddenLayer = NxConv2D(9, 3, strides=2)(hiddenLayer)
+        hiddenLayer = NxFlatten()(hiddenLayer)
+        outputLayer = NxDense(4)(hiddenLayer)
+
+        model = NxModel(inputLayer.input, outputLayer)
+        model.initialize()
+        model.partition()
+
+        boards = []
+        for numMapWorkers in [1, 4]:
+            model.board = N2Board(0)
+            model.numMapWorkers = numMapWorkers
+            model.map()
+            boards.append(model.board)
+
+        registerNames = ['synapseFmt', 'synapses', 'synapseMap', 'cxCfg',
+                         'cxMetaState', 'numUpdates', 'cxProfileCfg',
+                         'vthProfileCfg']
+        for chip1, chip2 in zip(boards[0].n2Chips, boards[1].n2Chips):
+            self.assertEqual(len(chip1.n2Cores), len(chip2.n2Cores))
+            for core1, core2 in zip(chip1.n2Cores, chip2.n2Cores):
+                for name in registerNames:
+                    nodes = sorted(getattr(core1, name).modified)
+                    self.assertListEqual(
+                        nodes, sorted(getattr(core2, name).modified))
+                    for i in nodes:
+                        self.assertEqual(str(getattr(core1, name)[i]),
+                                         str(getattr(core2, name)[i]))
+                self.assertListEqual([str(a) for a in core1.axons],
+                                     [str(a) for a in core2.axons])
+
+        model.clearTemp()
+
     def test_partitionModel2(self):
         """Test partitioning of a NxModel.
 
@@ -16,6 +16,9 @@ expressly stated in the License.
 """
 import json
 import pickle
+import queue
+import threading
+import time
 import numpy as np
 from typing import Callable
 from nxsdk.composable.collections import Processes
@@ -119,6 +122,11 @@ class InputGenerator(AbstractComposable):
         self._metaData = []
         # List consisting of number of packets per snip
         self._packetPerSnip = []
+        # Indices of the encoded data to be sent to the snips, concatenated
+        # over all snips, and offsets of each snip into these indices.
+        # Precomputed at map time so that packing a sample is a single gather.
+        self._gatherIdxs = None
+        self._snipOffsets = None
 
         # List of Channels
         #   dataChannel     : Used to send injection data
@@ -280,7 +288,7 @@ class InputGenerator(AbstractComposable):
             else:
                 numPackets = (
                     self._injectionPointsPerSnip[idx] * 4) // self.packetSize + 1
-            self._packetPerSnip.append(np.asscalar(numPackets))
+            self._packetPerSnip.append(int(numPackets))
         self._logger.debug(
             "Packets per Snip is : {}".format(
                 self._packetPerSnip))
@@ -291,32 +299,71 @@ class InputGenerator(AbstractComposable):
 
         :param encodedData: Encoded Data to be sent to snip
         """
-        self._logger.debug("Writing the Input Encoder")
+        self._writePackedData(self._packEncodedData(encodedData))
 
-        dataPerChip = {}
-        dataInjected = 0
+    def _calculateGatherIndices(self):
+        """
+        Calculates which elements of the encoded data are sent to each snip
+
+        The data of a chip are the consecutive blocks of encoded data that
+        _dataOrder assigns to the chip. They are divided among the snips on
+        the chip according to _injectionPointsPerSnip.
+        """
+        self._logger.debug("Calculating the gather indices for Input Encoder")
 
-        # Creating data buffer per chip
+        idxsPerChip = {}
+        dataInjected = 0
         for chipId, injectionPoints in self._dataOrder:
-            if chipId not in dataPerChip:
-                dataPerChip[chipId] = []
-            dataPerChip[chipId].extend(encodedData[dataInjected:dataInjected + injectionPoints])
+            idxsPerChip.setdefault(chipId, []).append(
+                np.arange(dataInjected, dataInjected + injectionPoints))
             dataInjected += injectionPoints
+        idxsPerChip = {chipId: np.concatenate(idxs)
+                       for chipId, idxs in idxsPerChip.items()}
 
+        idxsPerSnip = []
         dataSend = 0
         chipId = 0
-        for idx, channel in enumerate(self._dataChannels):
+        for idx, dataPerSnip in enumerate(self._injectionPointsPerSnip):
             # Retrive chipId for snip from the stored dictionary
             if chipId != self._chipIdForSnip[idx]:
                 chipId = self._chipIdForSnip[idx]
                 dataSend = 0
-            dataPerSnip = self._injectionPointsPerSnip[idx]
-            channel.write(
-                self._packetPerSnip[idx], dataPerChip[chipId][dataSend:dataSend + dataPerSnip])
+            idxsPerSnip.append(
+                idxsPerChip[chipId][dataSend:dataSend + dataPerSnip])
             dataSend += dataPerSnip
+
+        self._gatherIdxs = np.concatenate(idxsPerSnip).astype(np.intp) \
+            if idxsPerSnip else np.zeros(0, np.intp)
+        self._snipOffsets = np.cumsum([0] + [len(i) for i in idxsPerSnip])
+
+    def _packEncodedData(self, encodedData):
+        """
+        Split the encoded data into the data to be sent to each snip
+
+        :param encodedData: Encoded Data to be sent to snip
+        :returns: List of contiguous int32 arrays, one per data channel
+        """
+        # Input generators saved before the gather indices existed lack them.
+        if getattr(self, '_gatherIdxs', None) is None:
+            self._calculateGatherIndices()
+
+        packedData = np.asarray(encodedData)[self._gatherIdxs]
+        packedData = packedData.astype(np.int32, copy=False)
+        return np.split(packedData, self._snipOffsets[1:-1])
+
+    def _writePackedData(self, packedData):
+        """
+        Write the data per snip on the channels to be read by snip
+
+        :param packedData: List of data per data channel
+        """
+        self._logger.debug("Writing the Input Encoder")
+
+        for idx, channel in enumerate(self._dataChannels):
+            channel.write(self._packetPerSnip[idx], packedData[idx])
             self._logger.debug(
                 "Sending {} data to snip : {}".format(
-                    dataPerSnip, idx))
+                    len(packedData[idx]), idx))
 
     def _validateState(self, board: Graph):
         """
@@ -383,12 +430,20 @@ class InputGenerator(AbstractComposable):
         self._logger.debug("Encoding the Input Encoder data")
         if not self._compiled:
             raise ValueError("InputGenerator is not yet compiled")
+        self._writePackedData(self._encodeSample(data))
+
+    def _encodeSample(self, data: np.ndarray):
+        """
+        Encodes a single sample and splits it into the data per snip
+
+        :param data: Data to be encoded
+        :returns: List of data per data channel
+        """
         if data.shape != self.shape:
             raise ValueError(
                 "Shape of the Data to be Encoded {} doesn't match with the Input Encoder {}".format(
                     data.shape, self.shape))
-        encodedData = self.encoderFunction(data)
-        self._writeEncodedData(encodedData)
+        return self._packEncodedData(self.encoderFunction(data))
 
     def batchEncode(self, data: np.ndarray):
         """
@@ -405,6 +460,74 @@ class InputGenerator(AbstractComposable):
         for batch_id, input in enumerate(data):
             self.encode(input)
 
+    def feed(self, data, numBuffers: int = 2):
+        """
+        Encodes a sequence of samples in a background thread while writing
+        them to the channels.
+
+        While sample N is written, which blocks as long as the channels are
+        full, samples N+1 to N+numBuffers are already encoded. In contrast to
+        batchEncode, the number of samples is not limited by queueSize, so
+        the board should run asynchronously while feeding.
+
+        :param data: Iterable of samples, e.g. ndarray with first dimension
+            signifying the batch size, or a generator
+        :param numBuffers: Number of samples encoded ahead of the one being
+            written
+        :returns: Throughput in samples/s
+        """
+        if not self._compiled:
+            raise ValueError("InputGenerator is not yet compiled")
+        if numBuffers < 1:
+            raise ValueError("numBuffers must be at least 1")
+
+        buffers = queue.Queue(maxsize=numBuffers)
+        stop = threading.Event()
+        done = object()
+
+        def put(item):
+            # Give up once the writing thread has stopped.
+            while not stop.is_set():
+                try:
+                    buffers.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def encodeAll():
+            try:
+                for sample in data:
+                    if not put(self._encodeSample(sample)):
+                        return
+                put(done)
+            except Exception as e:
+                put(e)
+
+        encoder = threading.Thread(target=encodeAll, daemon=True)
+        numSamples = 0
+        tStart = time.perf_counter()
+        encoder.start()
+        try:
+            while True:
+                packedData = buffers.get()
+                if packedData is done:
+                    break
+                if isinstance(packedData, Exception):
+                    raise packedData
+                self._writePackedData(packedData)
+                numSamples += 1
+        finally:
+            stop.set()
+            encoder.join()
+
+        duration = time.perf_counter() - tStart
+        throughput = numSamples / duration if duration > 0 else float('inf')
+        self._logger.info(
+            "Fed {} samples at {:.1f} samples/s".format(numSamples,
+                                                        throughput))
+        return throughput
+
     def _addInjectionPointsForChip(self, chipId, injectionPoints):
         """
         Helper function to add injectionPoints to chip
@@ -509,6 +632,8 @@ class InputGenerator(AbstractComposable):
                     rangeAddress[mapIdx][3] = rangeAddress[mapIdx][3] - toBeInjected
                     toBeInjected = 0
 
+        self._calculateGatherIndices()
+
         # Update processes to create new processes given the mapping is now
         # done
         self._createSnips()
@@ -277,60 +277,291 @@ class SpikeInputGenerator(AbstractComposable):
 
         self.send_inputs(inputs_encoded)
 
-    def prepare_encoding(self, inputs):
+    def prepare_encoding(self, inputs, split_interval=None):
+        """
+        Encode spikes into the packet format read by the injection snips.
+
+        The spikes are sorted by chip, timestep and core, and split evenly
+        across the snips of each chip. The buffer of each snip consists of one
+        block per timestep: [timestep, numCores, (coreId, numAxons,
+        axonIds...) for each core].
+
+        :param inputs: Array-like of (id, t) tuples. Timestamps must be
+            strictly positive.
+        :param split_interval: If given, the spikes in each interval of this
+            many timesteps, starting at timestep 1, are split across the snips
+            separately. When encoding several samples at once, pass the
+            duration of a sample, so that all snips inject spikes during each
+            sample instead of each snip taking a contiguous range of samples.
+        :returns: OrderedDict mapping chip id to an OrderedDict that maps the
+            snip id to the int32 buffer of that snip.
+        """
 
-        inputs = np.array(inputs, 'uint64')
+        inputs = np.asarray(inputs, 'uint64').reshape(-1, 2)
+        timesteps = inputs[:, 1]
+        assert len(timesteps) == 0 or np.min(timesteps) > 0, \
+            "Time stamps must be strictly nonzero."
 
         input_addresses = self.axonMap[inputs[:, 0]]
-        inputs_encoded = OrderedDict()
-        # Group the spikes according to target chip.
-        for chip in self.chips:
-            chip_mask = input_addresses[:, 0] == chip
-            core_axon_ids = input_addresses[chip_mask, 1:]
-            timesteps = inputs[chip_mask, 1]
-            assert np.min(timesteps) > 0, \
-                "Time stamps must be strictly nonzero."
-            inputs_per_chip = np.column_stack([core_axon_ids, timesteps])
-
-            # Sort the spikes per chip according to time, core, axons.
-            sort_idxs = np.lexsort((core_axon_ids[:, 0], timesteps))
-            # Also group them by lmt which will be used to inject the spikes.
-            inputs_per_cpu = self.split(inputs_per_chip[sort_idxs],
-                                        self.numLmts)
+        chip_ids = input_addresses[:, 0]
+        core_ids = input_addresses[:, 1]
+
+        # Sort the spikes according to chip, time and core. The sort is
+        # stable, so axons keep their input order.
+        sort_idxs = self._sortSpikes(chip_ids, timesteps, core_ids)
+        chip_ids = chip_ids[sort_idxs]
+        core_ids = core_ids[sort_idxs]
+        axon_ids = input_addresses[sort_idxs, 2]
+        timesteps = timesteps[sort_idxs]
+
+        # With intervals, assign the spikes of each interval to the lmts
+        # separately, and regroup them by lmt, keeping them sorted by time.
+        if split_interval is not None:
+            intervals = (timesteps - 1) // np.uint64(split_interval)
+            is_new_group = np.ones(len(timesteps), bool)
+            is_new_group[1:] = (chip_ids[1:] != chip_ids[:-1]) | \
+                (intervals[1:] != intervals[:-1])
+            lmt_ids = self._splitGroups(is_new_group, self.numLmts)
+            sort_idxs = self._sortSpikes(chip_ids, lmt_ids.astype('uint64'))
+            chip_ids = chip_ids[sort_idxs]
+            core_ids = core_ids[sort_idxs]
+            axon_ids = axon_ids[sort_idxs]
+            timesteps = timesteps[sort_idxs]
+            lmt_ids = lmt_ids[sort_idxs]
+
+        chip_starts = np.searchsorted(chip_ids, self.chips, 'left')
+        chip_stops = np.searchsorted(chip_ids, self.chips, 'right')
 
+        inputs_encoded = OrderedDict()
+        for chip, start, stop in zip(self.chips, chip_starts, chip_stops):
+            # Group the spikes by lmt which will be used to inject them.
+            if split_interval is None:
+                sub_len, rest = divmod(stop - start, self.numLmts)
+                lmt_idxs = np.arange(self.numLmts + 1)
+                lmt_bounds = start + lmt_idxs * sub_len + \
+                    np.minimum(lmt_idxs, rest)
+            else:
+                lmt_bounds = start + np.searchsorted(
+                    lmt_ids[start:stop], np.arange(self.numLmts + 1))
             inputs_per_chip_encoded = OrderedDict()
-            # Iterating over list of input spikes per snip.
-            for lmt_id, input_per_cpu in enumerate(inputs_per_cpu):
-                input_per_cpu_encoded = []
-                for t in np.unique(input_per_cpu[:, 2]):
-                    timestep_mask = input_per_cpu[:, 2] == t
-                    core_axon_ids = input_per_cpu[timestep_mask, :2]
-
-                    input_per_cpu_encoded.append(t)
-                    core_axon_map = []
-                    for core in np.unique(core_axon_ids[:, 0]):
-                        core_mask = core_axon_ids[:, 0] == core
-                        core_axon_map.append(
-                            (core, list(core_axon_ids[core_mask, 1])))
-                    input_per_cpu_encoded.append(len(core_axon_map))
-                    for core, axon_ids in core_axon_map:
-                        input_per_cpu_encoded.append(core)
-                        input_per_cpu_encoded.append(len(axon_ids))
-                        input_per_cpu_encoded.extend(axon_ids)
-                inputs_per_chip_encoded[lmt_id] = input_per_cpu_encoded
+            for lmt_id in range(self.numLmts):
+                lmt_start = lmt_bounds[lmt_id]
+                lmt_stop = lmt_bounds[lmt_id + 1]
+                inputs_per_chip_encoded[lmt_id] = self._encodeSpikes(
+                    core_ids[lmt_start:lmt_stop],
+                    axon_ids[lmt_start:lmt_stop],
+                    timesteps[lmt_start:lmt_stop])
             inputs_encoded[chip] = inputs_per_chip_encoded
 
         return inputs_encoded
 
+    @staticmethod
+    def _splitGroups(is_new_group, n_ways):
+        """
+        Split each group of consecutive elements into n_ways parts, in the
+        same way as split.
+
+        :param is_new_group: Boolean array marking the first element of each
+            group.
+        :param n_ways: Number of parts per group.
+        :returns: Index of the part of each element.
+        """
+
+        num_elements = len(is_new_group)
+        group_starts = np.flatnonzero(is_new_group)
+        group_idxs = np.cumsum(is_new_group) - 1
+        group_sizes = np.diff(np.append(group_starts, num_elements))
+
+        # Position of each element within its group.
+        positions = np.arange(num_elements) - group_starts[group_idxs]
+        sub_len, rest = divmod(group_sizes[group_idxs], n_ways)
+
+        # The first rest parts hold one element more than the others.
+        num_in_long = rest * (sub_len + 1)
+        return np.where(positions < num_in_long,
+                        positions // (sub_len + 1),
+                        rest + (positions - num_in_long) //
+                        np.maximum(sub_len, 1))
+
+    @staticmethod
+    def _sortSpikes(*keys):
+        """
+        Stable sort of spikes by several keys, the first being the primary.
+
+        If the keys fit into 64 bits, they are packed into a single key,
+        which sorts about twice as fast as np.lexsort.
+
+        :param keys: uint64 arrays of keys.
+        :returns: Indices that sort the spikes.
+        """
+
+        num_bits = [int(np.max(key)).bit_length() if len(key) else 0
+                    for key in keys]
+        if sum(num_bits) > 64:
+            return np.lexsort(keys[::-1])
+
+        packed = np.zeros(len(keys[0]), 'uint64')
+        for key, bits in zip(keys, num_bits):
+            packed <<= np.uint64(bits)
+            packed |= key
+        return np.argsort(packed, kind='stable')
+
+    @staticmethod
+    def _encodeSpikes(core_ids, axon_ids, timesteps):
+        """
+        Encode the spikes of one snip, which are sorted by time and core.
+
+        :param core_ids: Core id of each spike.
+        :param axon_ids: Axon id of each spike.
+        :param timesteps: Timestep of each spike.
+        :returns: int32 buffer of the snip.
+        """
+
+        num_spikes = len(timesteps)
+        if num_spikes == 0:
+            return np.zeros(0, np.int32)
+
+        # Mark the first spike of each timestep and of each (timestep, core)
+        # group.
+        is_new_timestep = np.ones(num_spikes, bool)
+        is_new_timestep[1:] = timesteps[1:] != timesteps[:-1]
+        is_new_group = is_new_timestep.copy()
+        is_new_group[1:] |= core_ids[1:] != core_ids[:-1]
+
+        timestep_idxs = np.cumsum(is_new_timestep) - 1
+        group_idxs = np.cumsum(is_new_group) - 1
+        timestep_starts = np.flatnonzero(is_new_timestep)
+        group_starts = np.flatnonzero(is_new_group)
+        num_groups = len(group_starts)
+
+        encoded = np.empty(num_spikes + 2 * len(timestep_starts) +
+                           2 * num_groups, np.int32)
+
+        # Each spike is preceded by the 2-element headers of its own and all
+        # previous timesteps and groups.
+        spike_pos = np.arange(num_spikes) + 2 * (timestep_idxs + 1) + \
+            2 * (group_idxs + 1)
+        encoded[spike_pos] = axon_ids
+
+        # The first spike of a timestep directly follows the timestep header
+        # and the header of its group.
+        timestep_pos = spike_pos[timestep_starts] - 4
+        encoded[timestep_pos] = timesteps[timestep_starts]
+        encoded[timestep_pos + 1] = np.diff(
+            np.append(group_idxs[timestep_starts], num_groups))
+
+        group_pos = spike_pos[group_starts] - 2
+        encoded[group_pos] = core_ids[group_starts]
+        encoded[group_pos + 1] = np.diff(np.append(group_starts, num_spikes))
+
+        return encoded
+
     def send_inputs(self, inputs):
-        channel_idx = 0
+        """
+        Write encoded spikes to the data channels.
+
+        :param inputs: Encoded spikes as returned by prepare_encoding.
+        """
+
+        for channel_idx, inputs_per_cpu in enumerate(
+                self._iterBuffers(inputs)):
+            self._writePackets(channel_idx,
+                               np.asarray(inputs_per_cpu, np.int32),
+                               flush=True)
+
+    def stream(self, events, window_size=100000):
+        """
+        Encode and send spikes window by window.
+
+        Only one window of events is read and encoded at a time, so long
+        recordings can be replayed from a memory-mapped file, e.g.
+        ``np.load(path, mmap_mode='r')``, or from a generator that reads an
+        event file in chunks. Call this method while the board runs
+        asynchronously, e.g. after ``board.run(numSteps, aSync=True)``.
+
+        Encoded spikes are written to the data channels in full packets only;
+        the rest of each buffer is carried over to the next window. Each write
+        holds at most ``queueSize`` packets. A data channel buffers up to
+        ``queueSize * packetSize`` packets, so the host may get that far ahead
+        of the snips; only once a channel is full does writing block until the
+        snips have consumed earlier packets.
+
+        A window may end within a timestep. The snip then processes the
+        spikes of that timestep in two consecutive blocks.
+
+        :param events: Array of (id, t) rows sorted by t, or an iterable of
+            such arrays in time order.
+        :param window_size: Number of events per window if events is an
+            array.
+        :returns: Number of spikes sent.
+        """
+
+        if isinstance(events, np.ndarray):
+            windows = (events[start:start + window_size]
+                       for start in range(0, len(events), window_size))
+        else:
+            windows = events
+
+        pending = [np.zeros(0, np.int32)] * (len(self.chips) * self.numLmts)
+        num_spikes = 0
+        last_timestep = 0
+        for window in windows:
+            window = np.asarray(window).reshape(-1, 2)
+            if len(window) == 0:
+                continue
+            assert window[0, 1] >= last_timestep, \
+                "Windows must be in time order."
+            last_timestep = window[-1, 1]
+            num_spikes += len(window)
+
+            encoded = self.prepare_encoding(window)
+            for channel_idx, buffer in enumerate(self._iterBuffers(encoded)):
+                pending[channel_idx] = self._writePackets(
+                    channel_idx, np.concatenate([pending[channel_idx],
+                                                 buffer]))
+
+        for channel_idx, buffer in enumerate(pending):
+            self._writePackets(channel_idx, buffer, flush=True)
+
+        return num_spikes
+
+    @staticmethod
+    def _iterBuffers(inputs):
+        """
+        Iterate over the buffers of encoded spikes in the order of the data
+        channels.
+
+        :param inputs: Encoded spikes as returned by prepare_encoding.
+        """
+
         for inputs_per_chip in inputs.values():
             for inputs_per_cpu in inputs_per_chip.values():
-                # Must have one (at least partly) empty package at the end,
-                # otherwise the snip will try to read out where nothing is
-                # written. (Cant' use ceil because it doesn't cover the case of
-                # even division.)
-                num_packets = len(inputs_per_cpu) // self.packetSize + 1
-                self._dataChannels[channel_idx].write(num_packets,
-                                                      inputs_per_cpu)
-                channel_idx += 1
+                yield inputs_per_cpu
+
+    def _writePackets(self, channel_idx, buffer, flush=False):
+        """
+        Write the full packets of a buffer to a data channel.
+
+        :param channel_idx: Index of the data channel.
+        :param buffer: int32 buffer of encoded spikes.
+        :param flush: If True, also write the remainder of the buffer. The
+            last packet is padded, because the snip must have one (at least
+            partly) empty packet at the end, otherwise it will try to read out
+            where nothing is written.
+        :returns: Remainder of the buffer that was not written.
+        """
+
+        num_packets = len(buffer) // self.packetSize
+        if flush:
+            num_packets += 1
+
+        # Write at most queueSize packets per call.
+        for start in range(0, num_packets, self.queueSize):
+            num = min(self.queueSize, num_packets - start)
+            self._dataChannels[channel_idx].write(
+                num, buffer[start * self.packetSize:
+                            (start + num) * self.packetSize])
+
+        if flush:
+            return np.zeros(0, np.int32)
+        return buffer[num_packets * self.packetSize:]
@@ -0,0 +1,142 @@
+# INTEL CORPORATION CONFIDENTIAL AND PROPRIETARY
+#
+# Copyright © 2020 Intel Corporation.
+#
+# This software and the related documents are Intel copyrighted
+# materials, and your use of them is governed by the express
+# license under which they were provided to you (License). Unless
+# the License provides otherwise, you may not use, modify, copy,
+# publish, distribute, disclose or transmit  this software or the
+# related documents without Intel's prior written permission.
+#
+# This software and the related documents are provided as is, with
+# no express or implied warranties, other than those that are
+# expressly stated in the License.
+
+"""
+Benchmark SpikeInputGenerator.prepare_encoding on synthetic event streams.
+
+Compares the sort-and-segment encoder against the previous implementation,
+which loops over the unique timesteps and cores of each snip. Both have to
+produce the same buffers. The reference is only run on the smaller streams,
+as it scales with the number of timesteps times the number of events.
+
+Run with
+``python -m nxsdk_modules_ncl.input_generator.tests.benchmark_prepare_encoding``.
+"""
+
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from nxsdk_modules_ncl.input_generator.spike_input_generator import \
+    SpikeInputGenerator
+
+
+def _prepareEncodingReference(generator, inputs):
+    """Previous implementation of ``prepare_encoding``."""
+
+    inputs = np.array(inputs, 'uint64')
+
+    input_addresses = generator.axonMap[inputs[:, 0]]
+    inputs_encoded = OrderedDict()
+    for chip in generator.chips:
+        chip_mask = input_addresses[:, 0] == chip
+        core_axon_ids = input_addresses[chip_mask, 1:]
+        timesteps = inputs[chip_mask, 1]
+        inputs_per_chip = np.column_stack([core_axon_ids, timesteps])
+
+        sort_idxs = np.lexsort((core_axon_ids[:, 0], timesteps))
+        inputs_per_cpu = generator.split(inputs_per_chip[sort_idxs],
+                                         generator.numLmts)
+
+        inputs_per_chip_encoded = OrderedDict()
+        for lmt_id, input_per_cpu in enumerate(inputs_per_cpu):
+            input_per_cpu_encoded = []
+            for t in np.unique(input_per_cpu[:, 2]):
+                timestep_mask = input_per_cpu[:, 2] == t
+                core_axon_ids = input_per_cpu[timestep_mask, :2]
+
+                input_per_cpu_encoded.append(t)
+                core_axon_map = []
+                for core in np.unique(core_axon_ids[:, 0]):
+                    core_mask = core_axon_ids[:, 0] == core
+                    core_axon_map.append(
+                        (core, list(core_axon_ids[core_mask, 1])))
+                input_per_cpu_encoded.append(len(core_axon_map))
+                for core, axon_ids in core_axon_map:
+                    input_per_cpu_encoded.append(core)
+                    input_per_cpu_encoded.append(len(axon_ids))
+                    input_per_cpu_encoded.extend(axon_ids)
+            inputs_per_chip_encoded[lmt_id] = input_per_cpu_encoded
+        inputs_encoded[chip] = inputs_per_chip_encoded
+
+    return inputs_encoded
+
+
+def _createGenerator(numInputs, numChips, numLmts, seed=0):
+    """Create a SpikeInputGenerator with a random axon map, without going
+    through the compilation of a model."""
+
+    rng = np.random.RandomState(seed)
+    generator = SpikeInputGenerator.__new__(SpikeInputGenerator)
+    generator.numLmts = numLmts
+    generator.axonMap = np.column_stack(
+        [np.arange(numInputs) % numChips,
+         rng.randint(0, 128, numInputs),
+         rng.randint(0, 4096, numInputs)]).astype('uint64')
+    generator.chips = sorted(set(generator.axonMap[:, 0]))
+    return generator
+
+
+def _genEvents(numEvents, numInputs, numTimesteps, seed=0):
+    """Generate a random stream of (id, t) events."""
+
+    rng = np.random.RandomState(seed)
+    return np.column_stack([rng.randint(0, numInputs, numEvents),
+                            rng.randint(1, numTimesteps + 1, numEvents)])
+
+
+# (numEvents, numTimesteps, runReference)
+CONFIGS = [
+    (100000, 100, True),
+    (1000000, 1000, True),
+    (10000000, 10000, False),
+]
+
+
+def _timeit(func, *args):
+    t0 = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - t0
+
+
+def main():
+    numInputs = 34 * 34 * 2
+    generator = _createGenerator(numInputs, numChips=2, numLmts=3)
+
+    print("{:>10}{:>10}{:>12}{:>12}{:>10}".format(
+        'events', 'steps', 'loop [s]', 'sort [s]', 'speedup'))
+    for numEvents, numTimesteps, runReference in CONFIGS:
+        inputs = _genEvents(numEvents, numInputs, numTimesteps)
+
+        encoded, t = _timeit(generator.prepare_encoding, inputs)
+
+        if runReference:
+            reference, tRef = _timeit(_prepareEncodingReference, generator,
+                                      inputs)
+            for chip in reference:
+                for lmt in reference[chip]:
+                    assert np.array_equal(
+                        np.array(reference[chip][lmt], np.int64),
+                        encoded[chip][lmt])
+            print("{:>10}{:>10}{:>12.3f}{:>12.3f}{:>10.1f}".format(
+                numEvents, numTimesteps, tRef, t, tRef / t))
+        else:
+            print("{:>10}{:>10}{:>12}{:>12.3f}{:>10}".format(
+                numEvents, numTimesteps, '-', t, '-'))
+
+
+if __name__ == '__main__':
+    main()
@@ -27,8 +27,68 @@ from nxsdk.arch.n2a.n2board import N2Board
 import numpy as np
 
 
+class RecordingChannel:
+    """Data channel that records the data written to it."""
+
+    def __init__(self):
+        self.writes = []
+
+    def write(self, numPackets, data):
+        self.writes.append((numPackets, list(data)))
+
+
+def setUpInjectionPoints(ie):
+    """Set up the injection layout of an InputGenerator with 12 inputs on two
+    chips, one snip each, without compiling a model."""
+    ie._dataOrder = [(0, 4), (1, 5), (0, 3)]
+    ie._injectionPointsPerSnip = [7, 5]
+    ie._chipIdForSnip = {0: 0, 1: 1}
+    ie._packetPerSnip = [1, 1]
+    ie._dataChannels = [RecordingChannel(), RecordingChannel()]
+    ie._compiled = True
+
+
 class TestInputEncoder(unittest.TestCase):
     """Unit test for Input Encoder"""
+
+    def test_packEncodedData(self):
+        """Test that encoded data is gathered into one int32 buffer per snip
+        according to the injection layout"""
+        ie = InputGenerator((4, 3))
+        setUpInjectionPoints(ie)
+        packedData = ie._packEncodedData(np.arange(12) * 10)
+
+        self.assertEqual(len(packedData), 2)
+        self.assertListEqual(packedData[0].tolist(),
+                             [0, 10, 20, 30, 90, 100, 110])
+        self.assertListEqual(packedData[1].tolist(), [40, 50, 60, 70, 80])
+        for data in packedData:
+            self.assertEqual(data.dtype, np.int32)
+
+    def test_feed(self):
+        """Test that feeding samples asynchronously writes the same data as
+        encoding them one by one"""
+        shape = (4, 3)
+        data = np.arange(10 * 12).reshape((10,) + shape)
+
+        ie1 = InputGenerator(shape)
+        setUpInjectionPoints(ie1)
+        for sample in data:
+            ie1.encode(sample)
+
+        ie2 = InputGenerator(shape)
+        setUpInjectionPoints(ie2)
+        throughput = ie2.feed(iter(data), numBuffers=2)
+
+        self.assertGreater(throughput, 0)
+        for channel1, channel2 in zip(ie1._dataChannels, ie2._dataChannels):
+            self.assertEqual(len(channel1.writes), 10)
+            self.assertListEqual(channel1.writes, channel2.writes)
+
+        # Errors in the encoding thread are raised in the calling thread.
+        with self.assertRaises(ValueError):
+            ie2.feed([data[0], data[0, :2]])
+
     def test_input_encoder(self):
         """Test running a compilation pipeline with input encoder and mocked port"""
         # Create an input encoder
@@ -32,6 +32,23 @@ import numpy as np
 
 os.environ['SLURM'] = '1'
 
+
+class RecordingChannel:
+    """Data channel that records the packets written to it."""
+
+    def __init__(self, packetSize):
+        self.packetSize = packetSize
+        self.numElementsPerWrite = []
+        self.packets = []
+
+    def write(self, numElements, data):
+        self.numElementsPerWrite.append(numElements)
+        data = list(data) + [0] * (numElements * self.packetSize - len(data))
+        for i in range(numElements):
+            self.packets.append(
+                data[i * self.packetSize:(i + 1) * self.packetSize])
+
+
 class TestSpikeInputGenerator(unittest.TestCase):
     """
     Tests SpikeInputGenerator. SpikeInputGenerator is a layer which can be used to encode data and inject spikes
@@ -39,6 +56,97 @@ class TestSpikeInputGenerator(unittest.TestCase):
 
     """
 
+    def test_prepare_encoding(self):
+        """
+        Check the packet format of encoded spikes for a given axon map.
+        """
+
+        ie = SpikeInputGenerator(name="SpikeGen", numSnipsPerChip=2)
+        # Rows are (chip, core, axon) of each input id.
+        ie.axonMap = np.array([[0, 4, 10],
+                               [0, 5, 11],
+                               [1, 4, 12],
+                               [0, 4, 13]], 'uint64')
+        ie.chips = [0, 1]
+
+        inputs = [(0, 2), (1, 1), (3, 1), (0, 1), (2, 1)]
+        encoded = ie.prepare_encoding(inputs)
+
+        self.assertListEqual(list(encoded.keys()), [0, 1])
+        # Chip 0 gets two spikes per snip. Within a timestep and core, axons
+        # keep their input order.
+        self.assertListEqual(encoded[0][0].tolist(), [1, 1, 4, 2, 13, 10])
+        self.assertListEqual(encoded[0][1].tolist(),
+                             [1, 1, 5, 1, 11, 2, 1, 4, 1, 10])
+        self.assertListEqual(encoded[1][0].tolist(), [1, 1, 4, 1, 12])
+        self.assertListEqual(encoded[1][1].tolist(), [])
+        self.assertEqual(encoded[0][0].dtype, np.int32)
+
+        ie.numLmts = 1
+        encoded = ie.prepare_encoding(inputs)
+        self.assertListEqual(encoded[0][0].tolist(),
+                             [1, 2, 4, 2, 13, 10, 5, 1, 11, 2, 1, 4, 1, 10])
+
+    def test_prepare_encoding_split_interval(self):
+        """
+        Check that the spikes of each interval are split across the snips
+        separately, as if each interval was encoded on its own.
+        """
+
+        ie = SpikeInputGenerator(name="SpikeGen", numSnipsPerChip=2)
+        ie.axonMap = np.array([[0, 4, 10],
+                               [0, 5, 11],
+                               [0, 4, 12]], 'uint64')
+        ie.chips = [0]
+
+        inputs = [(0, 1), (1, 2), (2, 3), (0, 4), (1, 4), (2, 6)]
+        encoded = ie.prepare_encoding(inputs, split_interval=3)
+
+        # Timesteps 1 to 3 and 4 to 6 each contribute two spikes to the first
+        # snip and one to the second.
+        self.assertListEqual(encoded[0][0].tolist(),
+                             [1, 1, 4, 1, 10, 2, 1, 5, 1, 11,
+                              4, 2, 4, 1, 10, 5, 1, 11])
+        self.assertListEqual(encoded[0][1].tolist(),
+                             [3, 1, 4, 1, 12, 6, 1, 4, 1, 12])
+
+        # Without intervals, the first snip gets the first three spikes.
+        encoded = ie.prepare_encoding(inputs)
+        self.assertListEqual(encoded[0][0].tolist(),
+                             [1, 1, 4, 1, 10, 2, 1, 5, 1, 11, 3, 1, 4, 1, 12])
+
+    def test_stream(self):
+        """
+        Check that streaming spikes in windows writes the same packets as
+        sending them at once, in writes of at most queueSize packets.
+        """
+
+        packetSize = 8
+        queueSize = 2
+        numAxons = 20
+        numSpikes = 101
+        axonMap = np.column_stack([np.zeros(numAxons),
+                                   np.arange(numAxons) % 3,
+                                   np.arange(numAxons)]).astype('uint64')
+        inputs = np.column_stack([np.arange(numSpikes) % numAxons,
+                                  np.arange(1, numSpikes + 1)])
+
+        channels = []
+        for streaming in [False, True]:
+            ie = SpikeInputGenerator(name="SpikeGen", packetSize=packetSize,
+                                     queueSize=queueSize)
+            ie.axonMap = axonMap
+            ie.chips = [0]
+            ie._dataChannels = [RecordingChannel(packetSize)]
+            if streaming:
+                self.assertEqual(ie.stream(inputs, window_size=7), numSpikes)
+            else:
+                ie.send_inputs(ie.prepare_encoding(inputs))
+            channels.append(ie._dataChannels[0])
+
+        self.assertListEqual(channels[0].packets, channels[1].packets)
+        self.assertLessEqual(max(channels[1].numElementsPerWrite), queueSize)
+
     def test_spike_input_gen(self):
         """
         Create a mock output port and inject spikes into random axons.
@@ -17,12 +17,12 @@
 from __future__ import division, absolute_import
 from __future__ import print_function, unicode_literals
 
-from collections import OrderedDict
-
 import sys
 
 import json
 import os
+import queue
+import threading
 import time
 import warnings
 import tempfile
@@ -117,6 +117,18 @@ class SNN(AbstractSNN):
         self.clamp_duration = self.config.getint('loihi', 'interval',
                                                  fallback=2**10)
 
+        # Let the readout snip count the output spikes of each sample, instead
+        # of sending only the inferred class.
+        self.readout_spike_counts = self.config.getboolean(
+            'loihi', 'readout_spike_counts', fallback=False)
+
+        if self.readout_spike_counts:
+            assert self.do_probe_spikes is False and \
+                'mem_n_b_l_t' not in self._log_keys and \
+                'v_mem' not in self._plot_keys, \
+                "Reading out spike counts replaces probing; disable plots " \
+                "and logs of spike trains and membrane potentials."
+
         if self.clamp_layers:
             assert self.do_probe_spikes is False, \
                 "Currently, probing is not possible while clamping layers."
@@ -517,16 +529,25 @@ class SNN(AbstractSNN):
         else:
             x_b_l = kwargs['x_b_l']
 
+        inputs = self.prepare_inputs(x_b_l)
+
         if self.clamp_layers:
             num_intervals, remainder = divmod(batch_duration,
                                               self.clamp_duration)
             outputs = []
             for i in range(num_intervals):
+                # The same frame is injected in every interval, so it is
+                # encoded only once. DVS events are shifted to the current
+                # time step on each call and have to be encoded again.
+                if i > 0 and self._is_aedat_input:
+                    inputs = self.prepare_inputs(x_b_l)
                 self.apply_clamp(i)
                 self.composed_snn.run(self.clamp_duration, **run_kwargs)
-                self.set_inputs(x_b_l)
+                self.send_prepared_inputs(inputs)
                 outputs.append(self.get_spiketrains_output()[..., -1])
-                self.composed_snn.finishRun()  # Todo: Move out of loop?
+                # Clamping reconfigures the layers, which requires the
+                # previous run to have finished.
+                self.composed_snn.finishRun()
             if remainder:
                 # self.composed_snn.run(remainder, **run_kwargs)
                 raise NotImplementedError
@@ -534,17 +555,132 @@ class SNN(AbstractSNN):
             output_b_l_t = np.repeat(output_b_l, self.clamp_duration, -1)
         else:
             self.composed_snn.run(batch_duration, **run_kwargs)
-            self.set_inputs(x_b_l)
+            self.send_prepared_inputs(inputs)
 
             # This call has to happen before trying to read out probes,
             # otherwise their data array will be empty.
             self.composed_snn.finishRun()
 
             print("\nCollecting results...")
-            output_b_l_t = self.get_recorded_vars(self.snn.layers)
+            output_b_l_t = self.collect_outputs()
 
         return output_b_l_t
 
+    def simulate_pipelined(self, batches, num_buffers=1):
+        """Simulate a sequence of batches, overlapping host work with runs.
+
+        While batch N runs on Loihi, the inputs of batches N+1 to
+        N+``num_buffers`` are prepared in a background thread, and the probes
+        of batch N-1 are decoded in another. The output of a batch is
+        therefore yielded only once the next batch has started, and the
+        consumer may process it while the board is still running.
+
+        Probe data of a batch is only transferred when its run finishes, so
+        the probes still hold batch N-1 while batch N runs.
+
+        :param batches: Iterable of input batches, each as expected by
+            ``simulate`` under the key 'x_b_l'.
+        :param int num_buffers: Number of batches to prepare ahead of the one
+            that is running.
+        :return: Generator of arrays of shape (`batch_size`, `num_classes`,
+            ``num_timesteps``), one per batch, like ``simulate``.
+        """
+
+        assert not self.clamp_layers, \
+            "Pipelined simulation does not support clamping layers."
+        assert num_buffers > 0
+
+        run_kwargs = {'aSync': True}
+        batch_duration = self._duration * self.batch_size
+
+        prepared = queue.Queue(maxsize=num_buffers)
+        stop = threading.Event()
+        done = object()
+
+        def put(item):
+            # Give up once the simulation loop has stopped.
+            while not stop.is_set():
+                try:
+                    prepared.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def prepare_all():
+            try:
+                for x_b_l in batches:
+                    if not put(self.prepare_inputs(x_b_l)):
+                        return
+                put(done)
+            except Exception as e:
+                put(e)
+
+        result = {}
+
+        def decode():
+            try:
+                result['output'] = self.collect_outputs()
+            except Exception as e:
+                result['error'] = e
+
+        preparer = threading.Thread(target=prepare_all, daemon=True)
+        preparer.start()
+        has_previous = False
+        is_running = False
+        try:
+            while True:
+                inputs = prepared.get()
+                if inputs is done:
+                    break
+                if isinstance(inputs, Exception):
+                    raise inputs
+
+                self.composed_snn.run(batch_duration, **run_kwargs)
+                is_running = True
+
+                decoder = None
+                if has_previous:
+                    result.clear()
+                    decoder = threading.Thread(target=decode, daemon=True)
+                    decoder.start()
+
+                self.send_prepared_inputs(inputs)
+
+                if decoder is not None:
+                    decoder.join()
+                    if 'error' in result:
+                        raise result['error']
+                    yield result['output']
+
+                self.composed_snn.finishRun()
+                is_running = False
+                has_previous = True
+        finally:
+            stop.set()
+            if is_running:
+                self.composed_snn.finishRun()
+            preparer.join()
+
+        if has_previous:
+            print("\nCollecting results...")
+            yield self.collect_outputs()
+
+    def collect_outputs(self):
+        """Get the output of the last batch after its run has finished.
+
+        :return: Array of shape (`batch_size`, `num_classes`,
+            ``num_timesteps``), containing the cumulative number of output
+            spikes. When reading out spike counts, only the last time step is
+            known; all previous time steps are zero.
+        :rtype: np.ndarray
+        """
+
+        if self.readout_spike_counts:
+            return self.get_spiketrains_output().astype('int32')
+
+        return self.get_recorded_vars(self.snn.layers)
+
     def reset(self, sample_idx):
         """Reset network variables.
 
@@ -764,15 +900,23 @@ class SNN(AbstractSNN):
         last time step. Thus the output array of this method contains zeros in
         all time steps but the last.
 
+        When reading out spike counts, the last time step contains the number
+        of spikes of each output neuron instead.
+
         :return: spiketrains_b_l_t
         :rtype: np.ndarray
         """
 
-        # Get predicted class labels.
-        out_class = self.composed_snn.composables.dnn.readout_channel.read(
-            self.batch_size)
-        # Transform into 1-hot encoded class vectors.
-        out_spikes = keras.utils.to_categorical(out_class, self.num_classes)
+        if self.readout_spike_counts:
+            out_spikes = self.read_output_spike_counts()
+        else:
+            # Get predicted class labels.
+            out_class = \
+                self.composed_snn.composables.dnn.readout_channel.read(
+                    self.batch_size)
+            # Transform into 1-hot encoded class vectors.
+            out_spikes = keras.utils.to_categorical(out_class,
+                                                    self.num_classes)
         shape = (self.batch_size, self.num_classes, self._duration)
         spiketrains_b_l_t = np.zeros(shape)
         # Insert output spikes at last time step. All previous time steps are
@@ -781,6 +925,21 @@ class SNN(AbstractSNN):
 
         return spiketrains_b_l_t
 
+    def read_output_spike_counts(self):
+        """Read the output spike counts of the last batch from the readout
+        snip.
+
+        For an output layer with softmax activation, the snip sends the
+        membrane potentials instead.
+
+        :return: Array of shape (`batch_size`, `num_classes`).
+        :rtype: np.ndarray
+        """
+
+        readout_channel = self.composed_snn.composables.dnn.readout_channel
+        counts = readout_channel.read(self.batch_size * self.num_classes)
+        return np.reshape(counts, (self.batch_size, self.num_classes))
+
     def get_vmem(self, **kwargs):
         """Get membrane potential of a layer.
 
@@ -886,44 +1045,66 @@ class SNN(AbstractSNN):
         :param np.ndarray inputs: Input array.
         """
 
+        self.send_prepared_inputs(self.prepare_inputs(inputs))
+
+    def prepare_inputs(self, inputs):
+        """Prepare a batch of inputs on the host, before sending it to Loihi.
+
+        DVS event frames are encoded into spike packets. Other inputs are
+        normalized and scaled to 8 bit; they are encoded per sample while
+        sending.
+
+        :param np.ndarray inputs: Input array.
+        :return: Inputs ready for ``send_prepared_inputs``.
+        """
+
+        if self._is_aedat_input:
+            return self.prepare_dvs_input_batch(inputs)
+
+        # Normalize inputs and scale up to 8 bit.
+        inputs = (inputs / np.max(inputs) * (2 ** 8 - 1)).astype(int)
+        return np.expand_dims(inputs, 1)
+
+    def send_prepared_inputs(self, inputs):
+        """Send inputs returned by ``prepare_inputs`` to the input generator.
+
+        :param inputs: Prepared inputs.
+        """
+
         print("Setting inputs...", flush=True)
 
         gen = self.composed_snn.composables.input
         if self._is_aedat_input:
-            inputs_encoded = self.prepare_dvs_input_batch(inputs)
-            gen.send_inputs(inputs_encoded)
+            gen.send_inputs(inputs)
         else:
-            # Normalize inputs and scale up to 8 bit.
-            inputs = (inputs / np.max(inputs) * (2 ** 8 - 1)).astype(int)
-            for x in inputs:
-                gen.encode(np.expand_dims(x, 0))
+            gen.feed(inputs)
         print("Done setting inputs.", flush=True)
 
     def prepare_dvs_input_batch(self, inputs):
+        """Encode a batch of DVS event frames into spike packets.
+
+        The events of all samples are encoded in a single call of the
+        SpikeInputGenerator. Each sample is shifted in time by the duration of
+        the samples before it, and the events of each sample are split across
+        the injection snips separately, so all snips share the load of every
+        sample.
+
+        :param np.ndarray inputs: Event frames of shape (`batch_size`,
+            ``num_timesteps``, `height`, `width`[, `depth`]).
+        :return: Encoded spikes as returned by
+            ``SpikeInputGenerator.prepare_encoding``.
         """
-        In principle, we could just call the encode method of the
-        SpikeInputGenerator on the whole batch, but we choose to encode the
-        samples individually here because if the batch size is large, the
-        sorting functions within the encoder may take very long.
-        """
+
         height, width, depth = self.snn.input_shape[1:]
 
-        inputs_encoded = OrderedDict()
-        for eventframe in inputs:
-            if len(eventframe.shape) < 4:
-                np.expand_dims(eventframe, -1)
-            t, y, x, p = np.nonzero(eventframe)
-            ts = t + self._num_samples_seen * self._duration + 1
-            addr = x * height * depth + y * depth + p
-            self._num_samples_seen += 1
-            inp_encoded = self.composed_snn.composables.input.prepare_encoding(
-                np.column_stack([addr, ts]))
-            for chip_id, inputs_per_chip in inp_encoded.items():
-                inputs_encoded.setdefault(chip_id, OrderedDict())
-                for cpu_id, inputs_per_cpu in inputs_per_chip.items():
-                    inputs_encoded[chip_id].setdefault(cpu_id, [])
-                    inputs_encoded[chip_id][cpu_id].extend(inputs_per_cpu)
-        return inputs_encoded
+        if inputs.ndim < 5:
+            inputs = np.expand_dims(inputs, -1)
+        b, t, y, x, p = np.nonzero(inputs)
+        ts = t + (self._num_samples_seen + b) * self._duration + 1
+        addr = x * height * depth + y * depth + p
+        self._num_samples_seen += len(inputs)
+        return self.composed_snn.composables.input.prepare_encoding(
+            np.column_stack([addr, ts]), split_interval=self._duration)
 
     def preprocessing(self, **kwargs):
         """Do any preprocessing."""
@@ -1104,7 +1285,13 @@ class SNN(AbstractSNN):
 
         enable_reset = self.config.getint('simulation',
                                           'reset_between_nth_sample') > 0
-        cdnn = ComposableDNN(self.snn, interval, enable_reset=enable_reset)
+        readout_mode = 'counts' if self.readout_spike_counts else 'class'
+        # The readout channel holds the outputs of all batches, rounded up to
+        # a full batch.
+        num_imgs = int(np.ceil(self.num_samples / self.batch_size)) * \
+            self.batch_size
+        cdnn = ComposableDNN(self.snn, interval, enable_reset=enable_reset,
+                             readout_mode=readout_mode, num_imgs=num_imgs)
         cdnn.name = 'dnn'
 
         # Configure input generator to stream images via channels from super
@@ -1161,53 +1348,78 @@ class SNN(AbstractSNN):
     def normalize_nx_model(self, **kwargs):
         """Scale thresholds and weight exponents to ideal dynamic range.
 
+        By default, all normalization samples are loaded at once and the
+        activations of each layer are kept in memory to compute the next.
+        With the ``streaming`` option in the ``normalization`` section of the
+        config, the samples are instead iterated in mini-batches, and the
+        percentile of each layer is estimated from a ``PercentileHistogram``.
+        This keeps memory constant in the number of samples, at the cost of
+        one pass over the dataset per layer.
+
         :return: Scale exponents.
         :rtype: dict
         """
 
-        # Get dataset for normalization.
-        if 'x_norm' in kwargs:
-            x_norm = kwargs[str('x_norm')]  # Values in range [0, 1]
-        elif 'x_test' in kwargs:
-            x_norm = kwargs[str('x_test')]
-        elif 'dataflow' in kwargs:
-            x_norm = []
-            dataflow = kwargs[str('dataflow')]
-            num_samples_norm = self.config.getint('normalization',
-                                                  'num_samples', fallback='')
-            if num_samples_norm == '':
-                num_samples_norm = len(dataflow) * dataflow.batch_size
-            while len(x_norm) * self.batch_size < num_samples_norm:
-                x = dataflow.next()
-                if isinstance(x, tuple):  # Remove class label if present.
-                    x = x[0]
-                x_norm.append(x)
-            x_norm = np.concatenate(x_norm)
+        streaming = self.config.getboolean('normalization', 'streaming',
+                                           fallback=False)
+
+        if streaming:
+            num_bins = self.config.getint('normalization', 'num_bins',
+                                          fallback=2**16)
+            num_samples = 0
+            x_max = 0
+            for x in self.iterate_normalization_batches(**kwargs):
+                num_samples += len(x)
+                x_max = max(x_max, np.max(x))
+            print("Streaming {} samples for normalization.".format(
+                num_samples))
+            print("INFO: Using histograms of {} bins for layer activations."
+                  "\n".format(num_bins))
         else:
-            raise NotImplementedError
-        print("Using {} samples for normalization.".format(len(x_norm)))
-        sizes = [
-            len(x_norm) * np.array(layer.output_shape[1:]).prod() * 32 /
-            (8 * 2**30) for layer in self.parsed_model.layers
-            if len(layer.weights) > 0]
-        size_str = ['{:.2f}'.format(s) for s in sizes]
-        print("INFO: Need {} GB for layer activations.\n".format(size_str))
+            # Get dataset for normalization.
+            if 'x_norm' in kwargs:
+                x_norm = kwargs[str('x_norm')]  # Values in range [0, 1]
+            elif 'x_test' in kwargs:
+                x_norm = kwargs[str('x_test')]
+            elif 'dataflow' in kwargs:
+                x_norm = []
+                dataflow = kwargs[str('dataflow')]
+                num_samples_norm = self.config.getint(
+                    'normalization', 'num_samples', fallback='')
+                if num_samples_norm == '':
+                    num_samples_norm = len(dataflow) * dataflow.batch_size
+                while len(x_norm) * self.batch_size < num_samples_norm:
+                    x = dataflow.next()
+                    if isinstance(x, tuple):  # Remove class label if present.
+                        x = x[0]
+                    x_norm.append(x)
+                x_norm = np.concatenate(x_norm)
+            else:
+                raise NotImplementedError
+            print("Using {} samples for normalization.".format(len(x_norm)))
+            sizes = [
+                len(x_norm) * np.array(layer.output_shape[1:]).prod() * 32 /
+                (8 * 2**30) for layer in self.parsed_model.layers
+                if len(layer.weights) > 0]
+            size_str = ['{:.2f}'.format(s) for s in sizes]
+            print("INFO: Need {} GB for layer activations.\n".format(size_str))
+            x_max = np.max(x_norm)
 
         # Percentile to use for threshold clipping.
         activation_percentile = self.config.getfloat(
             'normalization', 'activation_percentile', fallback=99.999)
 
-        # Input should already be normalized, but do it again just for safety.
-        x = x_norm / np.max(x_norm)
-
         # Init param scale
         input_scale = 127 if self.signed_input else 255
         param_scale = input_scale
 
-        # Convert input to integers.
-        dvdt = x * input_scale
+        if not streaming:
+            spikerates = x_norm
 
-        spikerates = None
+        # Transformations from the input of the network to the output of each
+        # layer seen so far, as [predict, scale, threshold]. Used to
+        # recompute the activations of a layer batch by batch when streaming.
+        stages = []
 
         param_scales = {}
         slopes = {}
@@ -1274,15 +1486,22 @@ class SNN(AbstractSNN):
                 # applied by Loihi.
                 layer.set_weights([weights, biases])
 
-            if i > 0:
-                # Get excitatory post-synaptic potential for each neuron.
-                dvdt = keras.models.Sequential([layer]).predict(spikerates)
+            if i == 0:
+                # Input should already be normalized, but do it again just for
+                # safety. Then convert input to integers.
+                stage = [lambda x: x / x_max, input_scale, None]
+            else:
+                # Get excitatory post-synaptic potential for each neuron. The
+                # model is built once per layer and reused for all batches.
+                stage = [keras.models.Sequential([layer]).predict, 1, None]
 
                 # Layers like Flatten do not have spiking neurons and therefore
                 # no threshold to tune. So we only need to update the input to
                 # the next layer, and propagate the scale.
                 if not is_spiking(layer, self.config):
-                    spikerates = dvdt
+                    stages.append(stage)
+                    if not streaming:
+                        spikerates = propagate_stages([stage], spikerates)
                     param_scales[name] = prev_param_scale
                     thresh_exps[name] = prev_thresh_exp
                     thresh_mants[name] = prev_thresh_mant
@@ -1299,11 +1518,21 @@ class SNN(AbstractSNN):
                     weight_norm = 1 / np.prod(layer.pool_size)
                     param_scale = self.W_MAX / weight_norm
                     param_scales[name] = param_scale
-                    dvdt = dvdt * param_scale
+                    stage[1] = param_scale
+
+            stages.append(stage)
 
             # The highest EPSP determines whether to raise threshold.
-            dvdt_max = get_scale_fac(dvdt[np.nonzero(dvdt)],
-                                     activation_percentile)
+            if streaming:
+                histogram = PercentileHistogram(num_bins)
+                for x in self.iterate_normalization_batches(**kwargs):
+                    dvdt = propagate_stages(stages, x)
+                    histogram.update(dvdt[np.nonzero(dvdt)])
+                dvdt_max = histogram.percentile(activation_percentile)
+            else:
+                dvdt = propagate_stages([stage], spikerates)
+                dvdt_max = get_scale_fac(dvdt[np.nonzero(dvdt)],
+                                         activation_percentile)
             print("Maximum increase in compartment voltage per timestep: {}."
                   "".format(int(dvdt_max)))
 
@@ -1354,13 +1583,48 @@ class SNN(AbstractSNN):
             # Apply activation function (dividing by threshold) to obtain the
             # output of the current layer, which will be used as input to the
             # next.
-            spikerates = np.minimum(dvdt / threshold, 1)
+            stage[2] = threshold
+            if not streaming:
+                spikerates = np.minimum(dvdt / threshold, 1)
             print('\n')
 
         print("Done scaling thresholds.\n")
 
         return param_scales, slopes, thresh_mants, thresh_exps
 
+    def iterate_normalization_batches(self, **kwargs):
+        """Iterate over the dataset used for normalization in batches.
+
+        Used in streaming mode. Each call yields the same samples in the same
+        order, so the dataset can be traversed once per layer. Unlike the
+        default mode, which advances a dataflow with ``next()``, the dataflow is
+        indexed, so its batches are not reshuffled between passes.
+
+        :return: Generator of input batches.
+        """
+
+        if 'x_norm' in kwargs or 'x_test' in kwargs:
+            # Values in range [0, 1]
+            x_norm = kwargs.get(str('x_norm'), kwargs.get(str('x_test')))
+            for i in range(0, len(x_norm), self.batch_size):
+                yield x_norm[i:i + self.batch_size]
+        elif 'dataflow' in kwargs:
+            dataflow = kwargs[str('dataflow')]
+            num_samples_norm = self.config.getint('normalization',
+                                                  'num_samples', fallback='')
+            if num_samples_norm == '':
+                num_samples_norm = len(dataflow) * dataflow.batch_size
+            num_batches = int(np.ceil(num_samples_norm / self.batch_size))
+            # Indexing the dataflow, unlike calling next(), does not reshuffle
+            # the samples between passes.
+            for i in range(num_batches):
+                x = dataflow[i % len(dataflow)]
+                if isinstance(x, tuple):  # Remove class label if present.
+                    x = x[0]
+                yield x
+        else:
+            raise NotImplementedError
+
     def get_parameter_scale(self, weights, biases):
         param_percentile = self.config.getfloat(
             'normalization', 'param_percentile', fallback=100)
@@ -1377,6 +1641,122 @@ class SNN(AbstractSNN):
         return self.W_MAX / weight_norm
 
 
+class PercentileHistogram(object):
+    """Estimate percentiles of a stream of values with a fixed histogram.
+
+    The bins cover the range ``[-limit, limit]``, where ``limit`` is set by the
+    first values seen. Whenever a value falls outside, the range is doubled by
+    merging pairs of neighbouring bins. Each order statistic is estimated
+    within its bin, so the estimate differs from ``np.percentile`` by less
+    than the width of one bin, ``2 * limit / num_bins``.
+
+    :param int num_bins: Number of bins. Must be a multiple of 4.
+    """
+
+    def __init__(self, num_bins=2**16):
+        assert num_bins % 4 == 0, "Number of bins must be a multiple of 4."
+        self.counts = np.zeros(num_bins, np.int64)
+        self.limit = 0
+
+    @property
+    def num_values(self):
+        return int(np.sum(self.counts))
+
+    def update(self, values):
+        """Add values to the histogram.
+
+        :param np.ndarray values: Values to add.
+        """
+
+        values = np.ravel(values)
+        if values.size == 0:
+            return
+
+        max_abs = np.max(np.abs(values))
+        if self.limit == 0:
+            self.limit = max_abs if max_abs > 0 else 1
+        while max_abs > self.limit:
+            self._grow()
+
+        num_bins = len(self.counts)
+        idxs = (values + self.limit) * (num_bins / (2 * self.limit))
+        idxs = np.minimum(idxs.astype(np.int64), num_bins - 1)
+        self.counts += np.bincount(idxs, minlength=num_bins)
+
+    def _grow(self):
+        """Double the range of the histogram, keeping the number of bins."""
+
+        num_bins = len(self.counts)
+        counts = np.zeros_like(self.counts)
+        counts[num_bins // 4: 3 * num_bins // 4] = \
+            self.counts.reshape(-1, 2).sum(1)
+        self.counts = counts
+        self.limit *= 2
+
+    def percentile(self, q):
+        """Estimate the value at percentile ``q``.
+
+        Like ``np.percentile``, interpolates linearly between the two order
+        statistics next to the rank ``q / 100 * (num_values - 1)``. Each order
+        statistic is estimated assuming the values are spread uniformly within
+        their bin.
+
+        :param float q: Percentile in range [0, 100].
+        :return: Estimated value at percentile ``q``, or 1 if the histogram is
+            empty (like ``get_scale_fac``).
+        :rtype: float
+        """
+
+        num_values = self.num_values
+        if num_values == 0:
+            return 1
+
+        rank = q / 100 * (num_values - 1)
+        lower = int(np.floor(rank))
+        upper = min(lower + 1, num_values - 1)
+        cumsum = np.cumsum(self.counts)
+        value_lower = self._order_statistic(lower, cumsum)
+        value_upper = self._order_statistic(upper, cumsum)
+        return value_lower + (rank - lower) * (value_upper - value_lower)
+
+    def _order_statistic(self, k, cumsum):
+        """Estimate the ``k``-th smallest value (zero-based).
+
+        :param int k: Rank of the value.
+        :param np.ndarray cumsum: Cumulative sum of the bin counts.
+        :return: Estimated value.
+        :rtype: float
+        """
+
+        idx = np.searchsorted(cumsum, k, side='right')
+        num_below = cumsum[idx] - self.counts[idx]
+        width = 2 * self.limit / len(self.counts)
+        offset = (k - num_below + 0.5) / self.counts[idx]
+        return -self.limit + (idx + offset) * width
+
+
+def propagate_stages(stages, x):
+    """Propagate inputs through a sequence of emulated layers.
+
+    :param list stages: For each layer, a list of the function to predict the
+        voltage increment from its input, the factor to scale it by, and the
+        threshold to convert it to a rate. The function and threshold may be
+        None, to skip the respective step.
+    :param np.ndarray x: Input to the first stage.
+    :return: Output of the last stage.
+    :rtype: np.ndarray
+    """
+
+    for predict, scale, threshold in stages:
+        if predict is not None:
+            x = predict(x)
+        if scale != 1:
+            x = x * scale
+        if threshold is not None:
+            x = np.minimum(x / threshold, 1)
+    return x
+
+
 def print_performance(stats, num_timesteps):
 
     lakemont_static = stats['power']['lakemont']['static']
@@ -0,0 +1,202 @@
+#
+# Copyright © 2020 Intel Corporation.
+#
+# This software and the related documents are Intel copyrighted
+# materials, and your use of them is governed by the express
+# license under which they were provided to you (License). Unless
+# the License provides otherwise, you may not use, modify, copy,
+# publish, distribute, disclose or transmit  this software or the
+# related documents without Intel's prior written permission.
+#
+# This software and the related documents are provided as is, with
+# no express or implied warranties, other than those that are
+# expressly stated in the License.
+
+"""Test the Loihi backend of the SNN toolbox."""
+
+import threading
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from nxsdk_modules_ncl.snntoolbox.nx_backend import SNN, \
+    PercentileHistogram, propagate_stages
+
+
+class TestPercentileHistogram(unittest.TestCase):
+    """Compare percentiles estimated from a histogram with np.percentile.
+
+    The estimates must differ by less than the width of one bin.
+    """
+
+    def setUp(self):
+        """Define common parameters."""
+
+        self.rng = np.random.default_rng(0)
+        self.percentiles = [0, 1, 50, 99, 99.9, 99.999, 100]
+
+    def assertPercentilesClose(self, histogram, values):
+        width = 2 * histogram.limit / len(histogram.counts)
+        for q in self.percentiles:
+            with self.subTest(q=q):
+                self.assertLess(abs(histogram.percentile(q) -
+                                    np.percentile(values, q)), width)
+
+    def test_percentile(self):
+        """Check distributions with heavy tails and with repeated values."""
+
+        distributions = {
+            'lognormal': self.rng.lognormal(5, 2, 200000),
+            'exponential': self.rng.exponential(10, 200000),
+            'uniform': self.rng.uniform(-3, 7, 100000),
+            'integers': self.rng.integers(0, 50, 10000).astype(float),
+            'small': np.array([3., 1., 2.])}
+
+        for name, values in distributions.items():
+            for numBins in [2**8, 2**16]:
+                with self.subTest(distribution=name, numBins=numBins):
+                    histogram = PercentileHistogram(numBins)
+                    # The range of the histogram grows with the batches.
+                    for batch in np.array_split(np.sort(values), 17):
+                        histogram.update(batch)
+                    self.assertEqual(histogram.num_values, len(values))
+                    self.assertPercentilesClose(histogram, values)
+
+    def test_empty(self):
+        """Check that an empty histogram yields a scale factor of 1."""
+
+        histogram = PercentileHistogram(16)
+        histogram.update(np.array([]))
+        self.assertEqual(histogram.percentile(99), 1)
+
+    def test_propagateStages(self):
+        """Check streaming the activations of emulated layers in batches."""
+
+        weights = [self.rng.normal(size=(20, 30)),
+                   self.rng.normal(size=(30, 10))]
+        x = self.rng.uniform(size=(1000, 20))
+        stages = [[lambda x: x / 2, 255, None],
+                  [weights[0].__rmatmul__, 1, 400],
+                  [None, 1, None],
+                  [weights[1].__rmatmul__, 3, None]]
+
+        dvdt = propagate_stages(stages, x)
+        self.assertEqual(dvdt.shape, (1000, 10))
+
+        histogram = PercentileHistogram(2**16)
+        for batch in np.array_split(x, 7):
+            dvdtBatch = propagate_stages(stages, batch)
+            histogram.update(dvdtBatch[np.nonzero(dvdtBatch)])
+
+        self.assertPercentilesClose(histogram, dvdt[np.nonzero(dvdt)])
+
+
+class TestSimulatePipelined(unittest.TestCase):
+    """Check the order of host work and runs in ``SNN.simulate_pipelined``.
+
+    The board is replaced by mocks that record their calls. Probes hold the
+    data of the last finished run.
+    """
+
+    def setUp(self):
+        """Set up a simulator without a board."""
+
+        self.events = []
+        self.lock = threading.Lock()
+        self.numRuns = 0
+        self.probes = None
+        self.failingBatch = None
+
+        self.snn = SNN.__new__(SNN)
+        self.snn.clamp_layers = False
+        self.snn._duration = 10
+        self.snn.batch_size = 2
+        self.snn.composed_snn = mock.Mock()
+        self.snn.composed_snn.run.side_effect = self.runBoard
+        self.snn.composed_snn.finishRun.side_effect = self.finishBoardRun
+        self.snn.prepare_inputs = self.prepareInputs
+        self.snn.send_prepared_inputs = self.sendPreparedInputs
+        self.snn.collect_outputs = self.collectOutputs
+
+    def record(self, *event):
+        with self.lock:
+            self.events.append(event)
+
+    def runBoard(self, numSteps, aSync):
+        self.assertEqual(numSteps, 20)
+        self.assertTrue(aSync)
+        self.record('run', self.numRuns)
+        self.numRuns += 1
+
+    def finishBoardRun(self):
+        self.probes = self.numRuns - 1
+        self.record('finish', self.probes)
+
+    def prepareInputs(self, x_b_l):
+        if x_b_l == self.failingBatch:
+            raise ValueError(x_b_l)
+        self.record('prepare', x_b_l)
+        return x_b_l
+
+    def sendPreparedInputs(self, inputs):
+        self.record('send', inputs)
+
+    def collectOutputs(self):
+        self.record('collect', self.probes)
+        return self.probes
+
+    def assertRunsFinished(self):
+        self.assertEqual(self.snn.composed_snn.run.call_count,
+                         self.snn.composed_snn.finishRun.call_count)
+
+    def test_order(self):
+        """Check that outputs come in batch order and that the probes of a
+        batch are decoded while the next batch runs."""
+
+        numBatches = 5
+        outputs = list(self.snn.simulate_pipelined(range(numBatches),
+                                                   num_buffers=2))
+
+        self.assertListEqual(outputs, list(range(numBatches)))
+        self.assertRunsFinished()
+
+        events = self.events
+        for n in range(numBatches):
+            collect = events.index(('collect', n))
+            self.assertLess(events.index(('prepare', n)),
+                            events.index(('run', n)))
+            self.assertLess(events.index(('run', n)),
+                            events.index(('send', n)))
+            self.assertLess(events.index(('finish', n)), collect)
+            if n + 1 < numBatches:
+                # Decoded after the next batch started, before it finished.
+                self.assertLess(events.index(('run', n + 1)), collect)
+                self.assertLess(collect, events.index(('finish', n + 1)))
+
+    def test_stopEarly(self):
+        """Check that the running batch is finished if the consumer stops."""
+
+        outputs = self.snn.simulate_pipelined(range(5))
+        self.assertEqual(next(outputs), 0)
+        outputs.close()
+
+        self.assertEqual(self.numRuns, 2)
+        self.assertRunsFinished()
+        self.assertEqual(self.events[-1], ('finish', 1))
+
+    def test_prepareError(self):
+        """Check that errors while preparing inputs reach the consumer."""
+
+        self.failingBatch = 2
+        outputs = self.snn.simulate_pipelined(range(5))
+
+        with self.assertRaises(ValueError):
+            list(outputs)
+
+        self.assertEqual(self.numRuns, 2)
+        self.assertRunsFinished()
+
+
+if __name__ == '__main__':
+    unittest.main()